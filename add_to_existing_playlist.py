@@ -5,6 +5,7 @@ from spotipy.oauth2 import SpotifyOAuth
 from lastfm_client import LastFmClient
 from spotify_client import SpotifyClient
 from playlist_converter import PlaylistConverter
+from config import MAX_TRACKS_PER_PLAYLIST
 from tqdm import tqdm
 import time
 
@@ -67,7 +68,7 @@ def main():
     print(f"📊 Current playlist has {current_track_count} tracks")
     
     # Calculate how many more we can add
-    max_tracks = 10000
+    max_tracks = MAX_TRACKS_PER_PLAYLIST
     tracks_needed = max_tracks - current_track_count
     print(f"🎯 Can add {tracks_needed} more tracks to reach {max_tracks} limit")
     
@@ -89,7 +90,7 @@ def main():
     # We'll fetch in batches to get more tracks beyond our previous 2000
     all_new_tracks = []
     batch_size = 1000
-    max_total_fetch = min(tracks_needed + 1000, 10000)  # Fetch extra in case of duplicates
+    max_total_fetch = min(tracks_needed + 1000, max_tracks)  # Fetch extra in case of duplicates
     
     for offset in range(2000, min(12475, max_total_fetch + 2000), batch_size):
         remaining_needed = tracks_needed - len(all_new_tracks)
@@ -168,7 +169,7 @@ def main():
         print(f"🔗 URL: {playlist_url}")
         print(f"📊 Total tracks: {final_count}")
         print(f"✅ Added: {len(new_spotify_tracks)} new tracks")
-        print(f"🎯 Progress: {final_count}/10,000 ({final_count/100:.1f}%)")
+        print(f"🎯 Progress: {final_count:,}/{max_tracks:,} ({final_count / max_tracks * 100:.1f}%)")
     else:
         print("❌ Failed to add tracks to playlist!")
 
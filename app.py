@@ -1,32 +1,38 @@
 #!/usr/bin/env python3
 
-from flask import Flask, render_template, request, redirect, url_for, session, jsonify
+from flask import Flask, render_template, request, redirect, url_for, session, jsonify, Response
 import os
-import uuid
+import json
 import time
 import secrets
-from threading import Thread
-from dotenv import load_dotenv
-from playlist_converter import PlaylistConverter
-from config import LASTFM_PERIODS, APP_BASE_PATH, LASTFM_API_KEY
-from spotify_client import SpotifyClient
-from spotipy.oauth2 import SpotifyOAuth
+from config import LASTFM_PERIODS, APP_BASE_PATH, LASTFM_API_KEY, LAZY_STARTUP, CACHE_WARM_ENABLED
+from config import CACHE_REVALIDATE_ENABLED
 from config import SPOTIFY_CLIENT_ID, SPOTIFY_CLIENT_SECRET, SPOTIFY_REDIRECT_URI
-from spotipy.exceptions import SpotifyException
+from config import log_redirect_uri, SSE_KEEPALIVE_SECONDS
+from config import FLASK_SECRET_KEY, WEB_CONCURRENCY, is_production
 import logging
-from job_manager import job_manager
+from job_manager import job_manager, TERMINAL_STATUSES, PROGRESS_FIELDS
+from import_runner import start_import_job, resume_interrupted_jobs
+from metrics import registry
+from cost_estimator import estimate
+from config import JOB_MAX_SPOTIFY_REQUESTS
 import threading
 
+# Heavy modules (spotipy, tqdm and the converter stack) are imported on first
+# use so scale-to-zero cold starts can answer requests sooner. Environment
+# variables are loaded once, by config.
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Load environment variables
-load_dotenv()
-
 app = Flask(__name__)
-# Set a strong secret key for the session
-app.secret_key = os.getenv('FLASK_SECRET_KEY', secrets.token_hex(32))
+# Set a strong secret key for the session; a random one only works for a
+# single development process
+if not FLASK_SECRET_KEY and (is_production or WEB_CONCURRENCY > 1):
+    raise RuntimeError("FLASK_SECRET_KEY must be set in production or with more than one worker "
+                       "(WEB_CONCURRENCY), or sessions signed by one worker fail on the others")
+app.secret_key = FLASK_SECRET_KEY or secrets.token_hex(32)
 # Increase session timeout
 app.config['PERMANENT_SESSION_LIFETIME'] = 3600  # 1 hour
 
@@ -55,8 +61,19 @@ class ImportJob:
         self.error = None
         self.spotify_token = spotify_token
 
+def _playlist_converter_class():
+    """Import the converter stack on first use"""
+    from playlist_converter import PlaylistConverter
+    return PlaylistConverter
+
+def _spotify_client_class():
+    """Import the Spotify client (and spotipy) on first use"""
+    from spotify_client import SpotifyClient
+    return SpotifyClient
+
 def get_spotify_auth():
     """Get a SpotifyOAuth instance"""
+    from spotipy.oauth2 import SpotifyOAuth
     return SpotifyOAuth(
         client_id=SPOTIFY_CLIENT_ID,
         client_secret=SPOTIFY_CLIENT_SECRET,
@@ -113,12 +130,12 @@ def run_import_job(job):
             
             try:
                 # Verify token by getting user info first
-                spotify_client = SpotifyClient(access_token=job.spotify_token)
+                spotify_client = _spotify_client_class()(access_token=job.spotify_token)
                 spotify_user = spotify_client.get_current_user_info()
                 job.message = f"Authenticated as Spotify user: {spotify_user['name']} ({spotify_user['id']})"
                 
                 # Now create the converter with the verified token
-                converter = PlaylistConverter(spotify_access_token=job.spotify_token)
+                converter = _playlist_converter_class()(spotify_access_token=job.spotify_token)
             except Exception as e:
                 job.status = "failed"
                 job.error = f"Error with Spotify authentication: {str(e)}"
@@ -225,9 +242,11 @@ def callback():
         
         # Verify token works by getting user info
         print("Verifying token with user info...")
-        spotify_client = SpotifyClient(access_token=token_info['access_token'])
+        spotify_client = _spotify_client_class()(access_token=token_info['access_token'])
         user_info = spotify_client.get_current_user_info()
         print(f"Authenticated as Spotify user: {user_info['name']} ({user_info['id']})")
+        # Jobs are owned by (and only visible to) this Spotify user
+        session['spotify_user_id'] = user_info['id']
         
         # Redirect back to the main page
         return redirect(url_for('index'))
@@ -242,7 +261,7 @@ def check_auth():
     token = check_token()
     if token:
         try:
-            spotify_client = SpotifyClient(access_token=token)
+            spotify_client = _spotify_client_class()(access_token=token)
             user_info = spotify_client.get_current_user_info()
             return jsonify({
                 'authenticated': True,
@@ -263,10 +282,75 @@ def job_status(job_id):
     return jsonify({"error": "Job not found"}), 404
 
 
+def _sse_event(event: str, data, event_id: int = None) -> str:
+    """Format one Server-Sent Events message"""
+    message = f"event: {event}\n"
+    if event_id is not None:
+        message += f"id: {event_id}\n"
+    return message + f"data: {json.dumps(data)}\n\n"
+
+
+@app.route('/jobs/<job_id>/events')
+def job_events(job_id):
+    """Stream job progress as Server-Sent Events.
+    
+    Sends a `progress` event carrying only the fields that changed since the
+    last event, then a single `result` event once the job finishes.
+    """
+    # Ownership is checked once up front; the stream itself runs outside the
+    # request context
+    if not job_manager.get_job(job_id):
+        return jsonify({"error": "Job not found"}), 404
+    
+    def stream():
+        sent = {}
+        version = -1
+        while True:
+            new_version, snapshot = job_manager.wait_for_update(job_id, version, SSE_KEEPALIVE_SECONDS)
+            if snapshot is None:
+                yield _sse_event('error', {'error': 'Job not found'})
+                return
+            if new_version == version:
+                # Idle: keep the connection alive through proxies
+                yield ": keepalive\n\n"
+                continue
+            version = new_version
+            
+            delta = {field: value for field, value in snapshot.items()
+                     if field in PROGRESS_FIELDS and sent.get(field) != value}
+            if delta:
+                sent.update(delta)
+                yield _sse_event('progress', delta, version)
+            
+            if snapshot['status'] in TERMINAL_STATUSES:
+                yield _sse_event('result', snapshot, version)
+                return
+    
+    return Response(stream(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'  # don't let reverse proxies buffer the stream
+    })
+
+
+@app.route('/jobs/<job_id>/failed')
+def job_failed_tracks(job_id):
+    """Page through the tracks a job couldn't match"""
+    try:
+        offset = max(int(request.args.get('offset', 0)), 0)
+        limit = min(max(int(request.args.get('limit', 100)), 1), 1000)
+    except ValueError:
+        return jsonify({"error": "offset and limit must be integers"}), 400
+    
+    page = job_manager.get_result_details(job_id, 'failed_track_details', offset, limit)
+    if page is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(page)
+
+
 @app.route('/user_info/<lastfm_username>')
 def user_info(lastfm_username):
     try:
-        converter = PlaylistConverter()
+        converter = _playlist_converter_class()()
         user_info = converter.get_user_info(lastfm_username)
         
         if not user_info:
@@ -294,6 +378,12 @@ def health_check():
     return jsonify({"status": "healthy"})
 
 
+@app.route('/metrics')
+def metrics():
+    """Prometheus scrape endpoint (values are per worker process)"""
+    return Response(registry.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+
 @app.route('/progress/<job_id>')
 def get_progress(job_id):
     if job_id in import_progress:
@@ -311,67 +401,32 @@ def get_jobs():
     return jsonify(jobs)
 
 
-def process_import_job(job_id: str, username: str, import_type: str, period: str, limit: int):
-    """Process an import job in a background thread"""
+@app.route('/api/estimate')
+def estimate_import():
+    """Predict the API requests and duration of an import without starting it"""
+    username = request.args.get('username')
+    import_type = request.args.get('import_type')
+    period = request.args.get('period', 'overall')
     try:
-        converter = PlaylistConverter(lastfm_api_key=LASTFM_API_KEY)
-        job_manager.update_job(job_id, 'in_progress', 0, 'Starting import...')
-        
-        # Get tracks from Last.fm
-        tracks = converter.get_lastfm_tracks(username, import_type, period, limit)
-        if not tracks:
-            raise Exception("No tracks found")
-            
-        # Update progress
-        job_manager.update_job(job_id, 'in_progress', 30, 'Found tracks, searching on Spotify...')
-        
-        # Search tracks on Spotify
-        spotify_tracks = []
-        failed_tracks = []
-        for i, track in enumerate(tracks):
-            try:
-                # Truncate track name to 200 characters
-                track['name'] = track['name'][:200]
-                
-                spotify_track = converter.search_spotify_track(track)
-                if spotify_track:
-                    spotify_tracks.append(spotify_track)
-                else:
-                    failed_tracks.append(track)
-                
-                # Update progress
-                progress = 30 + int((i / len(tracks)) * 40)
-                job_manager.update_job(job_id, 'in_progress', progress, 
-                                     f'Found {len(spotify_tracks)}/{i+1} tracks on Spotify')
-            except Exception as e:
-                logger.error(f"Error processing track {track.get('name', 'unknown')}: {str(e)}")
-                failed_tracks.append(track)
-                continue
-        
-        if not spotify_tracks:
-            raise Exception("No matching tracks found on Spotify")
-        
-        # Create playlist
-        job_manager.update_job(job_id, 'in_progress', 80, 'Creating Spotify playlist...')
-        playlist = converter.create_spotify_playlist(
-            session['spotify_token'],
-            f"Last.fm {import_type.title()} - {period}",
-            spotify_tracks
-        )
-        
-        job_manager.update_job(job_id, 'completed', 100, 
-                             f'Successfully created playlist with {len(spotify_tracks)} tracks',
-                             result={
-                                 'playlist_url': playlist['external_urls']['spotify'],
-                                 'total_tracks': len(tracks),
-                                 'matched_tracks': len(spotify_tracks),
-                                 'failed_tracks': len(failed_tracks),
-                                 'failed_track_details': failed_tracks
-                             })
-        
+        limit = int(request.args.get('limit', 50))
+    except ValueError:
+        return jsonify({'error': 'Invalid track limit'}), 400
+    
+    if not username or import_type not in ('top', 'recent', 'loved'):
+        return jsonify({'error': 'Missing required parameters'}), 400
+    
+    if limit < 10 or limit > 10000:
+        return jsonify({'error': 'Invalid track limit'}), 400
+    
+    try:
+        from lastfm_client import LastFmClient
+        available = LastFmClient(LASTFM_API_KEY).get_total_tracks(username, import_type, period)
     except Exception as e:
-        logger.error(f"Error processing job {job_id}: {str(e)}")
-        job_manager.update_job(job_id, 'failed', 0, f'Import failed: {str(e)}', error=str(e))
+        return jsonify({'error': str(e)}), 502
+    
+    cost = estimate(import_type, limit, available)
+    cost['available_tracks'] = available
+    return jsonify(cost)
 
 
 @app.route('/api/import', methods=['POST'])
@@ -392,6 +447,11 @@ def start_import():
     if limit < 10 or limit > 10000:
         return jsonify({'error': 'Invalid track limit'}), 400
     
+    cost = estimate(import_type, limit)
+    if cost['spotify_requests'] > JOB_MAX_SPOTIFY_REQUESTS:
+        return jsonify({'error': 'Import would exceed the per-job Spotify request budget',
+                        'estimate': cost}), 400
+    
     # Create new job
     job_id = job_manager.create_job('import', {
         'username': username,
@@ -400,20 +460,74 @@ def start_import():
         'limit': limit
     })
     
-    # Start processing in background
-    thread = threading.Thread(
-        target=process_import_job,
-        args=(job_id, username, import_type, period, limit)
-    )
-    thread.daemon = True
-    thread.start()
+    # Start processing in background (the thread has no access to the session,
+    # and the refresh token lets a resumed job outlive the access token)
+    start_import_job(job_id, {
+        'username': username,
+        'import_type': import_type,
+        'period': period,
+        'limit': limit
+    }, {
+        'access_token': session['spotify_token'],
+        'refresh_token': session.get('spotify_refresh_token'),
+        'expires_at': session.get('spotify_token_expires_at')
+    })
     
     return jsonify({'job_id': job_id})
 
 
+_background_pid = None
+_background_lock = threading.Lock()
+
+
+def start_background_work():
+    """Start this process's background threads, once per process.
+
+    Called from gunicorn's post_fork hook (gunicorn.conf.py) and, for other
+    servers, on the first request; never at import, so with gunicorn
+    --preload they run in each worker rather than the master (which would
+    hold the checkpoint locks and run resumed imports itself).
+    """
+    global _background_pid
+    with _background_lock:
+        if _background_pid == os.getpid():
+            return
+        _background_pid = os.getpid()
+
+    # Expire finished jobs in the background; the first sweep loads the job store
+    # if no request has yet
+    job_manager.start_sweeper()
+
+    # Pick up imports that were running when the previous process stopped
+    threading.Thread(target=resume_interrupted_jobs, name='job-resumer', daemon=True).start()
+
+    if CACHE_WARM_ENABLED:
+        # Match chart tracks ahead of new users' imports, when the instance is idle
+        from cache_warmer import start_cache_warmer
+        start_cache_warmer()
+
+    if CACHE_REVALIDATE_ENABLED:
+        # Check cached matches for relinked and withdrawn tracks, when the instance is idle
+        from cache_revalidator import start_cache_revalidator
+        start_cache_revalidator()
+
+
+@app.before_request
+def _ensure_background_work():
+    if _background_pid != os.getpid():
+        start_background_work()
+
+if not LAZY_STARTUP:
+    # Eager startup: pay for the heavy imports and the job store up front
+    # (useful with gunicorn --preload, where workers fork after loading)
+    _playlist_converter_class()
+    job_manager.load()
+
+
 if __name__ == '__main__':
     # Create templates directory if it doesn't exist
     os.makedirs('templates', exist_ok=True)
+    log_redirect_uri()
     
     # For local development
     app.run(debug=True, host='0.0.0.0', port=int(os.environ.get('PORT', 8000)))
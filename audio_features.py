@@ -0,0 +1,134 @@
+import logging
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+
+from config import AUDIO_FEATURES_DB, MATCH_CACHE_MISS_TTL_DAYS
+from event_loop import event_loop
+from metrics import CACHE_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+# The numeric fields of Spotify's audio features object, one column each
+FEATURE_COLUMNS = (
+    'danceability', 'energy', 'key', 'loudness', 'mode', 'speechiness', 'acousticness',
+    'instrumentalness', 'liveness', 'valence', 'tempo', 'duration_ms', 'time_signature'
+)
+
+# Ids per SELECT ... IN (...), below SQLite's variable limit
+LOOKUP_CHUNK = 500
+
+
+class AudioFeaturesStore:
+    """Spotify audio features by track id, kept in a compact local table.
+
+    get_many() reads what the table already has and fetches the rest from
+    Spotify, 100 ids per request with the requests in flight together, so
+    analysing a 10,000-track library takes about 100 requests the first time
+    and none after that. Only the numeric fields are kept (one row of REALs
+    per track). A track's features don't change, so they are kept for good;
+    tracks Spotify has no features for are asked again after
+    MATCH_CACHE_MISS_TTL_DAYS. An empty db_path turns the table off.
+    """
+
+    SCHEMA = f"""
+        CREATE TABLE IF NOT EXISTS audio_features (
+            track_id TEXT PRIMARY KEY,
+            {', '.join(f'{column} REAL' for column in FEATURE_COLUMNS)},
+            fetched_at REAL NOT NULL
+        ) WITHOUT ROWID;
+    """
+
+    def __init__(self, db_path: str = AUDIO_FEATURES_DB, miss_ttl_days: int = MATCH_CACHE_MISS_TTL_DAYS):
+        self.db_path = db_path
+        self.miss_ttl_seconds = miss_ttl_days * 86400
+        # sqlite3 connections can't be shared between threads
+        self._local = threading.local()
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            with self._schema_lock:
+                if not self._schema_ready:
+                    conn.executescript(self.SCHEMA)
+                    self._schema_ready = True
+        return conn
+
+    def lookup(self, track_ids: List[str]) -> Dict[str, Optional[Dict]]:
+        """The stored features of the ids the table knows (None: Spotify has none)"""
+        if not self.db_path:
+            return {}
+        found = {}
+        miss_cutoff = time.time() - self.miss_ttl_seconds
+        try:
+            conn = self._conn()
+            for start in range(0, len(track_ids), LOOKUP_CHUNK):
+                chunk = track_ids[start:start + LOOKUP_CHUNK]
+                rows = conn.execute(
+                    f"SELECT track_id, fetched_at, {', '.join(FEATURE_COLUMNS)} FROM audio_features "
+                    f"WHERE track_id IN ({', '.join('?' * len(chunk))})", chunk)
+                for track_id, fetched_at, *values in rows:
+                    if all(value is None for value in values):
+                        if fetched_at >= miss_cutoff:
+                            found[track_id] = None
+                    else:
+                        found[track_id] = self._features(track_id, values)
+        except sqlite3.Error as e:
+            logger.warning(f"Audio features lookup failed: {str(e)}")
+        return found
+
+    @staticmethod
+    def _features(track_id: str, values: Iterable) -> Dict:
+        features = dict(zip(FEATURE_COLUMNS, values))
+        for column in ('key', 'mode', 'duration_ms', 'time_signature'):
+            if features[column] is not None:
+                features[column] = int(features[column])
+        features['id'] = track_id
+        return features
+
+    def store(self, features: Dict[str, Optional[Dict]]) -> None:
+        """Keep fetched features by track id (None for tracks Spotify has none for)"""
+        if not self.db_path or not features:
+            return
+        now = time.time()
+        rows = [(track_id, *((item or {}).get(column) for column in FEATURE_COLUMNS), now)
+                for track_id, item in features.items()]
+        try:
+            conn = self._conn()
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                conn.executemany(
+                    f"INSERT OR REPLACE INTO audio_features (track_id, {', '.join(FEATURE_COLUMNS)}, fetched_at) "
+                    f"VALUES ({', '.join('?' * (len(FEATURE_COLUMNS) + 2))})", rows)
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+            conn.execute('COMMIT')
+        except sqlite3.Error as e:
+            logger.warning(f"Dropped {len(rows)} audio features: {str(e)}")
+
+    def get_many(self, track_ids: Iterable[str], spotify) -> Dict[str, Optional[Dict]]:
+        """Features of every id (None where Spotify has none), fetching only
+        what the table lacks through spotify, an AsyncSpotifyClient"""
+        track_ids = list(dict.fromkeys(track_ids))
+        found = self.lookup(track_ids)
+        missing = [track_id for track_id in track_ids if track_id not in found]
+        CACHE_REQUESTS.inc(len(found), cache='audio_features', result='hit')
+        CACHE_REQUESTS.inc(len(missing), cache='audio_features', result='miss')
+        if missing:
+            fetched = event_loop.run(spotify.get_audio_features(missing))
+            self.store(fetched)
+            found.update({track_id: self._features(track_id, (item.get(column) for column in FEATURE_COLUMNS))
+                          if item else None for track_id, item in fetched.items()})
+        return {track_id: found.get(track_id) for track_id in track_ids}
+
+
+# Global store shared by every client in the process
+audio_features_store = AudioFeaturesStore()
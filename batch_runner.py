@@ -0,0 +1,291 @@
+import json
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Callable, Dict, List
+
+from config import (
+    DEFAULT_LIMIT, LASTFM_PERIODS, BATCH_PROCESSES, BATCH_THREADS,
+    SPOTIFY_CLIENT_ID, SPOTIFY_CLIENT_SECRET, SPOTIFY_REDIRECT_URI
+)
+from checkpoint_store import checkpoint_store
+from concurrency import priority, spotify_limiter, lastfm_limiter
+from cost_estimator import job_budget, conversion_stats
+from metrics import WORKERS_ACTIVE
+from tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+IMPORT_TYPES = ('top', 'recent', 'loved')
+
+# Keys a manifest job (or the manifest's `defaults`) may set
+JOB_KEYS = {
+    'username', 'import_type', 'period', 'limit', 'name', 'description', 'public',
+    'spotify_refresh_token', 'spotify_access_token'
+}
+
+
+class ManifestError(ValueError):
+    """The batch manifest can't be read or lists an invalid job"""
+
+
+def load_manifest(path: str) -> List[Dict[str, Any]]:
+    """The jobs of a YAML manifest, each with the manifest's `defaults` filled in.
+
+    A manifest looks like:
+
+        defaults:
+          import_type: top
+          period: 3month
+          limit: 500
+        jobs:
+          - username: alice
+            spotify_refresh_token: $ALICE_SPOTIFY_REFRESH_TOKEN
+          - {username: bob, import_type: loved}
+
+    Jobs without a Spotify token import into the account the CLI is
+    authorized as. $VARIABLES in tokens are read from the environment.
+    """
+    import yaml
+    try:
+        with open(path) as f:
+            manifest = yaml.safe_load(f) or {}
+    except (OSError, yaml.YAMLError) as e:
+        raise ManifestError(f"Can't read manifest {path}: {e}")
+    if isinstance(manifest, list):
+        manifest = {'jobs': manifest}
+    if not isinstance(manifest, dict):
+        raise ManifestError(f"{path} must hold a `jobs` list")
+
+    defaults = manifest.get('defaults') or {}
+    jobs = []
+    for index, entry in enumerate(manifest.get('jobs') or []):
+        if isinstance(entry, str):
+            entry = {'username': entry}
+        job = dict(defaults, **entry)
+        unknown = set(job) - JOB_KEYS
+        if unknown:
+            raise ManifestError(f"Job {index + 1}: unknown keys {', '.join(sorted(unknown))}")
+        if not job.get('username'):
+            raise ManifestError(f"Job {index + 1}: username is required")
+        job.setdefault('import_type', 'top')
+        job.setdefault('period', 'overall')
+        job.setdefault('limit', DEFAULT_LIMIT)
+        job.setdefault('public', True)
+        if job['import_type'] not in IMPORT_TYPES:
+            raise ManifestError(f"Job {index + 1}: import_type must be one of {', '.join(IMPORT_TYPES)}")
+        if job['period'] not in LASTFM_PERIODS:
+            raise ManifestError(f"Job {index + 1}: period must be one of {', '.join(LASTFM_PERIODS)}")
+        if not isinstance(job['limit'], int) or job['limit'] < 1:
+            raise ManifestError(f"Job {index + 1}: limit must be a positive number")
+        for key in ('spotify_refresh_token', 'spotify_access_token'):
+            if job.get(key):
+                job[key] = os.path.expandvars(str(job[key]))
+        job['index'] = index
+        jobs.append(job)
+    return jobs
+
+
+def cli_authorized() -> bool:
+    """Whether the CLI has a cached Spotify authorization, which jobs without
+    a token of their own use (a batch can't stop to ask for one)"""
+    from spotipy.oauth2 import SpotifyOAuth
+    from spotify_client import OAUTH_SCOPE
+    auth_manager = SpotifyOAuth(client_id=SPOTIFY_CLIENT_ID, client_secret=SPOTIFY_CLIENT_SECRET,
+                                redirect_uri=SPOTIFY_REDIRECT_URI, scope=OAUTH_SCOPE)
+    try:
+        return auth_manager.validate_token(auth_manager.cache_handler.get_cached_token()) is not None
+    except Exception as e:
+        logger.warning(f"Cached Spotify authorization is unusable: {str(e)}")
+        return False
+
+
+def run_job(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Run one manifest job under its own checkpoint; returns its summary entry.
+
+    A job that fails keeps its checkpoint, so `main.py resume <job_id>`
+    carries on from where it stopped.
+    """
+    from playlist_converter import PlaylistConverter
+    params = {key: job.get(key) for key in ('username', 'import_type', 'period', 'limit',
+                                             'name', 'description', 'public')}
+    token = None
+    if job.get('spotify_refresh_token') or job.get('spotify_access_token'):
+        token = {'access_token': job.get('spotify_access_token'),
+                 'refresh_token': job.get('spotify_refresh_token'),
+                 # A refresh token alone is exchanged for an access token first
+                 'expires_at': 0 if job.get('spotify_refresh_token') else None}
+    job_id = f"batch_{int(time.time())}_{uuid.uuid4().hex[:8]}"
+
+    summary = {
+        'job': job['index'], 'job_id': job_id, 'username': params['username'],
+        'import_type': params['import_type'], 'period': params['period'], 'limit': params['limit'],
+        'status': 'failed'
+    }
+    start = time.perf_counter()
+    checkpoint = None
+    WORKERS_ACTIVE.inc()
+    try:
+        # Inside the try: a job whose checkpoint can't be created fails on its own
+        checkpoint = checkpoint_store.create(job_id, dict(params, kind='batch', token=token))
+        with priority('bulk'), \
+                tracer.trace('batch_job', job_id=job_id, import_type=params['import_type'],
+                             limit=params['limit']):
+            converter = PlaylistConverter(spotify_access_token=checkpoint.access_token() if token else None,
+                                          budget=job_budget(params['limit'], capped=False))
+            result = converter.resume_conversion(checkpoint)
+    except Exception as e:
+        logger.error(f"Batch job {job_id} ({params['username']}) failed: {str(e)}")
+        if checkpoint is not None:
+            checkpoint.release()
+        else:
+            summary['job_id'] = None  # nothing to resume
+        summary['error'] = str(e)
+    else:
+        checkpoint_store.complete(checkpoint)
+        conversion_stats.record(params['import_type'], converter.stats)
+        summary.update(
+            status='completed',
+            playlists=[playlist['url'] for playlist in result['playlists']],
+            total_tracks=result['total_lastfm_tracks'],
+            matched_tracks=result['matched_tracks'],
+            added_tracks=result['added_tracks'],
+            match_rate=round(result['match_rate'], 1),
+            stats=converter.stats
+        )
+    finally:
+        WORKERS_ACTIVE.dec()
+        summary['seconds'] = round(time.perf_counter() - start, 2)
+    return summary
+
+
+def _work(jobs, results, threads: int) -> None:
+    """Run jobs from the jobs queue on `threads` threads until each takes a
+    None, putting every job's summary in the results queue"""
+    def worker():
+        while True:
+            job = jobs.get()
+            if job is None:
+                return
+            results.put(run_job(job))
+
+    pool = [threading.Thread(target=worker, name=f'batch-{i}', daemon=True) for i in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+
+
+def _worker_process(jobs, results, threads: int, processes: int) -> None:
+    """Entry point of a batch worker process"""
+    # This process's share of the API concurrency limits, so all of them
+    # together don't send more than one process would
+    for limiter in (spotify_limiter, lastfm_limiter):
+        limiter.maximum = max(limiter.minimum, limiter.maximum // processes)
+        limiter.limit = min(limiter.limit, limiter.maximum)
+    _work(jobs, results, threads)
+
+
+def run_batch(jobs: List[Dict[str, Any]], processes: int = BATCH_PROCESSES, threads: int = BATCH_THREADS,
+              on_result: Callable[[Dict[str, Any]], None] = None) -> Dict[str, Any]:
+    """Run manifest jobs on `processes` worker processes with `threads` imports
+    at once in each, and summarize throughput and match rates.
+
+    Threads of a process share its API concurrency limiters, event loop and
+    in-memory match cache; all processes share the match cache database.
+    With one process the jobs run in this one. on_result is called with each
+    job's summary entry as it finishes.
+    """
+    started_at = datetime.now().isoformat()
+    start = time.perf_counter()
+    if processes <= 1:
+        job_queue, results = queue.Queue(), queue.Queue()
+        workers = [threading.Thread(target=_work, args=(job_queue, results, threads), daemon=True)]
+    else:
+        # Spawned, not forked: the parent's event loop and pool threads don't survive a fork
+        context = multiprocessing.get_context('spawn')
+        job_queue, results = context.Queue(), context.Queue()
+        workers = [context.Process(target=_worker_process, args=(job_queue, results, threads, processes),
+                                   name=f'batch-worker-{i}')
+                   for i in range(processes)]
+
+    for job in jobs:
+        job_queue.put(job)
+    for _ in range(max(1, processes) * threads):
+        job_queue.put(None)
+    for worker in workers:
+        worker.start()
+
+    entries = []
+    while len(entries) < len(jobs):
+        try:
+            entry = results.get(timeout=1)
+        except queue.Empty:
+            if not any(worker.is_alive() for worker in workers):
+                break
+            continue
+        entries.append(entry)
+        if on_result:
+            on_result(entry)
+    for worker in workers:
+        worker.join()
+
+    # Jobs of a worker process that died never report back
+    finished = {entry['job'] for entry in entries}
+    for job in jobs:
+        if job['index'] not in finished:
+            entries.append({'job': job['index'], 'job_id': None, 'username': job['username'],
+                            'import_type': job['import_type'], 'period': job['period'],
+                            'limit': job['limit'], 'status': 'failed', 'error': 'Worker process exited'})
+
+    return summarize(sorted(entries, key=lambda entry: entry['job']), started_at,
+                     time.perf_counter() - start, processes, threads)
+
+
+def summarize(entries: List[Dict[str, Any]], started_at: str, seconds: float,
+              processes: int, threads: int) -> Dict[str, Any]:
+    """Totals, throughput and match rates of a batch run, with each job's entry"""
+    completed = [entry for entry in entries if entry['status'] == 'completed']
+
+    def total(key: str) -> int:
+        return sum(entry.get(key, 0) for entry in completed)
+
+    def total_stat(key: str) -> int:
+        return sum(entry['stats'].get(key, 0) for entry in completed)
+
+    tracks = total('total_tracks')
+    unique_tracks = total_stat('unique_tracks')
+    return {
+        'started_at': started_at,
+        'finished_at': datetime.now().isoformat(),
+        'seconds': round(seconds, 2),
+        'processes': processes,
+        'threads': threads,
+        'jobs': len(entries),
+        'completed': len(completed),
+        'failed': len(entries) - len(completed),
+        'tracks': tracks,
+        'matched_tracks': total('matched_tracks'),
+        'added_tracks': total('added_tracks'),
+        'match_rate': round(total('matched_tracks') / tracks * 100, 1) if tracks else None,
+        'tracks_per_second': round(tracks / seconds, 1) if seconds else None,
+        'jobs_per_minute': round(len(completed) / seconds * 60, 1) if seconds else None,
+        'spotify_searches': total_stat('searches'),
+        # Unique tracks matched without a search (match cache or checkpoint)
+        'cache_hit_rate': round(1 - total_stat('searched_tracks') / unique_tracks, 3) if unique_tracks else None,
+        'results': entries
+    }
+
+
+def write_summary(summary: Dict[str, Any], path: str) -> None:
+    """Write the summary as JSON, replacing the file in one step"""
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, 'w') as f:
+        json.dump(summary, f, indent=2)
+        f.write('\n')
+    os.replace(temporary, path)
@@ -0,0 +1,145 @@
+import logging
+import threading
+import time
+from typing import Dict, Optional
+
+from config import (
+    SPOTIFY_CLIENT_ID, SPOTIFY_CLIENT_SECRET, SPOTIFY_MARKET,
+    CACHE_REVALIDATE_INTERVAL_HOURS, CACHE_REVALIDATE_AFTER_DAYS, CACHE_REVALIDATE_MAX_REQUESTS,
+    CACHE_WARM_PAUSE_SECONDS
+)
+from concurrency import priority, foreground_busy, RateLimited
+from cost_estimator import RequestBudget, BudgetExceeded
+from event_loop import event_loop
+from match_cache import MatchCache, match_cache
+from metrics import CACHE_REVALIDATIONS
+from spotify_client import AsyncSpotifyClient, TRACKS_PER_REQUEST
+
+logger = logging.getLogger(__name__)
+
+
+class CacheRevalidator:
+    """Checks cached matches against Spotify, 50 track ids per request.
+
+    Spotify relinks tracks to new ids and withdraws others, so a cached match
+    can go stale. Instead of searching each track again, a round looks up
+    the cached ids that haven't been confirmed for CACHE_REVALIDATE_AFTER_DAYS,
+    oldest first, through the several-tracks endpoint in the market. Playable
+    tracks are confirmed (their TTL starts over), relinked ones are replaced
+    by the track they now point to, and unplayable or removed ones are
+    dropped from the cache, so the next import that needs them searches
+    again. Rounds run in the 'background' lane, pause while imports run, and
+    stop at their request budget; the next round carries on from the oldest.
+    """
+
+    def __init__(self, spotify: AsyncSpotifyClient, cache: MatchCache = match_cache,
+                 market: str = SPOTIFY_MARKET, after_days: float = CACHE_REVALIDATE_AFTER_DAYS,
+                 max_requests: int = CACHE_REVALIDATE_MAX_REQUESTS):
+        self.spotify = spotify
+        self.cache = cache
+        self.market = market
+        self.after_seconds = after_days * 86400
+        self.max_requests = max_requests
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def check_batch(self, batch) -> Dict[str, int]:
+        """Revalidate up to TRACKS_PER_REQUEST (key, track id) pairs with one request"""
+        items = event_loop.run(self.spotify.get_tracks([track_id for _, track_id in batch], self.market))
+        counts = {'valid': 0, 'relinked': 0, 'unplayable': 0, 'removed': 0}
+        confirmed, replaced, stale = [], {}, []
+        for (key, track_id), item in zip(batch, items):
+            if item is None:
+                counts['removed'] += 1
+                stale.append(key)
+            elif item.get('is_playable') is False:
+                counts['unplayable'] += 1
+                stale.append(key)
+            elif item['id'] != track_id:
+                counts['relinked'] += 1
+                replaced[key] = self.spotify.track_summary(item)
+            else:
+                counts['valid'] += 1
+                confirmed.append(key)
+        self.cache.revalidated(confirmed, replaced, stale)
+        return counts
+
+    def run_once(self) -> Dict[str, int]:
+        """One revalidation round; returns how many matches ended up each way"""
+        counts = {'valid': 0, 'relinked': 0, 'unplayable': 0, 'removed': 0}
+        self.spotify.budget = RequestBudget({'spotify': self.max_requests})
+        start = time.time()
+        with priority('background'):
+            while not self._stop.is_set():
+                while foreground_busy() and not self._stop.is_set():
+                    self._stop.wait(CACHE_WARM_PAUSE_SECONDS)
+                batch = self.cache.oldest_matches(self.after_seconds, TRACKS_PER_REQUEST)
+                if not batch or self._stop.is_set():
+                    break
+                try:
+                    found = self.check_batch(batch)
+                except (BudgetExceeded, RateLimited) as e:
+                    logger.info(f"Cache revalidation round stopped early: {str(e)}")
+                    break
+                for result, count in found.items():
+                    counts[result] += count
+                    CACHE_REVALIDATIONS.inc(count, result=result)
+
+        logger.info(f"✅ Cache revalidation round done in {time.time() - start:.0f}s: {counts}")
+        return counts
+
+    def run_locked(self) -> Optional[Dict[str, int]]:
+        """run_once(), unless another process on the host is already revalidating the same cache"""
+        with self.cache.host_lock('revalidate') as locked:
+            if not locked:
+                logger.info("Another process is revalidating the match cache; skipping this round")
+                return None
+            return self.run_once()
+
+    def start(self, interval_hours: float = CACHE_REVALIDATE_INTERVAL_HOURS) -> None:
+        """Revalidate every interval_hours in a background thread"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+
+        def revalidate():
+            while not self._stop.wait(interval_hours * 3600):
+                try:
+                    self.run_locked()
+                except Exception as e:
+                    logger.error(f"Cache revalidation failed: {str(e)}")
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=revalidate, name='cache-revalidator', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the background thread (a running round stops after its current batch)"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+def create_revalidator(**kwargs) -> Optional[CacheRevalidator]:
+    """A revalidator using a Spotify app token, or None without the app's credentials"""
+    if not (SPOTIFY_CLIENT_ID and SPOTIFY_CLIENT_SECRET):
+        logger.warning("Cache revalidation needs SPOTIFY_CLIENT_ID and SPOTIFY_CLIENT_SECRET")
+        return None
+    from spotipy.cache_handler import MemoryCacheHandler
+    from spotipy.oauth2 import SpotifyClientCredentials
+    # App tokens are kept in memory, not in a .cache file in the working directory
+    auth_manager = SpotifyClientCredentials(client_id=SPOTIFY_CLIENT_ID, client_secret=SPOTIFY_CLIENT_SECRET,
+                                            cache_handler=MemoryCacheHandler())
+    return CacheRevalidator(AsyncSpotifyClient(auth_manager=auth_manager), **kwargs)
+
+
+_revalidator: Optional[CacheRevalidator] = None
+
+
+def start_cache_revalidator() -> None:
+    """Start the process's background revalidator (see CACHE_REVALIDATE_ENABLED)"""
+    global _revalidator
+    if _revalidator is None:
+        _revalidator = create_revalidator()
+    if _revalidator is not None:
+        _revalidator.start()
@@ -0,0 +1,185 @@
+import logging
+import threading
+import time
+from typing import Dict, List, Optional
+
+from config import (
+    LASTFM_API_KEY, SPOTIFY_CLIENT_ID, SPOTIFY_CLIENT_SECRET,
+    CACHE_WARM_INTERVAL_HOURS, CACHE_WARM_COUNTRIES, CACHE_WARM_CHART_TRACKS,
+    CACHE_WARM_CHART_ARTISTS, CACHE_WARM_ARTIST_TRACKS, CACHE_WARM_MAX_SEARCHES,
+    CACHE_WARM_START_DELAY_SECONDS, CACHE_WARM_PAUSE_SECONDS
+)
+from concurrency import priority, foreground_busy, RateLimited
+from cost_estimator import RequestBudget, BudgetExceeded, LASTFM_PAGE_SIZE
+from event_loop import event_loop
+from lastfm_client import LastFmClient
+from match_cache import MatchCache, match_cache, match_key
+from metrics import CACHE_WARM_TRACKS
+from spotify_client import AsyncSpotifyClient
+
+logger = logging.getLogger(__name__)
+
+# Searched tracks are written to the cache in batches of this many
+WARM_BATCH = 100
+
+
+class CacheWarmer:
+    """Resolves popular tracks into the match cache before anyone imports them.
+
+    A round reads Last.fm's global and per-country top tracks and the top
+    tracks of the global chart's artists, and searches Spotify (one track at
+    a time, in the 'background' lane) for the ones the cache doesn't know.
+    While imports run in this process, or other lanes wait for Spotify, the
+    round pauses. It ends early when its request budget is used up or
+    Spotify keeps rate limiting; the next round skips whatever got cached.
+    """
+
+    def __init__(self, lastfm: LastFmClient, spotify: AsyncSpotifyClient,
+                 cache: MatchCache = match_cache, countries: List[str] = None,
+                 chart_tracks: int = CACHE_WARM_CHART_TRACKS,
+                 chart_artists: int = CACHE_WARM_CHART_ARTISTS,
+                 artist_tracks: int = CACHE_WARM_ARTIST_TRACKS,
+                 max_searches: int = CACHE_WARM_MAX_SEARCHES):
+        self.lastfm = lastfm
+        self.spotify = spotify
+        self.cache = cache
+        self.countries = CACHE_WARM_COUNTRIES if countries is None else countries
+        self.chart_tracks = chart_tracks
+        self.chart_artists = chart_artists
+        self.artist_tracks = artist_tracks
+        self.max_searches = max_searches
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _chart(self, fetch, count: int) -> List:
+        """Up to count entries of a Last.fm chart, a page at a time"""
+        entries = []
+        page = 1
+        while len(entries) < count:
+            found = fetch(LASTFM_PAGE_SIZE, page)
+            entries.extend(found)
+            if len(found) < LASTFM_PAGE_SIZE:
+                break
+            page += 1
+        return entries[:count]
+
+    def candidates(self) -> List[Dict]:
+        """Normalized chart tracks, most popular charts first, without duplicates"""
+        raw = []
+        for country in [None] + self.countries:
+            raw.extend(self._chart(
+                lambda limit, page: self.lastfm.get_top_tracks(country, limit, page), self.chart_tracks))
+        artists = self._chart(
+            lambda limit, page: self.lastfm.get_top_artists(None, limit, page), self.chart_artists)
+        for artist in artists:
+            if self._stop.is_set():
+                break
+            raw.extend(self.lastfm.get_artist_top_tracks(artist, self.artist_tracks))
+
+        tracks = {}
+        for track in raw:
+            track = self.lastfm.normalize_track_data(track)
+            if track['artist'] and track['track']:
+                tracks.setdefault(match_key(track), track)
+        return list(tracks.values())
+
+    def run_once(self) -> Dict[str, int]:
+        """One warming round; returns how many chart tracks ended up each way"""
+        counts = {'cached': 0, 'matched': 0, 'unmatched': 0, 'failed': 0}
+        self.spotify.budget = RequestBudget({'spotify': self.max_searches})
+        start = time.time()
+        with priority('background'):
+            tracks = self.candidates()
+            logger.info(f"🔥 Warming the match cache with {len(tracks)} chart tracks")
+            fresh = []
+            try:
+                for track in tracks:
+                    # Not get(): warming shouldn't count as demand for a track
+                    if self.cache.contains(track):
+                        counts['cached'] += 1
+                        continue
+                    while foreground_busy() and not self._stop.is_set():
+                        self._stop.wait(CACHE_WARM_PAUSE_SECONDS)
+                    if self._stop.is_set():
+                        break
+
+                    try:
+                        match = event_loop.run(self.spotify.find_match(track))
+                    except (BudgetExceeded, RateLimited) as e:
+                        logger.info(f"Cache warming round stopped early: {str(e)}")
+                        break
+                    except Exception as e:
+                        counts['failed'] += 1
+                        logger.warning(f"Cache warming search failed for {track['artist']} - {track['track']}: {str(e)}")
+                        continue
+                    counts['matched' if match else 'unmatched'] += 1
+                    fresh.append((track, match))
+                    if len(fresh) >= WARM_BATCH:
+                        self.cache.put_many(fresh)
+                        fresh = []
+            finally:
+                self.cache.put_many(fresh)
+
+        for result, count in counts.items():
+            CACHE_WARM_TRACKS.inc(count, result=result)
+        logger.info(f"✅ Cache warming round done in {time.time() - start:.0f}s: {counts}")
+        return counts
+
+    def run_locked(self) -> Optional[Dict[str, int]]:
+        """run_once(), unless another process on the host is already warming the same cache"""
+        with self.cache.host_lock('warm') as locked:
+            if not locked:
+                logger.info("Another process is warming the match cache; skipping this round")
+                return None
+            return self.run_once()
+
+    def start(self, interval_hours: float = CACHE_WARM_INTERVAL_HOURS,
+              delay_seconds: float = CACHE_WARM_START_DELAY_SECONDS) -> None:
+        """Warm the cache shortly after startup, then every interval_hours, in a background thread"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+
+        def warm():
+            wait = delay_seconds
+            while not self._stop.wait(wait):
+                try:
+                    self.run_locked()
+                except Exception as e:
+                    logger.error(f"Cache warming failed: {str(e)}")
+                wait = interval_hours * 3600
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=warm, name='cache-warmer', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the background thread (a running round stops after its current search)"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+def create_warmer(**kwargs) -> Optional[CacheWarmer]:
+    """A warmer using the app's Last.fm key and a Spotify app token, or None without them"""
+    if not (LASTFM_API_KEY and SPOTIFY_CLIENT_ID and SPOTIFY_CLIENT_SECRET):
+        logger.warning("Cache warming needs LASTFM_API_KEY, SPOTIFY_CLIENT_ID and SPOTIFY_CLIENT_SECRET")
+        return None
+    from spotipy.cache_handler import MemoryCacheHandler
+    from spotipy.oauth2 import SpotifyClientCredentials
+    # App tokens are kept in memory, not in a .cache file in the working directory
+    auth_manager = SpotifyClientCredentials(client_id=SPOTIFY_CLIENT_ID, client_secret=SPOTIFY_CLIENT_SECRET,
+                                            cache_handler=MemoryCacheHandler())
+    return CacheWarmer(LastFmClient(), AsyncSpotifyClient(auth_manager=auth_manager), **kwargs)
+
+
+_warmer: Optional[CacheWarmer] = None
+
+
+def start_cache_warmer() -> None:
+    """Start the process's background warmer (see CACHE_WARM_ENABLED)"""
+    global _warmer
+    if _warmer is None:
+        _warmer = create_warmer()
+    if _warmer is not None:
+        _warmer.start()
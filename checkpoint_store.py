@@ -0,0 +1,210 @@
+import fcntl
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from config import CHECKPOINT_DIR, SPOTIFY_CLIENT_ID, SPOTIFY_CLIENT_SECRET, SPOTIFY_REDIRECT_URI
+
+
+class CheckpointBusy(Exception):
+    """The checkpoint is held by a conversion that is still running"""
+
+
+class Checkpoint:
+    """Progress of one conversion, persisted as it happens.
+
+    Backed by an append-only JSON-lines file: a header with the conversion
+    parameters followed by one event per fetched page, resolved match,
+    created playlist (one per shard of a large import) and acknowledged
+    playlist chunk (numbered across shards). Reopening the file
+    replays the events, so a restarted conversion skips everything already
+    paid for. The file stays exclusively locked while a conversion holds it.
+    """
+
+    def __init__(self, path: str, job_id: str, handle):
+        self.path = path
+        self.job_id = job_id
+        self.params: Dict[str, Any] = {}
+        self.pages: Dict[int, List[Dict]] = {}
+        self.matches: Dict[str, Optional[Dict]] = {}
+        self.playlists: Dict[int, Dict] = {}
+        self.added_chunks: Set[int] = set()
+        self._handle = handle
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def match_key(track: Dict) -> str:
+        return f"{track['artist'].lower()}\x1f{track['track'].lower()}"
+
+    def _replay(self) -> None:
+        self._handle.seek(0)
+        intact = 0
+        for line in self._handle.read().splitlines(keepends=True):
+            try:
+                event = json.loads(line)
+            except ValueError:
+                break
+            if not line.endswith(b'\n'):
+                break
+            intact += len(line)
+
+            kind = event['type']
+            if kind == 'start':
+                self.params = event['params']
+            elif kind == 'page':
+                self.pages[event['page']] = event['tracks']
+            elif kind == 'match':
+                self.matches[event['key']] = event['match']
+            elif kind == 'playlist':
+                self.playlists[event.get('shard', 0)] = event['playlist']
+            elif kind == 'chunk':
+                self.added_chunks.add(event['index'])
+            elif kind == 'params':
+                self.params.update(event['params'])
+
+        # Drop a torn final write left by a crash so new events append cleanly
+        self._handle.seek(intact)
+        self._handle.truncate()
+
+    def _append(self, event: Dict[str, Any]) -> None:
+        line = json.dumps(event, separators=(',', ':')) + '\n'
+        with self._lock:
+            self._handle.write(line.encode('utf-8'))
+            self._handle.flush()
+
+    def record_page(self, page: int, tracks: List[Dict]) -> None:
+        self.pages[page] = tracks
+        self._append({'type': 'page', 'page': page, 'tracks': tracks})
+
+    def get_match(self, track: Dict) -> Tuple[bool, Optional[Dict]]:
+        """(known, match): known is False if the track hasn't been resolved yet"""
+        key = self.match_key(track)
+        return key in self.matches, self.matches.get(key)
+
+    def record_match(self, track: Dict, match: Optional[Dict]) -> None:
+        key = self.match_key(track)
+        self.matches[key] = match
+        self._append({'type': 'match', 'key': key, 'match': match})
+
+    def record_playlist(self, playlist: Dict, shard: int = 0) -> None:
+        self.playlists[shard] = playlist
+        self._append({'type': 'playlist', 'playlist': playlist, 'shard': shard})
+
+    def record_chunk(self, index: int) -> None:
+        self.added_chunks.add(index)
+        self._append({'type': 'chunk', 'index': index})
+
+    def update_params(self, **params) -> None:
+        """Amend the stored parameters (e.g. a refreshed access token)"""
+        self.params.update(params)
+        self._append({'type': 'params', 'params': params})
+
+    def access_token(self) -> str:
+        """The job's Spotify access token, refreshed if it expired while the job was waiting"""
+        token = self.params['token']
+        expires_at = token.get('expires_at')
+        if expires_at is None or expires_at - 60 > time.time() or not token.get('refresh_token'):
+            return token['access_token']
+
+        from spotipy.oauth2 import SpotifyOAuth
+        auth_manager = SpotifyOAuth(
+            client_id=SPOTIFY_CLIENT_ID,
+            client_secret=SPOTIFY_CLIENT_SECRET,
+            redirect_uri=SPOTIFY_REDIRECT_URI,
+            cache_handler=None
+        )
+        token_info = auth_manager.refresh_access_token(token['refresh_token'])
+        self.update_params(token={
+            'access_token': token_info['access_token'],
+            'refresh_token': token_info.get('refresh_token') or token['refresh_token'],
+            'expires_at': token_info['expires_at']
+        })
+        return token_info['access_token']
+
+    def release(self) -> None:
+        """Close the file and drop the lock, keeping the checkpoint for a later resume"""
+        if not self._handle.closed:
+            fcntl.flock(self._handle, fcntl.LOCK_UN)
+            self._handle.close()
+
+
+class CheckpointStore:
+    """Creates, reopens and removes conversion checkpoints in one directory"""
+
+    def __init__(self, base_dir: str = CHECKPOINT_DIR):
+        self.base_dir = base_dir
+
+    def _path(self, job_id: str) -> str:
+        if not job_id or '/' in job_id or '\\' in job_id or job_id.startswith('.'):
+            raise ValueError(f"Invalid job id: {job_id!r}")
+        return os.path.join(self.base_dir, f"{job_id}.jsonl")
+
+    def _lock(self, handle) -> None:
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            handle.close()
+            raise CheckpointBusy("Conversion is still running")
+
+    def create(self, job_id: str, params: Dict[str, Any]) -> Checkpoint:
+        """Start a new checkpoint for a conversion"""
+        os.makedirs(self.base_dir, exist_ok=True)
+        path = self._path(job_id)
+        # Checkpoints may hold access tokens: keep them private to this user
+        fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o600)
+        handle = os.fdopen(fd, 'r+b')
+        self._lock(handle)
+
+        checkpoint = Checkpoint(path, job_id, handle)
+        checkpoint.params = dict(params)
+        checkpoint._append({'type': 'start', 'params': params, 'created_at': datetime.now().isoformat()})
+        return checkpoint
+
+    def open(self, job_id: str) -> Optional[Checkpoint]:
+        """Reopen a checkpoint to resume it (None if there isn't one).
+
+        Raises CheckpointBusy if another thread or process is still running it.
+        """
+        path = self._path(job_id)
+        try:
+            handle = open(path, 'r+b')
+        except FileNotFoundError:
+            return None
+        self._lock(handle)
+
+        # The conversion may have completed (and removed the file) while we waited
+        if not os.path.exists(path):
+            handle.close()
+            return None
+
+        checkpoint = Checkpoint(path, job_id, handle)
+        checkpoint._replay()
+        return checkpoint
+
+    def complete(self, checkpoint: Checkpoint) -> None:
+        """Remove a finished conversion's checkpoint"""
+        try:
+            os.remove(checkpoint.path)
+        except FileNotFoundError:
+            pass
+        checkpoint.release()
+
+    def delete(self, job_id: str) -> None:
+        """Remove a checkpoint that will never be resumed"""
+        try:
+            os.remove(self._path(job_id))
+        except FileNotFoundError:
+            pass
+
+    def job_ids(self) -> List[str]:
+        """Ids of all conversions with a checkpoint on disk"""
+        if not os.path.isdir(self.base_dir):
+            return []
+        return [name[:-len('.jsonl')] for name in os.listdir(self.base_dir) if name.endswith('.jsonl')]
+
+
+# Global checkpoint store instance
+checkpoint_store = CheckpointStore()
@@ -0,0 +1,289 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from config import (
+    INITIAL_CONCURRENCY, LASTFM_MAX_CONCURRENCY, SPOTIFY_MAX_CONCURRENCY,
+    CONCURRENCY_LATENCY_TOLERANCE, LANE_WEIGHTS
+)
+from metrics import API_CONCURRENCY_LIMIT, API_IN_FLIGHT, API_QUEUE_SECONDS, WORKERS_ACTIVE
+
+@lru_cache(maxsize=None)
+def overload_errors() -> Tuple[type, ...]:
+    """Errors that mean the API (or the path to it) is overloaded.
+
+    requests is imported on first use rather than with this module, which
+    the web app's lazy cold-start path imports.
+    """
+    import requests
+    return requests.exceptions.Timeout, requests.exceptions.ConnectionError
+
+
+# Lane of the API calls made by the running thread/task (copied into match workers)
+_current_lane: ContextVar[str] = ContextVar('api_lane', default='interactive')
+
+
+@contextmanager
+def priority(lane: str):
+    """Make the API calls inside the block in the given lane (see LANE_WEIGHTS)"""
+    if lane not in LANE_WEIGHTS:
+        raise ValueError(f"Unknown priority lane: {lane}")
+    token = _current_lane.set(lane)
+    try:
+        yield
+    finally:
+        _current_lane.reset(token)
+
+
+class RateLimited(Exception):
+    """An API kept answering 429 after every retry"""
+
+
+class Retryable(Exception):
+    """A failed attempt worth retrying; error is raised if retries run out"""
+
+    def __init__(self, error: Exception, retry_after: float = None):
+        super().__init__(str(error))
+        self.error = error
+        self.retry_after = retry_after
+
+
+class _Feedback:
+    """How a request went, filled in by the caller inside AdaptiveLimiter.slot()"""
+
+    def __init__(self):
+        self.overloaded = False
+        self.retry_after: Optional[float] = None
+
+    def throttled(self, retry_after: float = None) -> None:
+        """The API answered 429 (or a 5xx), optionally asking us to wait"""
+        self.overloaded = True
+        self.retry_after = retry_after
+
+
+class AdaptiveLimiter:
+    """AIMD limit on in-flight requests to one API, shared by every job in the process.
+
+    Each healthy response raises the limit by 1/limit, so it grows by about
+    one per round of requests. 429s, 5xx responses and timeouts halve it (at
+    most once per cooldown, so one burst of errors counts once), and a
+    Retry-After pauses every caller until it passes. Latency well above its
+    long-run baseline holds the limit where it is. The limit settles just
+    below the point where the API starts pushing back.
+
+    Callers waiting for a slot queue in their priority lane. Free slots go
+    to the lanes in proportion to their weights (smooth weighted round
+    robin), first come first served within a lane, so a user's lookup only
+    waits for the next free slot even while bulk imports fill the rest.
+    """
+
+    def __init__(self, name: str, initial: int = INITIAL_CONCURRENCY, minimum: int = 1,
+                 maximum: int = 16, backoff: float = 0.5,
+                 latency_tolerance: float = CONCURRENCY_LATENCY_TOLERANCE, cooldown: float = 1.0):
+        self.name = name
+        self.minimum = minimum
+        self.maximum = maximum
+        self.backoff = backoff
+        self.latency_tolerance = latency_tolerance
+        self.cooldown = cooldown
+
+        self.limit = float(max(minimum, min(initial, maximum)))
+        self.in_flight = 0
+        self._queues = {lane: deque() for lane in LANE_WEIGHTS}
+        self._credit = {lane: 0 for lane in LANE_WEIGHTS}
+        self._paused_until = 0.0
+        self._resume_timer: Optional[threading.Timer] = None
+        self._last_decrease = 0.0
+        self._baseline: Optional[float] = None  # slow moving average of latency
+        self._recent: Optional[float] = None    # fast moving average of latency
+        self._cond = threading.Condition()
+        self._publish()
+
+    def _publish(self) -> None:
+        API_CONCURRENCY_LIMIT.set(int(self.limit), api=self.name)
+        API_IN_FLIGHT.set(self.in_flight, api=self.name)
+
+    def acquire(self, lane: str = None) -> None:
+        """Wait in the lane's queue for a free slot (and for any Retry-After pause to end)"""
+        lane = lane or _current_lane.get()
+        start = time.perf_counter()
+        waiter = self._enqueue(lane)
+        with self._cond:
+            try:
+                while not waiter['granted']:
+                    self._cond.wait()
+            except BaseException:
+                self._abandon(lane, waiter)
+                raise
+        API_QUEUE_SECONDS.observe(time.perf_counter() - start, api=self.name, lane=lane)
+
+    async def acquire_async(self, lane: str = None) -> None:
+        """acquire() for coroutines: waits without blocking the event loop"""
+        lane = lane or _current_lane.get()
+        start = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        granted = loop.create_future()
+
+        def wake():
+            loop.call_soon_threadsafe(lambda: granted.done() or granted.set_result(None))
+
+        waiter = self._enqueue(lane, wake)
+        try:
+            await granted
+        except BaseException:
+            with self._cond:
+                self._abandon(lane, waiter)
+            raise
+        API_QUEUE_SECONDS.observe(time.perf_counter() - start, api=self.name, lane=lane)
+
+    def _enqueue(self, lane: str, wake: Callable[[], None] = None) -> Dict[str, Any]:
+        waiter = {'granted': False, 'wake': wake}
+        with self._cond:
+            self._queues[lane].append(waiter)
+            self._dispatch()
+        return waiter
+
+    def _abandon(self, lane: str, waiter: Dict[str, Any]) -> None:
+        """An interrupted caller gives up its place (or the slot just granted). Holds the lock."""
+        if waiter['granted']:
+            self.in_flight -= 1
+            self._dispatch()
+        else:
+            self._queues[lane].remove(waiter)
+
+    def _dispatch(self) -> None:
+        """Grant free slots to queued callers, picking lanes by weight. Holds the lock."""
+        granted = False
+        while self.in_flight < int(self.limit):
+            waiting = [lane for lane, queue in self._queues.items() if queue]
+            if not waiting:
+                break
+            pause = self._paused_until - time.monotonic()
+            if pause > 0:
+                # Nothing finishing during the pause would wake the queue, so a timer does
+                if self._resume_timer is None:
+                    self._resume_timer = threading.Timer(pause, self._resume)
+                    self._resume_timer.daemon = True
+                    self._resume_timer.start()
+                break
+            for lane in waiting:
+                self._credit[lane] += LANE_WEIGHTS[lane]
+            lane = max(waiting, key=self._credit.get)
+            self._credit[lane] -= sum(LANE_WEIGHTS[lane] for lane in waiting)
+            waiter = self._queues[lane].popleft()
+            if not self._queues[lane]:
+                # An idle lane starts over rather than bringing back old credit
+                self._credit[lane] = 0
+            waiter['granted'] = True
+            if waiter['wake'] is not None:
+                waiter['wake']()
+            self.in_flight += 1
+            granted = True
+        if granted:
+            self._publish()
+            self._cond.notify_all()
+
+    def _resume(self) -> None:
+        with self._cond:
+            self._resume_timer = None
+            self._dispatch()
+
+    def release(self) -> None:
+        with self._cond:
+            self.in_flight -= 1
+            self._publish()
+            self._dispatch()
+
+    @contextmanager
+    def slot(self):
+        """Hold a slot for one request; its latency and outcome adjust the limit.
+
+        Report 429s through the yielded feedback; timeouts and connection
+        errors raised inside the block count as overload automatically.
+        """
+        self.acquire()
+        feedback = _Feedback()
+        start = time.perf_counter()
+        try:
+            yield feedback
+        except Exception as e:
+            if isinstance(e, overload_errors()):
+                feedback.overloaded = True
+            raise
+        finally:
+            self._report(feedback, time.perf_counter() - start)
+
+    @asynccontextmanager
+    async def async_slot(self):
+        """slot() for coroutines; transport errors have to be reported through the feedback"""
+        await self.acquire_async()
+        feedback = _Feedback()
+        start = time.perf_counter()
+        try:
+            yield feedback
+        finally:
+            self._report(feedback, time.perf_counter() - start)
+
+    def _report(self, feedback: _Feedback, latency: float) -> None:
+        self.release()
+        if feedback.overloaded:
+            self.on_overload(feedback.retry_after)
+        else:
+            self.on_success(latency)
+
+    def on_success(self, latency: float) -> None:
+        with self._cond:
+            if self._baseline is None:
+                self._baseline = self._recent = latency
+            self._recent += 0.3 * (latency - self._recent)
+            self._baseline += 0.02 * (latency - self._baseline)
+            if self._recent <= self._baseline * self.latency_tolerance:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+                self._publish()
+                self._dispatch()
+
+    def on_overload(self, retry_after: float = None) -> None:
+        with self._cond:
+            now = time.monotonic()
+            if retry_after:
+                self._paused_until = max(self._paused_until, now + retry_after)
+            if now - self._last_decrease >= self.cooldown:
+                self._last_decrease = now
+                self.limit = max(self.minimum, self.limit * self.backoff)
+                self._publish()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                'limit': int(self.limit),
+                'in_flight': self.in_flight,
+                'queued': {lane: len(queue) for lane, queue in self._queues.items()},
+                'latency_ms': round(self._recent * 1000, 1) if self._recent is not None else None,
+                'paused_for_s': round(max(0.0, self._paused_until - time.monotonic()), 1)
+            }
+
+
+def retry_after_seconds(headers) -> Optional[float]:
+    """The Retry-After header in seconds, if present and numeric"""
+    try:
+        return float(headers.get('Retry-After'))
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+# One limiter per API, shared by the CLI run or by every web job in this process
+lastfm_limiter = AdaptiveLimiter('lastfm', maximum=LASTFM_MAX_CONCURRENCY)
+spotify_limiter = AdaptiveLimiter('spotify', maximum=SPOTIFY_MAX_CONCURRENCY)
+
+
+def foreground_busy() -> bool:
+    """Whether background work should hold off: imports are running in this
+    process, other lanes are waiting for Spotify, or Spotify asked us to wait"""
+    state = spotify_limiter.snapshot()
+    waiting = sum(count for lane, count in state['queued'].items() if lane != 'background')
+    return WORKERS_ACTIVE.value() > 0 or waiting > 0 or state['paused_for_s'] > 0
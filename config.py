@@ -1,16 +1,24 @@
 import os
-from dotenv import load_dotenv
 
-# Load environment variables from .env file if it exists (for local development)
-load_dotenv()
+# Load environment variables from .env file if it exists (for local development).
+# python-dotenv is only imported when there is a file to read, so production
+# containers (configured purely through the environment) skip it entirely.
+_ENV_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.env')
+if os.path.exists(_ENV_FILE):
+    from dotenv import load_dotenv
+    load_dotenv(_ENV_FILE)
 
 # Last.fm API Configuration
 LASTFM_API_KEY = os.getenv('LASTFM_API_KEY')
-LASTFM_BASE_URL = 'http://ws.audioscrobbler.com/2.0/'
+# Both API base URLs can be pointed at fake_apis.py for offline load testing
+LASTFM_BASE_URL = os.getenv('LASTFM_BASE_URL', 'http://ws.audioscrobbler.com/2.0/')
+# Use HTTP/2 for Last.fm when the server offers it (needs the h2 package: pip install httpx[http2])
+LASTFM_HTTP2 = os.getenv('LASTFM_HTTP2', 'false').lower() == 'true'
 
 # Spotify API Configuration
 SPOTIFY_CLIENT_ID = os.getenv('SPOTIFY_CLIENT_ID')
 SPOTIFY_CLIENT_SECRET = os.getenv('SPOTIFY_CLIENT_SECRET')
+SPOTIFY_API_PREFIX = os.getenv('SPOTIFY_API_PREFIX', 'https://api.spotify.com/v1/')
 
 # Base path for application when deployed as a subdirectory
 APP_BASE_PATH = os.getenv('APP_BASE_PATH', '')  # Empty for root
@@ -23,16 +31,140 @@ service_url = os.getenv('SERVICE_URL', 'https://lastfm-spotify-converter-v5nw64k
 # Set the redirect URI based on environment
 if is_production:
     SPOTIFY_REDIRECT_URI = f"{service_url}/callback"
-    print(f"Using production redirect URI: {SPOTIFY_REDIRECT_URI}")
 else:
     # For local development
     SPOTIFY_REDIRECT_URI = "http://127.0.0.1:8000/callback"
-    print(f"Using local development redirect URI: {SPOTIFY_REDIRECT_URI}")
+
+
+def log_redirect_uri():
+    """Print the redirect URI in use (called once the app actually starts serving)"""
+    environment = "production" if is_production else "local development"
+    print(f"Using {environment} redirect URI: {SPOTIFY_REDIRECT_URI}")
+
+
+# Startup mode: when enabled, the web app defers heavy imports (spotipy, tqdm,
+# the converter stack) and job store loading until they are first needed
+LAZY_STARTUP = os.getenv('LAZY_STARTUP', 'true').lower() == 'true'
 
 # Application Settings
 DEFAULT_LIMIT = 50
 MAX_TRACKS_PER_PLAYLIST = 10000
-RATE_LIMIT_DELAY = 0.1  # seconds between API calls
+SSE_KEEPALIVE_SECONDS = 15  # comment sent on idle job event streams so proxies keep them open
+
+# Job store backend: 'file' (JSON file, single worker process only),
+# 'sqlite' (WAL database shared by all workers on the host) or 'redis'
+# (shared across instances; an in-process stand-in is used if REDIS_URL is unset)
+JOB_BACKEND = os.getenv('JOB_BACKEND', 'file')
+JOB_STORE_FILE = os.getenv('JOB_STORE_FILE', 'job_status.json')
+JOB_DB_PATH = os.getenv('JOB_DB_PATH', 'job_status.db')
+REDIS_URL = os.getenv('REDIS_URL')
+JOB_POLL_INTERVAL_SECONDS = 0.5  # how often shared backends check for other processes' changes
+
+# Session signing key. Every worker process (WEB_CONCURRENCY, passed to
+# gunicorn by the Dockerfile) and instance must share it: with a random
+# per-process key, an OAuth callback or request served by another worker
+# can't read the session. The app refuses to start without it in production
+# or with more than one worker.
+FLASK_SECRET_KEY = os.getenv('FLASK_SECRET_KEY')
+WEB_CONCURRENCY = int(os.getenv('WEB_CONCURRENCY', '1'))
+
+# Finished jobs older than this are removed by the background job sweeper
+JOB_MAX_AGE_HOURS = int(os.getenv('JOB_MAX_AGE_HOURS', '24'))
+JOB_SWEEP_INTERVAL_SECONDS = int(os.getenv('JOB_SWEEP_INTERVAL_SECONDS', '300'))
+
+# Large job result payloads (e.g. failed track details) live outside the job
+# record as compressed, paginated chunks
+RESULT_STORE_DIR = os.getenv('RESULT_STORE_DIR', 'job_results')
+RESULT_CHUNK_SIZE = 500  # items per compressed chunk
+
+# Conversion checkpoints, so interrupted imports resume instead of restarting.
+# On Cloud Run point this at a mounted volume for them to survive instance restarts.
+CHECKPOINT_DIR = os.getenv('CHECKPOINT_DIR', 'checkpoints')
+
+# Spotify matches shared across conversions: a SQLite database of resolved
+# tracks used by every worker on the host (empty MATCH_CACHE_DB turns it off),
+# and a read-only snapshot exported from it (python main.py export-matches)
+# that new instances memory-map to start warm. Tracks Spotify doesn't have
+# are only remembered for a few days, in case they turn up.
+MATCH_CACHE_DB = os.getenv('MATCH_CACHE_DB', 'match_cache.db')
+MATCH_SNAPSHOT_FILE = os.getenv('MATCH_SNAPSHOT_FILE', 'match_snapshot.bin')
+MATCH_CACHE_TTL_DAYS = int(os.getenv('MATCH_CACHE_TTL_DAYS', '30'))
+MATCH_CACHE_MISS_TTL_DAYS = int(os.getenv('MATCH_CACHE_MISS_TTL_DAYS', '3'))
+# Spotify audio features are kept in a table of the same database by default
+AUDIO_FEATURES_DB = os.getenv('AUDIO_FEATURES_DB', MATCH_CACHE_DB)
+# In-memory layer in front of both, shared by every job in the process and
+# bounded in bytes; frequency-aware, so popular matches outlast large imports
+MATCH_MEMORY_CACHE_MB = float(os.getenv('MATCH_MEMORY_CACHE_MB', '32'))
+
+# Background cache warming in the web app: Last.fm's global and per-country
+# top tracks, and the top tracks of the chart's artists, are matched into the
+# match cache in the 'background' lane, pausing while imports run. Searches
+# use an app token, so SPOTIFY_CLIENT_ID and SPOTIFY_CLIENT_SECRET are needed.
+CACHE_WARM_ENABLED = os.getenv('CACHE_WARM_ENABLED', 'false').lower() == 'true'
+CACHE_WARM_INTERVAL_HOURS = float(os.getenv('CACHE_WARM_INTERVAL_HOURS', '24'))
+CACHE_WARM_COUNTRIES = [country.strip() for country in os.getenv(
+    'CACHE_WARM_COUNTRIES', 'united states,united kingdom,germany,brazil,japan').split(',') if country.strip()]
+CACHE_WARM_CHART_TRACKS = 500   # top tracks taken from the global chart and from each country's
+CACHE_WARM_CHART_ARTISTS = 100  # top artists on the global chart...
+CACHE_WARM_ARTIST_TRACKS = 10   # ...and how many of each one's top tracks
+CACHE_WARM_MAX_SEARCHES = int(os.getenv('CACHE_WARM_MAX_SEARCHES', '5000'))  # Spotify requests per round
+CACHE_WARM_START_DELAY_SECONDS = 60  # after startup, before the first round
+CACHE_WARM_PAUSE_SECONDS = 30  # how long to wait before checking again whether the load has passed
+
+# Background revalidation in the web app (also needs the client secret):
+# cached matches not confirmed for CACHE_REVALIDATE_AFTER_DAYS are looked up
+# 50 at a time in SPOTIFY_MARKET; relinked tracks are replaced, unplayable
+# and removed ones dropped so they get searched again
+CACHE_REVALIDATE_ENABLED = os.getenv('CACHE_REVALIDATE_ENABLED', 'false').lower() == 'true'
+CACHE_REVALIDATE_INTERVAL_HOURS = float(os.getenv('CACHE_REVALIDATE_INTERVAL_HOURS', '6'))
+CACHE_REVALIDATE_AFTER_DAYS = float(os.getenv('CACHE_REVALIDATE_AFTER_DAYS', '7'))
+CACHE_REVALIDATE_MAX_REQUESTS = int(os.getenv('CACHE_REVALIDATE_MAX_REQUESTS', '1000'))  # per round (50 matches each)
+SPOTIFY_MARKET = os.getenv('SPOTIFY_MARKET', 'US')
+
+# Adaptive (AIMD) concurrency: requests in flight to each API start at
+# INITIAL_CONCURRENCY, grow while responses are fast and healthy, and halve
+# on 429s, 5xx responses and timeouts. The maximums bound the growth
+# (Last.fm asks clients to stay around 5 requests per second).
+INITIAL_CONCURRENCY = 2
+LASTFM_MAX_CONCURRENCY = int(os.getenv('LASTFM_MAX_CONCURRENCY', '2'))
+SPOTIFY_MAX_CONCURRENCY = int(os.getenv('SPOTIFY_MAX_CONCURRENCY', '16'))
+CONCURRENCY_LATENCY_TOLERANCE = 2.0  # latency above this multiple of the baseline stops growth
+MATCH_WORKERS = int(os.getenv('MATCH_WORKERS', '16'))  # concurrent Spotify searches per job (coroutines)
+
+# Priority lanes for API calls. When requests are queued for a free slot,
+# each lane gets slots in proportion to its weight: user-facing lookups,
+# bulk imports, then background sync work.
+LANE_WEIGHTS = {'interactive': 16, 'bulk': 4, 'background': 1}
+REQUEST_TIMEOUT_SECONDS = 10
+# Parser for API responses: 'auto' uses orjson when it's installed (pip install
+# orjson), 'orjson' warns if it isn't, 'json' always uses the standard library
+JSON_BACKEND = os.getenv('JSON_BACKEND', 'auto').lower()
+LASTFM_MAX_RETRIES = 3  # retries of 429, rate limit errors, 5xx and timeouts
+SPOTIFY_MAX_RETRIES = 6
+
+# Per-job API request caps, so one huge import can't use up the shared quota.
+# Each job's budget is the worst case for its size, capped at these.
+JOB_MAX_SPOTIFY_REQUESTS = int(os.getenv('JOB_MAX_SPOTIFY_REQUESTS', '25000'))
+JOB_MAX_LASTFM_REQUESTS = int(os.getenv('JOB_MAX_LASTFM_REQUESTS', '500'))
+
+# `main.py batch`: worker processes, and imports running at once in each.
+# The processes split the Spotify and Last.fm concurrency limits between them.
+BATCH_PROCESSES = int(os.getenv('BATCH_PROCESSES', '2'))
+BATCH_THREADS = int(os.getenv('BATCH_THREADS', '4'))
+BATCH_SUMMARY_FILE = os.getenv('BATCH_SUMMARY_FILE', 'batch_summary.json')
+
+# Measurements of recent conversions, used to estimate the cost of new ones
+CONVERSION_STATS_FILE = os.getenv('CONVERSION_STATS_FILE', 'conversion_stats.jsonl')
+CONVERSION_STATS_KEEP = 200  # conversions kept
+
+# Tracing: the share of jobs whose spans are recorded (0 disables tracing),
+# and where they go: 'jsonl' appends to TRACE_FILE, 'otlp' posts to an
+# OTLP/HTTP collector such as a local OpenTelemetry Collector or Jaeger
+TRACE_SAMPLE_RATE = float(os.getenv('TRACE_SAMPLE_RATE', '0'))
+TRACE_EXPORTER = os.getenv('TRACE_EXPORTER', 'jsonl')
+TRACE_FILE = os.getenv('TRACE_FILE', 'traces.jsonl')
+TRACE_OTLP_ENDPOINT = os.getenv('TRACE_OTLP_ENDPOINT', 'http://127.0.0.1:4318/v1/traces')
+TRACE_FLUSH_SECONDS = 2  # how often finished spans are exported
 
 # Supported time periods for Last.fm
 LASTFM_PERIODS = {
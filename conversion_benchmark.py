@@ -0,0 +1,419 @@
+#!/usr/bin/env python3
+"""
+Conversion benchmark for the Last.fm -> Spotify pipeline
+
+Replays recorded Last.fm and Spotify API responses (benchmark_fixtures/)
+through the real clients, so no credentials or network are needed, and
+measures for each library size:
+
+- tracks per second and API calls per track for a full top-tracks conversion
+- CPU time per track, and with --trace-alloc the peak of Python allocations
+  per track (tracemalloc slows the run, so throughput isn't comparable then)
+- peak RSS of the process doing it (each size runs in a fresh interpreter)
+- p50/p99 latency of the pipeline stages: _fetch_all_tracks,
+  _create_spotify_playlist, AsyncSpotifyClient.add_tracks_to_playlist and
+  JobManager.update_job
+
+Larger libraries are served by expanding the recorded tracks into as many
+distinct ones as needed. Results are saved as JSON so throughput can be
+tracked between versions:
+
+    python conversion_benchmark.py --sizes 100,1000,10000 --output conversion_benchmark.json
+    python conversion_benchmark.py --latency-ms 20 --compare conversion_benchmark.json
+"""
+
+import contextlib
+import hashlib
+import inspect
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import zlib
+from collections import Counter
+from datetime import datetime
+from typing import Dict, List
+from urllib.parse import urlparse
+
+import click
+import requests
+
+from config import SPOTIFY_API_PREFIX
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+FIXTURE_DIR = os.path.join(PROJECT_DIR, 'benchmark_fixtures')
+
+STAGES = ['_fetch_all_tracks', '_create_spotify_playlist', 'add_tracks_to_playlist', 'update_job']
+
+
+class ReplaySession(requests.Session):
+    """A requests session that answers Last.fm and Spotify calls from fixtures.
+
+    Every request sleeps latency_ms first, to stand in for the network, and
+    is counted per endpoint. A deterministic miss_rate share of tracks has
+    no Spotify search results.
+    """
+
+    def __init__(self, fixture_dir: str = FIXTURE_DIR, total_tracks: int = 100,
+                 latency_ms: float = 0.0, miss_rate: float = 0.05):
+        super().__init__()
+        self.fixtures = {}
+        for name in os.listdir(fixture_dir):
+            if name.endswith('.json'):
+                with open(os.path.join(fixture_dir, name), 'r', encoding='utf-8') as f:
+                    self.fixtures[name[:-len('.json')]] = json.load(f)
+        self.total_tracks = total_tracks
+        self.latency = latency_ms / 1000
+        self.miss_rate = miss_rate
+        self.calls = Counter()
+        self._calls_lock = threading.Lock()
+
+    def request(self, method, url, params=None, data=None, headers=None, **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+
+        if url.startswith(SPOTIFY_API_PREFIX):
+            endpoint, status, payload = self._spotify(method, url[len(SPOTIFY_API_PREFIX):], params or {})
+        else:
+            endpoint, status, payload = self._lastfm(params or {})
+        with self._calls_lock:
+            self.calls[endpoint] += 1
+
+        response = requests.Response()
+        response.status_code = status
+        response.reason = 'OK' if status < 400 else 'Not Found'
+        response.url = url
+        response.encoding = 'utf-8'
+        response.headers['Content-Type'] = 'application/json; charset=utf-8'
+        response._content = json.dumps(payload).encode('utf-8')
+        return response
+
+    def _lastfm(self, params: Dict):
+        method = params.get('method', '')
+        fixture = self.fixtures.get(f"lastfm_{method}")
+        if fixture is None:
+            return f"lastfm:{method}", 200, {'error': 3, 'message': f"No fixture for {method}"}
+
+        root_key = next(iter(fixture))
+        templates = fixture[root_key]['track']
+        limit = int(params.get('limit', 50))
+        page = int(params.get('page', 1))
+        start = (page - 1) * limit
+        end = min(start + limit, self.total_tracks)
+
+        tracks = []
+        for index in range(start, end):
+            template = templates[index % len(templates)]
+            tracks.append(dict(template, name=f"{template['name']} {index + 1}",
+                               **{'@attr': {'rank': str(index + 1)}}))
+
+        total_pages = max(1, -(-self.total_tracks // limit))
+        return f"lastfm:{method}", 200, {root_key: {
+            'track': tracks,
+            '@attr': dict(fixture[root_key]['@attr'], page=str(page), perPage=str(limit),
+                          totalPages=str(total_pages), total=str(self.total_tracks))
+        }}
+
+    def _is_miss(self, query: str) -> bool:
+        return zlib.crc32(query.encode('utf-8')) % 1000 < self.miss_rate * 1000
+
+    def _spotify(self, method: str, path: str, params: Dict):
+        parts = urlparse(path).path.strip('/').split('/')
+
+        if parts == ['me']:
+            return 'spotify:me', 200, self.fixtures['spotify_me']
+
+        if parts == ['search']:
+            query = params.get('q', '')
+            result = json.loads(json.dumps(self.fixtures['spotify_search']))
+            if not query.startswith('artist:') or ' track:' not in query:
+                # Fuzzy searches only happen after a strict miss
+                result['tracks']['items'] = []
+            elif self._is_miss(query):
+                result['tracks']['items'] = []
+            else:
+                artist, track = query[len('artist:'):].split(' track:', 1)
+                item = result['tracks']['items'][0]
+                track_id = hashlib.md5(query.encode('utf-8')).hexdigest()[:22]
+                item.update(id=track_id, uri=f"spotify:track:{track_id}", name=track)
+                item['artists'][0]['name'] = artist
+            return 'spotify:search', 200, result
+
+        if parts[0] == 'users' and parts[-1] == 'playlists' and method == 'POST':
+            return 'spotify:create_playlist', 201, self.fixtures['spotify_playlist']
+
+        if parts[0] == 'playlists' and len(parts) == 2:
+            return 'spotify:playlist', 200, self.fixtures['spotify_playlist']
+
+        if parts[0] == 'playlists' and parts[-1] == 'tracks' and method == 'POST':
+            return 'spotify:add_items', 201, self.fixtures['spotify_playlist_add']
+
+        return f"spotify:{method} {path}", 404, {'error': {'status': 404, 'message': 'No fixture'}}
+
+
+def _timed(target, name: str, samples: Dict[str, List[float]]):
+    """Replace target.name with a wrapper recording each call's duration
+    (until the returned coroutine finishes, for a coroutine function)"""
+    original = getattr(target, name)
+    bucket = samples.setdefault(name, [])
+
+    if inspect.iscoroutinefunction(original):
+        async def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await original(*args, **kwargs)
+            finally:
+                bucket.append(time.perf_counter() - start)
+    else:
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                bucket.append(time.perf_counter() - start)
+
+    setattr(target, name, wrapper)
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    """Nearest-rank percentile"""
+    ordered = sorted(samples)
+    rank = max(1, -(-len(ordered) * pct // 100))
+    return ordered[int(rank) - 1]
+
+
+def run_size(size: int, runs: int, latency_ms: float, miss_rate: float,
+             trace_alloc: bool = False) -> Dict:
+    """Benchmark conversions of one library size in this process"""
+    # Keep the pipeline's own progress output out of the measurements
+    os.environ.setdefault('TQDM_DISABLE', '1')
+
+    from flask import Flask
+    from concurrency import spotify_limiter
+    from job_backends import FileJobBackend
+    from job_manager import JobManager
+    from match_cache import MatchCache
+    from playlist_converter import PlaylistConverter
+    from result_store import ResultStore
+
+    session = ReplaySession(total_tracks=size, latency_ms=latency_ms, miss_rate=miss_rate)
+    samples: Dict[str, List[float]] = {}
+    work_dir = tempfile.mkdtemp(prefix='conversion-benchmark-')
+    job_manager = JobManager(backend=FileJobBackend(os.path.join(work_dir, 'jobs.json')),
+                             result_store=ResultStore(os.path.join(work_dir, 'results')))
+    _timed(job_manager, 'update_job', samples)
+
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        converter = PlaylistConverter(lastfm_api_key='benchmark', spotify_access_token='benchmark-token',
+                                      requests_session=session,
+                                      # Every run searches: the shared cache would answer repeats
+                                      match_cache=MatchCache(db_path=''))
+        _timed(converter, '_fetch_all_tracks', samples)
+        _timed(converter, '_create_spotify_playlist', samples)
+        # Playlists are published through the async client
+        _timed(converter.spotify_async, 'add_tracks_to_playlist', samples)
+
+        session.calls.clear()
+        conversion_s = []
+        cpu_s = 0.0
+        if trace_alloc:
+            tracemalloc.start()
+        for _ in range(runs):
+            start = time.perf_counter()
+            cpu_start = time.process_time()
+            result = converter.convert_top_tracks('benchmark', 'overall', size)
+            conversion_s.append(time.perf_counter() - start)
+            cpu_s += time.process_time() - cpu_start
+
+            # Replay the job store writes a web import of this size makes:
+            # one per percentage point while matching, then the result
+            with Flask(__name__).test_request_context():
+                job_id = job_manager.create_job('import', {'limit': size})
+            last_progress = None
+            for done in range(1, size + 1):
+                progress = 30 + int(done / size * 50)
+                if progress != last_progress:
+                    last_progress = progress
+                    job_manager.update_job(job_id, 'in_progress', progress, f'Matched {done} tracks')
+            job_manager.update_job(job_id, 'completed', 100, 'Done', result={
+                'playlist': result['playlist'],
+                'total_tracks': result['total_lastfm_tracks'],
+                'matched_tracks': result['matched_tracks'],
+                'added_tracks': result['added_tracks'],
+                'failed_tracks': len(result['unmatched_tracks']),
+                'failed_track_details': result['unmatched_tracks']
+            })
+        peak_alloc = tracemalloc.get_traced_memory()[1] if trace_alloc else None
+        tracemalloc.stop()
+
+    total_calls = sum(session.calls.values())
+    stats = {
+        'tracks': size,
+        'conversion_s': {
+            'min': min(conversion_s),
+            'p50': percentile(conversion_s, 50),
+            'max': max(conversion_s)
+        },
+        'tracks_per_s': size / percentile(conversion_s, 50),
+        'api_calls_per_track': total_calls / (size * runs),
+        'api_calls': {endpoint: count / runs for endpoint, count in sorted(session.calls.items())},
+        'matched_tracks': result['matched_tracks'],
+        'spotify_concurrency': spotify_limiter.snapshot()['limit'],
+        # ru_maxrss is in KiB on Linux
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'stages': {
+            stage: {
+                'calls': len(samples.get(stage, [])),
+                'p50_ms': percentile(samples[stage], 50) * 1000,
+                'p99_ms': percentile(samples[stage], 99) * 1000
+            }
+            for stage in STAGES if samples.get(stage)
+        },
+        # Includes replaying the responses, which is the same for every version
+        'cpu_ms_per_track': cpu_s * 1000 / (size * runs)
+    }
+    if peak_alloc is not None:
+        stats['peak_alloc_kb_per_track'] = peak_alloc / 1024 / size
+    return stats
+
+
+def measure_size(size: int, runs: int, latency_ms: float, miss_rate: float,
+                 trace_alloc: bool = False) -> Dict:
+    """Run one size in a fresh interpreter so peak RSS belongs to that size alone"""
+    command = [sys.executable, os.path.abspath(__file__), '--child-size', str(size),
+               '--runs', str(runs), '--latency-ms', str(latency_ms), '--miss-rate', str(miss_rate)]
+    if trace_alloc:
+        command.append('--trace-alloc')
+
+    proc = subprocess.run(command, cwd=PROJECT_DIR, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise Exception(f"Benchmark run for {size} tracks failed:\n{proc.stderr}")
+
+    # The child prints its JSON summary last
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def run_benchmark(sizes: List[int], runs: int, latency_ms: float, miss_rate: float,
+                  trace_alloc: bool = False) -> Dict:
+    """Benchmark every library size"""
+    results = {
+        'created_at': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'runs': runs,
+        'latency_ms': latency_ms,
+        'miss_rate': miss_rate,
+        'trace_alloc': trace_alloc,
+        'sizes': {}
+    }
+
+    for size in sizes:
+        click.echo(f"⏱️  {size} tracks...")
+        results['sizes'][str(size)] = measure_size(size, runs, latency_ms, miss_rate, trace_alloc)
+
+    return results
+
+
+def compare(baseline: Dict, current: Dict, threshold: float) -> bool:
+    """Print throughput and stage deltas; returns False on a regression past threshold"""
+    ok = True
+    for setting in ('latency_ms', 'miss_rate'):
+        if baseline.get(setting) != current.get(setting):
+            click.echo(f"⚠️  {setting} differs from the baseline ({baseline.get(setting)} -> {current.get(setting)})")
+    if bool(baseline.get('trace_alloc')) != bool(current.get('trace_alloc')):
+        click.echo("⚠️  only one run traced allocations, so its throughput isn't comparable")
+
+    for size, stats in current['sizes'].items():
+        before_stats = baseline.get('sizes', {}).get(size)
+        if before_stats is None:
+            continue
+
+        before = before_stats['tracks_per_s']
+        after = stats['tracks_per_s']
+        change = (after - before) / before * 100 if before else 0.0
+        marker = '✅'
+        if change < -threshold:
+            marker = '❌'
+            ok = False
+        click.echo(f"{marker} {size:>6} tracks: {before:.1f} -> {after:.1f} tracks/s ({change:+.1f}%)")
+
+        for measure, unit in (('cpu_ms_per_track', 'ms'), ('peak_alloc_kb_per_track', 'KB')):
+            if measure in stats and measure in before_stats:
+                before, after = before_stats[measure], stats[measure]
+                change = (after - before) / before * 100 if before else 0.0
+                click.echo(f"      {measure:<25} {before:.2f}{unit} -> {after:.2f}{unit} ({change:+.1f}%)")
+
+        for stage in STAGES:
+            if stage not in stats['stages']:
+                # A stage the pipeline no longer goes through isn't being measured
+                click.echo(f"   ❌ {stage:<25} has no samples in this run")
+                ok = False
+            elif stage not in before_stats['stages']:
+                click.echo(f"   ⚠️  {stage:<25} has no samples in the baseline")
+        for stage, timing in stats['stages'].items():
+            if stage not in before_stats['stages']:
+                continue
+            before = before_stats['stages'][stage]['p50_ms']
+            after = timing['p50_ms']
+            change = (after - before) / before * 100 if before else 0.0
+            marker = '❌' if change > threshold else '  '
+            if change > threshold:
+                ok = False
+            click.echo(f"   {marker} {stage:<25} p50 {before:.2f}ms -> {after:.2f}ms ({change:+.1f}%)")
+    return ok
+
+
+@click.command()
+@click.option('--sizes', default='100,1000,10000', help='Comma-separated library sizes to convert')
+@click.option('--runs', '-r', default=3, help='Conversions to time per size')
+@click.option('--latency-ms', default=0.0, help='Latency injected before every API response')
+@click.option('--miss-rate', default=0.05, help='Share of tracks with no Spotify match')
+@click.option('--output', '-o', type=click.Path(), help='Write results JSON to this file')
+@click.option('--compare', 'baseline_file', type=click.Path(exists=True),
+              help='Compare against a previous results file')
+@click.option('--threshold', default=10.0, help='Allowed regression in percent')
+@click.option('--trace-alloc', is_flag=True, help='Measure peak Python allocations per track (slower)')
+@click.option('--child-size', type=int, hidden=True)
+def main(sizes: str, runs: int, latency_ms: float, miss_rate: float,
+         output: str, baseline_file: str, threshold: float, trace_alloc: bool, child_size: int):
+    """Benchmark conversions against recorded API responses"""
+    if child_size:
+        print(json.dumps(run_size(child_size, runs, latency_ms, miss_rate, trace_alloc)))
+        return
+
+    results = run_benchmark([int(size) for size in sizes.split(',')], runs, latency_ms, miss_rate,
+                            trace_alloc)
+
+    for size, stats in results['sizes'].items():
+        click.echo(f"\n🎵 {size} tracks ({runs} runs, {latency_ms:g}ms injected latency)")
+        click.echo(f"   throughput:   {stats['tracks_per_s']:.1f} tracks/s")
+        click.echo(f"   API calls:    {stats['api_calls_per_track']:.2f} per track")
+        click.echo(f"   CPU:          {stats['cpu_ms_per_track']:.2f}ms per track")
+        if 'peak_alloc_kb_per_track' in stats:
+            click.echo(f"   allocations:  {stats['peak_alloc_kb_per_track']:.1f} KB per track at peak")
+        click.echo(f"   peak RSS:     {stats['peak_rss_mb']:.1f} MB")
+        for stage, timing in stats['stages'].items():
+            click.echo(f"   {stage:<25} p50 {timing['p50_ms']:9.2f}ms   p99 {timing['p99_ms']:9.2f}ms"
+                       f"   ({timing['calls']} calls)")
+
+    if output:
+        with open(output, 'w') as f:
+            json.dump(results, f, indent=2)
+        click.echo(f"\n✅ Results saved to {output}")
+
+    if baseline_file:
+        with open(baseline_file, 'r') as f:
+            baseline = json.load(f)
+        click.echo(f"\n📊 Compared with {baseline_file}:")
+        if not compare(baseline, results, threshold):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,195 @@
+import fcntl
+import json
+import math
+import threading
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from config import (
+    MAX_TRACKS_PER_PLAYLIST, CONVERSION_STATS_FILE, CONVERSION_STATS_KEEP,
+    JOB_MAX_SPOTIFY_REQUESTS, JOB_MAX_LASTFM_REQUESTS
+)
+
+LASTFM_PAGE_SIZE = 50
+PLAYLIST_CHUNK_SIZE = 100
+
+# Spotify calls every conversion makes besides searches and chunks: the user
+# lookups at startup and before creating the playlist, the playlist itself
+# and the ownership check before adding tracks
+SPOTIFY_FIXED_REQUESTS = 5
+
+# Used until enough conversions have been recorded. Recent scrobbles repeat
+# tracks; top and loved lists don't.
+DEFAULT_RATES = {
+    'unique_ratio': {'top': 1.0, 'loved': 1.0, 'recent': 0.6},
+    'uncached_ratio': 1.0,        # unique tracks that need a search (not resumed or shared)
+    'searches_per_track': 1.15,   # a strict search, plus a fuzzy one for strict misses
+    'match_rate': 0.9,
+    'lastfm_page_seconds': 0.4,
+    'search_seconds': 0.1,        # per search, with several in flight at once
+    'chunk_seconds': 0.3
+}
+
+# Recorded conversions needed before their rates replace the defaults
+MIN_SAMPLES = 3
+
+
+class BudgetExceeded(Exception):
+    """A job used up its API request budget"""
+
+
+class RequestBudget:
+    """Counts a job's API requests and stops it at a per-API limit.
+
+    Clients call spend() before each request. APIs without a limit are only
+    counted.
+    """
+
+    def __init__(self, limits: Dict[str, int] = None):
+        self.limits = dict(limits or {})
+        self.used: Dict[str, int] = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def spend(self, api: str, count: int = 1) -> None:
+        with self._lock:
+            limit = self.limits.get(api)
+            if limit is not None and self.used[api] + count > limit:
+                raise BudgetExceeded(f"{api} request budget of {limit} used up")
+            self.used[api] += count
+
+    def remaining(self, api: str) -> Optional[int]:
+        with self._lock:
+            limit = self.limits.get(api)
+            return None if limit is None else limit - self.used[api]
+
+
+def extra_playlists(tracks: int) -> int:
+    """Playlists beyond the first that tracks matched tracks are split into"""
+    return max(0, math.ceil(tracks / MAX_TRACKS_PER_PLAYLIST) - 1)
+
+
+def job_budget(limit: int, capped: bool = True) -> RequestBudget:
+    """The request budget for a conversion of up to `limit` tracks.
+
+    Large enough for the worst case (every track needing both searches). With
+    capped, never more than the per-job caps from config, which keep one web
+    import from using up the app's shared quota; CLI and batch runs aren't
+    capped, so a full library finishes in one run.
+    """
+    pages = math.ceil(limit / LASTFM_PAGE_SIZE)
+    chunks = math.ceil(limit / PLAYLIST_CHUNK_SIZE)
+    lastfm = pages + 1
+    spotify = 2 * limit + chunks + extra_playlists(limit) + SPOTIFY_FIXED_REQUESTS
+    if capped:
+        lastfm = min(JOB_MAX_LASTFM_REQUESTS, lastfm)
+        spotify = min(JOB_MAX_SPOTIFY_REQUESTS, spotify)
+    return RequestBudget({'lastfm': lastfm, 'spotify': spotify})
+
+
+class ConversionStats:
+    """Measurements of recent conversions, kept in a small JSON-lines file"""
+
+    def __init__(self, path: str = CONVERSION_STATS_FILE, keep: int = CONVERSION_STATS_KEEP):
+        self.path = path
+        self.keep = keep
+
+    def record(self, import_type: str, stats: Dict[str, Any]) -> None:
+        """Append one finished conversion's stats, trimming old ones"""
+        line = json.dumps(dict(stats, import_type=import_type, recorded_at=datetime.now().isoformat()))
+        with open(self.path, 'a+') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            f.write(line + '\n')
+            f.flush()
+            f.seek(0)
+            lines = f.readlines()
+            if len(lines) > self.keep * 2:
+                f.seek(0)
+                f.truncate()
+                f.writelines(lines[-self.keep:])
+
+    def recent(self) -> List[Dict[str, Any]]:
+        """The recorded conversions, oldest first"""
+        try:
+            with open(self.path) as f:
+                lines = f.readlines()[-self.keep:]
+        except FileNotFoundError:
+            return []
+
+        records = []
+        for line in lines:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                continue
+        return records
+
+    def rates(self, import_type: str) -> Dict[str, Any]:
+        """Per-track and per-request rates from recorded conversions, or the defaults"""
+        rates = dict(DEFAULT_RATES, unique_ratio=DEFAULT_RATES['unique_ratio'].get(import_type, 1.0))
+        records = self.recent()
+        same_type = [r for r in records if r.get('import_type') == import_type]
+
+        def ratio(sample, numerator, denominator):
+            total = sum(r.get(denominator, 0) for r in sample)
+            if len(sample) < MIN_SAMPLES or not total:
+                return None
+            return sum(r.get(numerator, 0) for r in sample) / total
+
+        measured = {
+            # Shaped by the user's library: only comparable within an import type
+            'unique_ratio': ratio(same_type, 'unique_tracks', 'tracks'),
+            'match_rate': ratio(same_type, 'matched_tracks', 'tracks'),
+            # API behaviour: comparable across all conversions
+            'uncached_ratio': ratio(records, 'searched_tracks', 'unique_tracks'),
+            'searches_per_track': ratio(records, 'searches', 'searched_tracks'),
+            'lastfm_page_seconds': ratio(records, 'fetch_seconds', 'lastfm_pages'),
+            'search_seconds': ratio(records, 'match_seconds', 'searches'),
+            'chunk_seconds': ratio(records, 'add_seconds', 'chunks')
+        }
+        rates.update({name: value for name, value in measured.items() if value is not None})
+        rates['samples'] = len(records) if len(records) >= MIN_SAMPLES else 0
+        return rates
+
+
+def estimate(import_type: str, limit: int, available: int = None,
+             stats: ConversionStats = None, capped: bool = True) -> Dict[str, Any]:
+    """Predict the API requests and time a conversion will take.
+
+    available is the number of tracks the user actually has (if known), which
+    caps limit. capped is passed on to job_budget.
+    """
+    rates = (stats or conversion_stats).rates(import_type)
+    tracks = min(limit, available) if available is not None else limit
+
+    lastfm_pages = max(1, math.ceil(tracks / LASTFM_PAGE_SIZE))
+    unique_tracks = math.ceil(tracks * rates['unique_ratio'])
+    searched_tracks = math.ceil(unique_tracks * rates['uncached_ratio'])
+    searches = math.ceil(searched_tracks * rates['searches_per_track'])
+    matched_tracks = math.floor(tracks * rates['match_rate'])
+    chunks = math.ceil(matched_tracks / PLAYLIST_CHUNK_SIZE)
+
+    seconds = (lastfm_pages * rates['lastfm_page_seconds']
+               + searches * rates['search_seconds']
+               + chunks * rates['chunk_seconds'])
+
+    budget = job_budget(tracks, capped)
+    return {
+        'import_type': import_type,
+        'tracks': tracks,
+        'lastfm_pages': lastfm_pages,
+        'unique_tracks': unique_tracks,
+        'spotify_searches': searches,
+        'expected_matches': matched_tracks,
+        'playlist_chunks': chunks,
+        'playlists': 1 + extra_playlists(matched_tracks),
+        'lastfm_requests': lastfm_pages,
+        'spotify_requests': searches + chunks + extra_playlists(matched_tracks) + SPOTIFY_FIXED_REQUESTS,
+        'expected_seconds': round(seconds, 1),
+        'budget': budget.limits,
+        'based_on_conversions': rates['samples']
+    }
+
+
+# Global stats file shared by the CLI and the web app
+conversion_stats = ConversionStats()
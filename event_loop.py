@@ -0,0 +1,104 @@
+import asyncio
+import concurrent.futures
+import contextvars
+import os
+import threading
+import weakref
+from typing import Awaitable, Callable, Dict, Optional, TypeVar
+
+T = TypeVar('T')
+
+# Threads for blocking calls made from the loop (injected requests sessions,
+# spotipy's token refresh); enough to cover the API concurrency limits
+BLOCKING_WORKERS = 32
+
+# Objects bound to one event loop (see loop_local)
+_loop_locals: 'weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, object]]' = \
+    weakref.WeakKeyDictionary()
+
+
+class EventLoopThread:
+    """One asyncio event loop running in a daemon thread, for blocking callers.
+
+    The async API clients keep their connection pools on this loop, so every
+    job in the process shares them. run() blocks the calling thread until a
+    coroutine finishes, carrying over its context (priority lane, current
+    trace span). The loop is started on first use, and again in a forked
+    child.
+    """
+
+    def __init__(self, name: str = 'event-loop'):
+        self.name = name
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._forget)
+
+    def _forget(self) -> None:
+        # The loop's thread doesn't survive a fork
+        self._loop = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._loop.set_default_executor(concurrent.futures.ThreadPoolExecutor(
+                    max_workers=BLOCKING_WORKERS, thread_name_prefix=f"{self.name}-blocking"))
+                self._thread = threading.Thread(target=self._loop.run_forever, name=self.name, daemon=True)
+                self._thread.start()
+            return self._loop
+
+    def submit(self, coroutine: Awaitable[T]) -> 'concurrent.futures.Future[T]':
+        """Start a coroutine on the loop; cancelling the returned future cancels it"""
+        loop = self.loop
+        result: concurrent.futures.Future = concurrent.futures.Future()
+
+        def start():
+            # Runs in a copy of the caller's context, which the task inherits
+            task = loop.create_task(coroutine)
+
+            def done(task):
+                if result.cancelled():
+                    return
+                if task.cancelled():
+                    result.cancel()
+                elif task.exception() is not None:
+                    result.set_exception(task.exception())
+                else:
+                    result.set_result(task.result())
+
+            task.add_done_callback(done)
+            result.add_done_callback(lambda f: f.cancelled() and loop.call_soon_threadsafe(task.cancel))
+
+        loop.call_soon_threadsafe(start, context=contextvars.copy_context())
+        return result
+
+    def run(self, coroutine: Awaitable[T]) -> T:
+        """Run a coroutine on the loop and wait for its result"""
+        if self._thread is not None and threading.current_thread() is self._thread:
+            raise RuntimeError("EventLoopThread.run() would block its own loop; await the coroutine instead")
+
+        future = self.submit(coroutine)
+        try:
+            return future.result()
+        except BaseException:
+            # Interrupted (or failed): make sure the coroutine stops too
+            future.cancel()
+            raise
+
+
+def loop_local(name: str, factory: Callable[[], T]) -> T:
+    """The running loop's instance of something that can't be shared across
+    loops, such as an httpx connection pool; created by factory on first use"""
+    values = _loop_locals.setdefault(asyncio.get_running_loop(), {})
+    if name not in values:
+        values[name] = factory()
+    return values[name]
+
+
+# Global loop shared by the sync facades of the async clients
+event_loop = EventLoopThread()
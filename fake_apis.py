@@ -0,0 +1,682 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Last.fm and Spotify Web APIs
+
+Serves the Last.fm 2.0 methods and the Spotify endpoints this project uses
+from a seeded synthetic catalog, so the CLI and the web app can be load
+tested offline without burning API quota:
+
+    python fake_apis.py --port 8900 --latency-ms 40 --throttle-rate 0.02
+
+    LASTFM_BASE_URL=http://127.0.0.1:8900/2.0/ \\
+    SPOTIFY_API_PREFIX=http://127.0.0.1:8900/v1/ \\
+    LASTFM_API_KEY=fake python app.py
+
+Every Last.fm username exists and gets its own reproducible listening
+history; the chart, geo and artist top lists rank the catalog by
+popularity. Any bearer token is accepted as a Spotify user (distinct tokens
+are distinct users). Spotify's OAuth endpoints are not faked, so clients
+need a token handed to them (load_test.py puts one in each web session).
+With a market, the several-tracks endpoint reports stale_rate of the
+tracks as relinked to a new id or as unplayable.
+Counters are available at /_fake/stats.
+"""
+
+import hashlib
+import random
+import re
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+import click
+from flask import Flask, jsonify, request
+
+WORDS = [
+    'amber', 'atlas', 'autumn', 'blue', 'broken', 'burning', 'city', 'cold', 'crystal', 'dark',
+    'dawn', 'desert', 'dream', 'echo', 'electric', 'empty', 'fading', 'fire', 'glass', 'golden',
+    'gravity', 'heart', 'hollow', 'honey', 'island', 'lights', 'lost', 'lunar', 'midnight', 'mirror',
+    'neon', 'night', 'ocean', 'paper', 'quiet', 'radio', 'rain', 'river', 'satellite', 'shadow',
+    'silver', 'small', 'smoke', 'static', 'summer', 'velvet', 'violet', 'wild', 'winter', 'young'
+]
+ARTIST_FORMS = ['The {a} {b}s', '{a} {b}', '{A}', 'DJ {A}', '{a} & the {b}s']
+TITLE_SUFFIXES = [' - Remastered', ' - Radio Edit', ' - Live', ' - 2011 Remaster']
+
+# Spotify refuses to grow a playlist past this many items
+PLAYLIST_MAX_ITEMS = 10000
+
+
+def _normalize(text: str) -> str:
+    return re.sub(r'[^\w\s]', '', text.lower()).strip()
+
+
+def _tokens(text: str) -> List[str]:
+    return _normalize(text).split()
+
+
+class Catalog:
+    """A reproducible catalog of artists and tracks, and per-user listening histories.
+
+    miss_rate of the tracks exist only on Last.fm, and some Spotify titles
+    carry a version suffix (" - Remastered") the Last.fm title lacks.
+    """
+
+    def __init__(self, seed: int = 42, size: int = 5000, miss_rate: float = 0.05,
+                 tracks_per_user: int = 2000):
+        self.seed = seed
+        self.tracks_per_user = tracks_per_user
+        rng = random.Random(seed)
+
+        artists = []
+        seen = set()
+        while len(artists) < max(1, size // 8):
+            a, b = rng.sample(WORDS, 2)
+            name = rng.choice(ARTIST_FORMS).format(a=a.title(), b=b.title(), A=(a + b).title())
+            if name not in seen:
+                seen.add(name)
+                artists.append(name)
+
+        self.tracks: List[Dict] = []
+        self.by_id: Dict[str, Dict] = {}
+        self.by_key: Dict[tuple, Dict] = {}
+        self.by_token: Dict[str, set] = {}
+        for index in range(size):
+            artist = artists[index % len(artists)]
+            title = f"{rng.choice(WORDS).title()} {rng.choice(WORDS).title()}"
+            if (artist.lower(), title.lower()) in self.by_key:
+                title = f"{title} {index}"
+            track_id = hashlib.md5(f"{seed}:{index}".encode('utf-8')).hexdigest()[:22]
+            track = {
+                'id': track_id,
+                'index': index,
+                'artist': artist,
+                'title': title,
+                'spotify_title': title + (rng.choice(TITLE_SUFFIXES) if rng.random() < 0.1 else ''),
+                'album': f"{rng.choice(WORDS).title()} {rng.choice(WORDS).title()}",
+                'duration_ms': rng.randint(120000, 420000),
+                'popularity': rng.randint(0, 100),
+                'on_spotify': rng.random() >= miss_rate
+            }
+            self.tracks.append(track)
+            self.by_id[track_id] = track
+            self.by_key[(artist.lower(), title.lower())] = track
+            if track['on_spotify']:
+                for token in set(_tokens(f"{artist} {track['spotify_title']}")):
+                    self.by_token.setdefault(token, set()).add(index)
+
+    @lru_cache(maxsize=1024)
+    def history(self, username: str, kind: str, period: str = 'overall') -> List[Dict]:
+        """A user's top, recent or loved tracks, newest/most played first"""
+        rng = random.Random(f"{self.seed}:{username.lower()}:{kind}:{period}")
+        count = min(self.tracks_per_user, len(self.tracks))
+        now = int(time.time())
+
+        if kind == 'top':
+            picks = rng.sample(self.tracks, count)
+            playcount = count * 3
+            history = []
+            for track in picks:
+                playcount = max(1, playcount - rng.randint(0, 5))
+                history.append({'track': track, 'playcount': playcount})
+            return history
+
+        if kind == 'recent':
+            # Recent scrobbles repeat tracks, as real listening does
+            favourites = rng.sample(self.tracks, max(1, count // 4))
+            history = []
+            played_at = now
+            for _ in range(count):
+                played_at -= rng.randint(120, 600)
+                history.append({'track': rng.choice(favourites), 'played_at': played_at})
+            return history
+
+        # Loved tracks
+        history = []
+        loved_at = now
+        for track in rng.sample(self.tracks, max(1, count // 5)):
+            loved_at -= rng.randint(3600, 86400 * 7)
+            history.append({'track': track, 'loved_at': loved_at})
+        return history
+
+    @lru_cache(maxsize=64)
+    def chart(self, country: str = '') -> List[Dict]:
+        """Tracks by popularity, like Last.fm's charts; each country reorders them a little"""
+        rng = random.Random(f"{self.seed}:chart:{country.lower()}")
+        jitter = 20 if country else 0
+        scores = {track['index']: track['popularity'] + rng.uniform(0, jitter) for track in self.tracks}
+        return sorted(self.tracks, key=lambda track: -scores[track['index']])
+
+    @lru_cache(maxsize=64)
+    def artist_chart(self, country: str = '') -> List[str]:
+        """Artists by the total popularity of their tracks"""
+        totals: Dict[str, float] = {}
+        for rank, track in enumerate(self.chart(country)):
+            totals[track['artist']] = totals.get(track['artist'], 0) + len(self.tracks) - rank
+        return sorted(totals, key=lambda artist: -totals[artist])
+
+    @lru_cache(maxsize=1024)
+    def artist_tracks(self, artist: str) -> List[Dict]:
+        """An artist's tracks, most popular first"""
+        return [track for track in self.chart() if track['artist'].lower() == artist.lower()]
+
+    def search(self, query: str, limit: int) -> List[Dict]:
+        """Spotify-style search: field filters (artist:, track:) or free text"""
+        match = re.match(r'^artist:(.*) track:(.*)$', query)
+        if match:
+            artist, title = match.group(1).lower(), _normalize(match.group(2))
+            candidates = self.by_token.get(_tokens(artist)[0], set()) if _tokens(artist) else set()
+            results = [self.tracks[i] for i in sorted(candidates)
+                       if self.tracks[i]['artist'].lower() == artist
+                       and title in _normalize(self.tracks[i]['spotify_title'])]
+            return results[:limit]
+
+        tokens = _tokens(query)
+        if not tokens:
+            return []
+        candidates = set.intersection(*(self.by_token.get(token, set()) for token in tokens))
+        return [self.tracks[i] for i in sorted(candidates)][:limit]
+
+
+class FakeSettings:
+    """Behaviour knobs shared by every request"""
+
+    def __init__(self, latency_ms: float = 0.0, jitter_ms: float = 0.0, throttle_rate: float = 0.0,
+                 retry_after: int = 1, max_rps: float = 0.0, lastfm_page_size: int = 1000,
+                 search_limit: int = 50, stale_rate: float = 0.0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.max_rps = max_rps
+        self.lastfm_page_size = lastfm_page_size
+        self.search_limit = search_limit
+        self.stale_rate = stale_rate
+
+
+class _RateLimiter:
+    """Token bucket per API; an empty bucket answers 429"""
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def allow(self) -> bool:
+        if self.rate <= 0:
+            return True
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+
+def _image_list() -> List[Dict]:
+    return [{'size': size, '#text': ''} for size in ('small', 'medium', 'large', 'extralarge')]
+
+
+def _lastfm_artist(track: Dict) -> Dict:
+    return {'name': track['artist'], 'mbid': '',
+            'url': f"https://www.last.fm/music/{track['artist'].replace(' ', '+')}"}
+
+
+def _lastfm_url(track: Dict) -> str:
+    return f"https://www.last.fm/music/{track['artist'].replace(' ', '+')}/_/{track['title'].replace(' ', '+')}"
+
+
+def _spotify_track(track: Dict) -> Dict:
+    artist_id = hashlib.md5(track['artist'].encode('utf-8')).hexdigest()[:22]
+    album_id = hashlib.md5(f"{track['artist']}:{track['album']}".encode('utf-8')).hexdigest()[:22]
+    artist = {
+        'id': artist_id, 'name': track['artist'], 'type': 'artist', 'uri': f"spotify:artist:{artist_id}",
+        'external_urls': {'spotify': f"https://open.spotify.com/artist/{artist_id}"}
+    }
+    return {
+        'id': track['id'],
+        'name': track['spotify_title'],
+        'uri': f"spotify:track:{track['id']}",
+        'type': 'track',
+        'artists': [artist],
+        'album': {
+            'id': album_id, 'name': track['album'], 'album_type': 'album', 'artists': [artist],
+            'uri': f"spotify:album:{album_id}", 'images': [],
+            'external_urls': {'spotify': f"https://open.spotify.com/album/{album_id}"}
+        },
+        'duration_ms': track['duration_ms'],
+        'popularity': track['popularity'],
+        'explicit': False,
+        'is_local': False,
+        'external_urls': {'spotify': f"https://open.spotify.com/track/{track['id']}"}
+    }
+
+
+def create_app(catalog: Catalog, settings: FakeSettings) -> Flask:
+    """Build the fake API server"""
+    app = Flask(__name__)
+    wsgi_app = app.wsgi_app
+
+    def ignore_trailing_slash(environ, start_response):
+        # spotipy requests e.g. "me/", Last.fm clients use "/2.0/"
+        environ['PATH_INFO'] = environ.get('PATH_INFO', '').rstrip('/') or '/'
+        return wsgi_app(environ, start_response)
+
+    app.wsgi_app = ignore_trailing_slash
+    stats = Counter()
+    stats_lock = threading.Lock()
+    limiters = {'lastfm': _RateLimiter(settings.max_rps), 'spotify': _RateLimiter(settings.max_rps)}
+    playlists: Dict[str, Dict] = {}
+    playlists_lock = threading.Lock()
+    rng = random.Random(catalog.seed)
+
+    def count(name: str) -> None:
+        with stats_lock:
+            stats[name] += 1
+
+    def throttled(api: str):
+        """Apply latency, then maybe answer 429 like the real service would"""
+        delay = settings.latency_ms + (rng.random() * settings.jitter_ms if settings.jitter_ms else 0)
+        if delay:
+            time.sleep(delay / 1000)
+
+        if not limiters[api].allow() or (settings.throttle_rate and rng.random() < settings.throttle_rate):
+            count(f"{api}:429")
+            if api == 'lastfm':
+                body = {'error': 29, 'message': 'Rate Limit Exceeded'}
+            else:
+                body = {'error': {'status': 429, 'message': 'API rate limit exceeded'}}
+            response = jsonify(body)
+            response.status_code = 429
+            response.headers['Retry-After'] = str(settings.retry_after)
+            return response
+        return None
+
+    def spotify_error(status: int, message: str):
+        response = jsonify({'error': {'status': status, 'message': message}})
+        response.status_code = status
+        return response
+
+    def spotify_user() -> Optional[Dict]:
+        auth = request.headers.get('Authorization', '')
+        if not auth.startswith('Bearer ') or len(auth) <= len('Bearer '):
+            return None
+        user_id = 'user_' + hashlib.sha1(auth[len('Bearer '):].encode('utf-8')).hexdigest()[:10]
+        return {
+            'id': user_id,
+            'display_name': f"Load Test {user_id[-4:]}",
+            'email': f"{user_id}@example.com",
+            'country': 'GB',
+            'product': 'premium',
+            'type': 'user',
+            'uri': f"spotify:user:{user_id}",
+            'images': [],
+            'followers': {'href': None, 'total': 0},
+            'external_urls': {'spotify': f"https://open.spotify.com/user/{user_id}"}
+        }
+
+    def playlist_object(playlist: Dict) -> Dict:
+        return {
+            'id': playlist['id'],
+            'name': playlist['name'],
+            'description': playlist['description'],
+            'public': playlist['public'],
+            'collaborative': False,
+            'owner': playlist['owner'],
+            'snapshot_id': f"{playlist['id']}:{playlist['snapshot']}",
+            'uri': f"spotify:playlist:{playlist['id']}",
+            'type': 'playlist',
+            'images': [],
+            'external_urls': {'spotify': f"https://open.spotify.com/playlist/{playlist['id']}"},
+            'tracks': {
+                'href': f"{request.host_url}v1/playlists/{playlist['id']}/tracks",
+                'total': len(playlist['uris'])
+            }
+        }
+
+    # ---- Last.fm ----
+
+    @app.route('/2.0', methods=['GET', 'POST'])
+    def lastfm():
+        count('lastfm:requests')
+        rejected = throttled('lastfm')
+        if rejected is not None:
+            return rejected
+
+        params = request.values
+        method = params.get('method', '')
+        count(f"lastfm:{method}")
+        if not params.get('api_key'):
+            return jsonify({'error': 10, 'message': 'Invalid API key - You must be granted a valid key by last.fm'})
+
+        username = params.get('user', 'user')
+        limit = min(int(params.get('limit', 50)), settings.lastfm_page_size)
+        page = max(1, int(params.get('page', 1)))
+
+        if method == 'user.getinfo':
+            registered = 1262304000
+            return jsonify({'user': {
+                'name': username,
+                'realname': username.title(),
+                'country': 'United Kingdom',
+                'playcount': str(catalog.tracks_per_user * 37),
+                'registered': {'unixtime': str(registered), '#text': registered},
+                'url': f"https://www.last.fm/user/{username}",
+                'image': _image_list()
+            }})
+
+        if method == 'track.search':
+            matches = catalog.search(params.get('track', ''), limit)
+            return jsonify({'results': {'trackmatches': {'track': [
+                {'name': t['title'], 'artist': t['artist'], 'url': _lastfm_url(t), 'listeners': '1000',
+                 'mbid': '', 'image': _image_list()}
+                for t in matches
+            ]}}})
+
+        def page_attr(total: int, **extra) -> Dict:
+            return dict(extra, page=str(page), perPage=str(limit),
+                        totalPages=str(max(1, -(-total // limit))), total=str(total))
+
+        if method in ('chart.gettoptracks', 'geo.gettoptracks', 'artist.gettoptracks'):
+            if method == 'artist.gettoptracks':
+                ranked, root = catalog.artist_tracks(params.get('artist', '')), 'toptracks'
+            else:
+                ranked, root = catalog.chart(params.get('country', '') if method == 'geo.gettoptracks' else ''), 'tracks'
+            start = (page - 1) * limit
+            return jsonify({root: {'track': [
+                {'name': track['title'], 'playcount': str(track['popularity'] * 1000), 'listeners': '1000',
+                 'mbid': '', 'url': _lastfm_url(track), 'duration': str(track['duration_ms'] // 1000),
+                 'artist': _lastfm_artist(track), 'image': _image_list(),
+                 '@attr': {'rank': str(start + offset + 1)}}
+                for offset, track in enumerate(ranked[start:start + limit])
+            ], '@attr': page_attr(len(ranked))}})
+
+        if method in ('chart.gettopartists', 'geo.gettopartists'):
+            country = params.get('country', '') if method == 'geo.gettopartists' else ''
+            ranked = catalog.artist_chart(country)
+            start = (page - 1) * limit
+            return jsonify({'artists' if method == 'chart.gettopartists' else 'topartists': {'artist': [
+                {'name': artist, 'playcount': '1000', 'listeners': '1000', 'mbid': '',
+                 'url': f"https://www.last.fm/music/{artist.replace(' ', '+')}", 'image': _image_list()}
+                for artist in ranked[start:start + limit]
+            ], '@attr': page_attr(len(ranked))}})
+
+        kinds = {'user.gettoptracks': ('top', 'toptracks'),
+                 'user.getrecenttracks': ('recent', 'recenttracks'),
+                 'user.getlovedtracks': ('loved', 'lovedtracks')}
+        if method not in kinds:
+            return jsonify({'error': 3, 'message': 'Invalid Method - No method with that name in this package'})
+
+        kind, root = kinds[method]
+        history = catalog.history(username, kind, params.get('period', 'overall') if kind == 'top' else 'overall')
+        start = (page - 1) * limit
+        entries = history[start:start + limit]
+
+        tracks = []
+        for offset, entry in enumerate(entries):
+            track = entry['track']
+            if kind == 'top':
+                tracks.append({
+                    'name': track['title'], 'playcount': str(entry['playcount']), 'mbid': '',
+                    'url': _lastfm_url(track), 'duration': str(track['duration_ms'] // 1000),
+                    'artist': _lastfm_artist(track), 'image': _image_list(),
+                    '@attr': {'rank': str(start + offset + 1)}
+                })
+            elif kind == 'recent':
+                tracks.append({
+                    'name': track['title'], 'mbid': '', 'url': _lastfm_url(track),
+                    'artist': {'mbid': '', '#text': track['artist']},
+                    'album': {'mbid': '', '#text': track['album']}, 'image': _image_list(),
+                    'date': {'uts': str(entry['played_at']),
+                             '#text': datetime.fromtimestamp(entry['played_at'], timezone.utc).strftime('%d %b %Y, %H:%M')}
+                })
+            else:
+                tracks.append({
+                    'name': track['title'], 'mbid': '', 'url': _lastfm_url(track),
+                    'artist': _lastfm_artist(track), 'image': _image_list(),
+                    'date': {'uts': str(entry['loved_at']),
+                             '#text': datetime.fromtimestamp(entry['loved_at'], timezone.utc).strftime('%d %b %Y, %H:%M')}
+                })
+
+        return jsonify({root: {'track': tracks, '@attr': {
+            'user': username, 'page': str(page), 'perPage': str(limit),
+            'totalPages': str(max(1, -(-len(history) // limit))), 'total': str(len(history))
+        }}})
+
+    # ---- Spotify ----
+
+    @app.before_request
+    def spotify_gate():
+        if not request.path.startswith('/v1/'):
+            return None
+        count('spotify:requests')
+        rejected = throttled('spotify')
+        if rejected is not None:
+            return rejected
+        if spotify_user() is None:
+            return spotify_error(401, 'No token provided')
+        return None
+
+    @app.route('/v1/me')
+    def spotify_me():
+        count('spotify:me')
+        return jsonify(spotify_user())
+
+    @app.route('/v1/users/<user_id>')
+    def spotify_user_profile(user_id):
+        count('spotify:user')
+        user = spotify_user()
+        return jsonify(dict(user, id=user_id) if user_id != user['id'] else user)
+
+    @app.route('/v1/search')
+    def spotify_search():
+        count('spotify:search')
+        query = request.args.get('q', '')
+        limit = min(int(request.args.get('limit', 10)), settings.search_limit)
+        offset = int(request.args.get('offset', 0))
+        items = [_spotify_track(t) for t in catalog.search(query, offset + limit)[offset:]]
+        return jsonify({'tracks': {
+            'href': request.url, 'items': items, 'limit': limit, 'offset': offset,
+            'next': None, 'previous': None, 'total': len(items)
+        }})
+
+    @app.route('/v1/tracks/<track_id>')
+    def spotify_track(track_id):
+        count('spotify:track')
+        track = catalog.by_id.get(track_id)
+        if track is None or not track['on_spotify']:
+            return spotify_error(404, 'Non existing id')
+        return jsonify(_spotify_track(track))
+
+    @app.route('/v1/tracks')
+    def spotify_tracks():
+        count('spotify:tracks')
+        ids = [track_id for track_id in request.args.get('ids', '').split(',') if track_id]
+        if not ids or len(ids) > 50:
+            return spotify_error(400, 'Invalid ids')
+        market = request.args.get('market')
+        items = []
+        for track_id in ids:
+            track = catalog.by_id.get(track_id)
+            if track is None or not track['on_spotify']:
+                items.append(None)
+                continue
+            item = _spotify_track(track)
+            if market:
+                # A stable share of the tracks has gone stale since it was matched
+                digest = int(hashlib.md5(track_id.encode('utf-8')).hexdigest()[:8], 16)
+                stale = digest % 10000 < settings.stale_rate * 10000
+                item['is_playable'] = not (stale and digest % 2)
+                if stale and not digest % 2:
+                    new_id = hashlib.md5(f"{track_id}:relinked".encode('utf-8')).hexdigest()[:22]
+                    item['linked_from'] = {'id': track_id, 'type': 'track', 'uri': item['uri']}
+                    item.update(id=new_id, uri=f"spotify:track:{new_id}",
+                                external_urls={'spotify': f"https://open.spotify.com/track/{new_id}"})
+            items.append(item)
+        return jsonify({'tracks': items})
+
+    @app.route('/v1/audio-features')
+    def spotify_audio_features():
+        count('spotify:audio_features')
+        ids = [track_id for track_id in request.args.get('ids', '').split(',') if track_id]
+        if not ids or len(ids) > 100:
+            return spotify_error(400, 'Invalid ids')
+        items = []
+        for track_id in ids:
+            track = catalog.by_id.get(track_id)
+            if track is None or not track['on_spotify']:
+                items.append(None)
+                continue
+            rng = random.Random(track_id)
+            items.append({
+                'id': track_id, 'type': 'audio_features', 'uri': f"spotify:track:{track_id}",
+                'danceability': round(rng.random(), 3), 'energy': round(rng.random(), 3),
+                'key': rng.randint(0, 11), 'loudness': round(rng.uniform(-30, 0), 3), 'mode': rng.randint(0, 1),
+                'speechiness': round(rng.random() * 0.3, 4), 'acousticness': round(rng.random(), 4),
+                'instrumentalness': round(rng.random() ** 3, 4), 'liveness': round(rng.random() * 0.5, 4),
+                'valence': round(rng.random(), 3), 'tempo': round(rng.uniform(60, 190), 3),
+                'duration_ms': track['duration_ms'], 'time_signature': rng.choice((3, 4, 4, 4, 5))
+            })
+        return jsonify({'audio_features': items})
+
+    @app.route('/v1/users/<user_id>/playlists', methods=['POST'])
+    @app.route('/v1/me/playlists', methods=['POST'])
+    def spotify_create_playlist(user_id=None):
+        count('spotify:create_playlist')
+        user = spotify_user()
+        if user_id is not None and user_id != user['id']:
+            return spotify_error(403, "You cannot create a playlist for another user")
+
+        body = request.get_json(force=True, silent=True) or {}
+        if not body.get('name'):
+            return spotify_error(400, 'Missing required field: name')
+
+        playlist_id = hashlib.md5(f"{user['id']}:{time.time_ns()}:{rng.random()}".encode('utf-8')).hexdigest()[:22]
+        playlist = {
+            'id': playlist_id, 'name': body['name'], 'description': body.get('description', ''),
+            'public': body.get('public', True), 'snapshot': 0, 'uris': [],
+            'owner': {'id': user['id'], 'display_name': user['display_name'], 'type': 'user',
+                      'uri': user['uri'], 'external_urls': user['external_urls']}
+        }
+        with playlists_lock:
+            playlists[playlist_id] = playlist
+            response = jsonify(playlist_object(playlist))
+        response.status_code = 201
+        return response
+
+    @app.route('/v1/playlists/<playlist_id>')
+    def spotify_get_playlist(playlist_id):
+        count('spotify:playlist')
+        with playlists_lock:
+            playlist = playlists.get(playlist_id)
+            if playlist is None:
+                return spotify_error(404, 'Not found.')
+            return jsonify(playlist_object(playlist))
+
+    @app.route('/v1/playlists/<playlist_id>/tracks', methods=['GET', 'POST', 'PUT'])
+    def spotify_playlist_tracks(playlist_id):
+        with playlists_lock:
+            playlist = playlists.get(playlist_id)
+            if playlist is None:
+                return spotify_error(404, 'Not found.')
+
+            if request.method == 'GET':
+                count('spotify:playlist_tracks')
+                limit = min(int(request.args.get('limit', 100)), 100)
+                offset = int(request.args.get('offset', 0))
+                uris = playlist['uris'][offset:offset + limit]
+                items = [{'added_at': None, 'is_local': False,
+                          'track': _spotify_track(catalog.by_id[uri.rsplit(':', 1)[-1]])}
+                         for uri in uris if uri.rsplit(':', 1)[-1] in catalog.by_id]
+                has_next = offset + limit < len(playlist['uris'])
+                return jsonify({
+                    'href': request.url, 'items': items, 'limit': limit, 'offset': offset,
+                    'total': len(playlist['uris']), 'previous': None,
+                    'next': (f"{request.host_url}v1/playlists/{playlist_id}/tracks"
+                             f"?offset={offset + limit}&limit={limit}") if has_next else None
+                })
+
+            replace = request.method == 'PUT'
+            count('spotify:replace_items' if replace else 'spotify:add_items')
+            user = spotify_user()
+            if playlist['owner']['id'] != user['id']:
+                return spotify_error(403, 'You cannot add tracks to a playlist you don\'t own.')
+            # The body is either {"uris": [...], "position": n} or a bare list of URIs
+            body = request.get_json(force=True, silent=True) or {}
+            if isinstance(body, list):
+                body = {'uris': body}
+            uris = body.get('uris') or [uri for uri in request.args.get('uris', '').split(',') if uri]
+            if (not uris and not replace) or len(uris) > 100:
+                return spotify_error(400, 'You can add a maximum of 100 tracks per request.')
+            position = body.get('position', request.args.get('position', type=int))
+            if len(uris) + (0 if replace else len(playlist['uris'])) > PLAYLIST_MAX_ITEMS:
+                return spotify_error(400, 'Playlist size limit reached.')
+            if replace:
+                playlist['uris'] = list(uris)
+            elif position is None:
+                playlist['uris'].extend(uris)
+            else:
+                playlist['uris'][position:position] = uris
+            playlist['snapshot'] += 1
+            response = jsonify({'snapshot_id': f"{playlist_id}:{playlist['snapshot']}"})
+        response.status_code = 200 if replace else 201
+        return response
+
+    # ---- Introspection ----
+
+    @app.route('/_fake/stats')
+    def fake_stats():
+        with stats_lock:
+            counters = dict(stats)
+        with playlists_lock:
+            counters['playlists'] = len(playlists)
+            counters['playlist_tracks'] = sum(len(p['uris']) for p in playlists.values())
+        return jsonify(counters)
+
+    @app.route('/_fake/reset', methods=['POST'])
+    def fake_reset():
+        with stats_lock:
+            stats.clear()
+        with playlists_lock:
+            playlists.clear()
+        return jsonify({'ok': True})
+
+    return app
+
+
+@click.command()
+@click.option('--host', default='127.0.0.1', help='Interface to listen on')
+@click.option('--port', default=8900, help='Port to listen on')
+@click.option('--seed', default=42, help='Catalog and history seed')
+@click.option('--catalog-size', default=5000, help='Distinct tracks in the catalog')
+@click.option('--tracks-per-user', default=2000, help='Length of each user\'s history')
+@click.option('--miss-rate', default=0.05, help='Share of tracks missing from Spotify')
+@click.option('--latency-ms', default=0.0, help='Latency added to every response')
+@click.option('--jitter-ms', default=0.0, help='Random extra latency, up to this much')
+@click.option('--throttle-rate', default=0.0, help='Share of requests answered with 429')
+@click.option('--max-rps', default=0.0, help='Per-API request rate before 429s (0 = unlimited)')
+@click.option('--retry-after', default=1, help='Retry-After seconds sent with 429s')
+@click.option('--lastfm-page-size', default=1000, help='Largest Last.fm page served')
+@click.option('--search-limit', default=50, help='Most Spotify search results returned')
+@click.option('--stale-rate', default=0.02, help='Share of tracks relinked or unplayable in a market')
+def main(host: str, port: int, seed: int, catalog_size: int, tracks_per_user: int, miss_rate: float,
+         latency_ms: float, jitter_ms: float, throttle_rate: float, max_rps: float, retry_after: int,
+         lastfm_page_size: int, search_limit: int, stale_rate: float):
+    """Run fake Last.fm and Spotify APIs for offline load testing"""
+    catalog = Catalog(seed, catalog_size, miss_rate, tracks_per_user)
+    settings = FakeSettings(latency_ms, jitter_ms, throttle_rate, retry_after, max_rps,
+                            lastfm_page_size, search_limit, stale_rate)
+
+    click.echo(f"🎭 Fake APIs on http://{host}:{port} ({catalog_size} tracks, seed {seed})")
+    click.echo(f"   LASTFM_BASE_URL=http://{host}:{port}/2.0/")
+    click.echo(f"   SPOTIFY_API_PREFIX=http://{host}:{port}/v1/")
+    create_app(catalog, settings).run(host=host, port=port, threaded=True)
+
+
+if __name__ == '__main__':
+    main()
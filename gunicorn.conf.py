@@ -0,0 +1,8 @@
+# gunicorn reads this file from the working directory (the Dockerfile's /app)
+
+
+def post_fork(server, worker):
+    """Start each worker's background threads (job sweeper, resumer, cache
+    warmer and revalidator) as soon as it forks, not at its first request"""
+    from app import start_background_work
+    start_background_work()
@@ -0,0 +1,185 @@
+import logging
+import threading
+from typing import Any, Dict
+
+from config import LASTFM_API_KEY
+from job_manager import job_manager, TERMINAL_STATUSES
+from checkpoint_store import checkpoint_store, Checkpoint, CheckpointBusy
+from single_flight import SingleFlight
+from metrics import JOBS_QUEUED, WORKERS_ACTIVE, CACHE_REQUESTS
+from tracing import tracer
+from concurrency import priority
+from cost_estimator import job_budget, conversion_stats
+
+logger = logging.getLogger(__name__)
+
+# Identical imports running at the same time share one Last.fm fetch and one
+# Spotify match pass; each job still creates the playlist in its own account
+import_flights = SingleFlight()
+
+
+def _import_key(username: str, import_type: str, period: str, limit: int) -> tuple:
+    """Jobs with equal keys fetch and match exactly the same tracks"""
+    return (username.lower(), import_type, period if import_type == 'top' else None, limit)
+
+
+def _spawn(job_id: str, checkpoint: Checkpoint) -> None:
+    """Process a job in a background thread, counted as queued until it starts"""
+    def run():
+        JOBS_QUEUED.dec()
+        process_import_job(job_id, checkpoint)
+
+    JOBS_QUEUED.inc()
+    thread = threading.Thread(target=run)
+    thread.daemon = True
+    thread.start()
+
+
+def start_import_job(job_id: str, params: Dict[str, Any], token_info: Dict[str, Any]) -> None:
+    """Checkpoint a new import job and process it in a background thread"""
+    checkpoint = checkpoint_store.create(job_id, dict(params, kind='web', token=token_info))
+    _spawn(job_id, checkpoint)
+
+
+def process_import_job(job_id: str, checkpoint: Checkpoint):
+    """Process an import job, skipping whatever its checkpoint already recorded"""
+    params = checkpoint.params
+    WORKERS_ACTIVE.inc()
+    try:
+        # Imports queue behind users' interactive lookups for API slots
+        with priority('bulk'), \
+                tracer.trace('import_job', job_id=job_id, import_type=params['import_type'],
+                             limit=params['limit'], resumed=bool(checkpoint.pages)):
+            _run_import_job(job_id, checkpoint)
+    finally:
+        WORKERS_ACTIVE.dec()
+
+
+def _run_import_job(job_id: str, checkpoint: Checkpoint):
+    params = checkpoint.params
+    username = params['username']
+    import_type = params['import_type']
+    period = params['period']
+    limit = params['limit']
+
+    try:
+        job_manager.update_job(job_id, 'in_progress', 0,
+                               'Resuming import...' if checkpoint.pages else 'Starting import...')
+        from playlist_converter import PlaylistConverter
+        converter = PlaylistConverter(lastfm_api_key=LASTFM_API_KEY,
+                                      spotify_access_token=checkpoint.access_token(),
+                                      budget=job_budget(limit))
+
+        last_progress = [None]
+
+        def report(progress: int, message: str):
+            # Only write when the percentage moves, not once per track
+            if progress != last_progress[0]:
+                last_progress[0] = progress
+                job_manager.update_job(job_id, 'in_progress', progress, message)
+
+        def fetch_and_match(report):
+            tracks = converter.fetch_tracks(username, import_type, period, limit, checkpoint=checkpoint)
+            if not tracks:
+                raise Exception("No tracks found")
+            report(30, f'Found {len(tracks)} tracks, searching on Spotify...')
+
+            matched, unmatched = converter.match_tracks(
+                tracks,
+                progress_callback=lambda done, total, found: report(
+                    30 + int(done / total * 50), f'Found {found}/{done} tracks on Spotify'),
+                checkpoint=checkpoint
+            )
+            return tracks, matched, unmatched
+
+        (tracks, matched, unmatched), shared = import_flights.do(
+            _import_key(username, import_type, period, limit), fetch_and_match, report)
+        CACHE_REQUESTS.inc(cache='import_flight', result='hit' if shared else 'miss')
+        tracer.current().set(shared_work=shared)
+        if shared:
+            logger.info(f"Job {job_id} reused the tracks matched by an identical running import")
+
+        if not matched:
+            raise Exception("No matching tracks found on Spotify")
+
+        # Create playlist
+        job_manager.update_job(job_id, 'in_progress', 80, 'Creating Spotify playlist...')
+        playlists, track_uris = converter.publish_playlist(
+            matched,
+            converter.default_playlist_name(import_type, period),
+            f"{username}'s Last.fm {import_type} tracks",
+            public=False,
+            checkpoint=checkpoint
+        )
+
+        job_manager.update_job(job_id, 'completed', 100,
+                             f'Successfully created playlist with {len(track_uris)} tracks'
+                             + (f' across {len(playlists)} playlists' if len(playlists) > 1 else ''),
+                             result={
+                                 'playlist': playlists[0],
+                                 'playlist_url': playlists[0]['url'],
+                                 'playlists': playlists,
+                                 'total_tracks': len(tracks),
+                                 'matched_tracks': len(matched),
+                                 'added_tracks': len(track_uris),
+                                 'failed_tracks': len(unmatched),
+                                 'failed_track_details': unmatched,
+                                 'shared_work': shared
+                             })
+        checkpoint_store.complete(checkpoint)
+        if not shared:
+            conversion_stats.record(import_type, converter.stats)
+
+    except Exception as e:
+        logger.error(f"Error processing job {job_id}: {str(e)}")
+        tracer.current().record_error(e)
+        job_manager.update_job(job_id, 'failed', 0, f'Import failed: {str(e)}', error=str(e))
+        # Keep the checkpoint so `main.py resume` can retry without redoing finished work
+        checkpoint.release()
+
+
+def resume_job(job_id: str) -> bool:
+    """Resume one interrupted or failed import job in the calling thread.
+
+    Returns False if the job has no checkpoint. Raises CheckpointBusy if it
+    is still running elsewhere.
+    """
+    checkpoint = checkpoint_store.open(job_id)
+    if checkpoint is None:
+        return False
+    if checkpoint.params.get('kind') != 'web':
+        checkpoint.release()
+        raise ValueError(f"{job_id} is not a web import job")
+
+    process_import_job(job_id, checkpoint)
+    return True
+
+
+def resume_interrupted_jobs() -> int:
+    """Restart import jobs whose process died mid-run. Returns how many were resumed.
+
+    Safe to call from every worker: each checkpoint is locked by whichever
+    worker picks it up first.
+    """
+    resumed = 0
+    for job_id in checkpoint_store.job_ids():
+        job = job_manager.backend.get(job_id)
+        if job is None or job['status'] in TERMINAL_STATUSES:
+            # Expired jobs, and failed ones which are only retried on request
+            continue
+
+        try:
+            checkpoint = checkpoint_store.open(job_id)
+        except CheckpointBusy:
+            continue
+        if checkpoint is None:
+            continue
+        if checkpoint.params.get('kind') != 'web':
+            checkpoint.release()
+            continue
+
+        logger.info(f"Resuming interrupted job {job_id} from its checkpoint")
+        _spawn(job_id, checkpoint)
+        resumed += 1
+
+    return resumed
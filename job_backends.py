@@ -0,0 +1,603 @@
+import json
+import os
+import time
+import heapq
+import sqlite3
+import threading
+import logging
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, List, Optional, Any, Tuple
+
+from config import (
+    JOB_BACKEND, JOB_STORE_FILE, JOB_DB_PATH, REDIS_URL, JOB_POLL_INTERVAL_SECONDS
+)
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Job statuses after which a job never changes again
+TERMINAL_STATUSES = ('completed', 'failed')
+
+
+def _finished_at(job: Dict[str, Any]) -> Optional[float]:
+    """Epoch time a job finished at, or None while it is still running"""
+    if job.get('status') in TERMINAL_STATUSES:
+        return datetime.fromisoformat(job['updated_at']).timestamp()
+    return None
+
+
+class JobBackend:
+    """Storage interface behind JobManager.
+
+    Backends own persistence, the per-user and expiry indexes, per-job
+    version counters and change notification. Jobs are plain dicts with at
+    least 'id', 'user_id', 'status', 'created_at' and 'updated_at'.
+    """
+
+    def load(self) -> None:
+        """Open/load the store now instead of on first use"""
+
+    def create(self, job: Dict[str, Any]) -> None:
+        raise NotImplementedError
+
+    def update(self, job_id: str, fields: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Merge fields into a job and bump its version. Returns the job, or None if missing."""
+        raise NotImplementedError
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def list_user_jobs(self, user_id: str, limit: int) -> List[Dict[str, Any]]:
+        """A user's jobs, newest first"""
+        raise NotImplementedError
+
+    def pop_expired(self, cutoff: float) -> List[str]:
+        """Delete jobs that finished at or before cutoff (epoch seconds); returns their ids"""
+        raise NotImplementedError
+
+    def wait_for_change(self, job_id: str, since_version: int, timeout: float) -> Optional[int]:
+        """Block until the job's version passes since_version or timeout expires.
+
+        Returns the current version (unchanged on timeout), or None if the job
+        doesn't exist.
+        """
+        raise NotImplementedError
+
+
+class FileJobBackend(JobBackend):
+    """All jobs in one process's memory, persisted to a JSON file.
+
+    Only suitable for a single worker process: other processes neither see
+    its jobs nor its change notifications.
+    """
+
+    def __init__(self, storage_file: str = JOB_STORE_FILE):
+        self.storage_file = storage_file
+        self.jobs: Dict[str, Dict[str, Any]] = {}
+        self.lock = threading.Lock()
+        # Signalled on every job change so waiters don't have to poll
+        self.changed = threading.Condition(self.lock)
+        # Per-job change counters, bumped on every create/update
+        self.versions: Dict[str, int] = {}
+        # Secondary indexes, kept in step with self.jobs under the lock:
+        # user id -> job ids in creation order (newest last)
+        self.user_index: Dict[str, 'OrderedDict[str, None]'] = {}
+        # min-heap of (finished_at, job_id) for finished jobs; entries whose
+        # timestamp no longer matches finished_at[job_id] are stale and skipped
+        self.expiry_heap: List[Tuple[float, str]] = []
+        self.finished_at: Dict[str, float] = {}
+        self._loaded = False
+
+    def load(self) -> None:
+        with self.lock:
+            self._load_jobs()
+
+    def _load_jobs(self):
+        """Load jobs from storage file (caller must hold the lock)"""
+        if self._loaded:
+            return
+        self._loaded = True
+        if os.path.exists(self.storage_file):
+            try:
+                with open(self.storage_file, 'r') as f:
+                    self.jobs = json.load(f)
+            except json.JSONDecodeError:
+                print("Error loading jobs file, starting fresh")
+                self.jobs = {}
+
+        # Build the indexes once; afterwards they are maintained incrementally
+        for job in sorted(self.jobs.values(), key=lambda x: x['created_at']):
+            self._index_job(job)
+
+    def _save_jobs(self):
+        """Save jobs to storage file"""
+        with open(self.storage_file, 'w') as f:
+            json.dump(self.jobs, f, indent=2)
+
+    def _index_job(self, job: Dict[str, Any]) -> None:
+        """Add a job to the user and expiry indexes (caller must hold the lock)"""
+        self.user_index.setdefault(job['user_id'], OrderedDict())[job['id']] = None
+        self._track_expiry(job)
+
+    def _track_expiry(self, job: Dict[str, Any]) -> None:
+        """(Re)start or clear the job's expiry clock; older heap entries go stale"""
+        finished = _finished_at(job)
+        if finished is None:
+            self.finished_at.pop(job['id'], None)
+        else:
+            self.finished_at[job['id']] = finished
+            heapq.heappush(self.expiry_heap, (finished, job['id']))
+
+    def _notify(self, job_id: str) -> None:
+        """Bump the job's version and wake waiters (caller must hold the lock)"""
+        self.versions[job_id] = self.versions.get(job_id, 0) + 1
+        self.changed.notify_all()
+
+    def create(self, job: Dict[str, Any]) -> None:
+        with self.lock:
+            self._load_jobs()
+            self.jobs[job['id']] = job
+            self._index_job(job)
+            self._save_jobs()
+            self._notify(job['id'])
+
+    def update(self, job_id: str, fields: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        with self.lock:
+            self._load_jobs()
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+            job.update(fields)
+            if 'status' in fields:
+                self._track_expiry(job)
+            self._save_jobs()
+            self._notify(job_id)
+            return dict(job)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self.lock:
+            self._load_jobs()
+            job = self.jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def list_user_jobs(self, user_id: str, limit: int) -> List[Dict[str, Any]]:
+        # Walks only the k newest entries of this user instead of every job
+        with self.lock:
+            self._load_jobs()
+            user_jobs = []
+            for job_id in reversed(self.user_index.get(user_id, ())):
+                if len(user_jobs) >= limit:
+                    break
+                user_jobs.append(dict(self.jobs[job_id]))
+        return user_jobs
+
+    def pop_expired(self, cutoff: float) -> List[str]:
+        removed = []
+        with self.lock:
+            self._load_jobs()
+            while self.expiry_heap and self.expiry_heap[0][0] <= cutoff:
+                finished, job_id = heapq.heappop(self.expiry_heap)
+                if self.finished_at.get(job_id) != finished:
+                    continue  # stale entry: job was removed, reopened or finished again later
+
+                job = self.jobs.pop(job_id)
+                user_jobs = self.user_index.get(job['user_id'])
+                if user_jobs is not None:
+                    user_jobs.pop(job_id, None)
+                    if not user_jobs:
+                        del self.user_index[job['user_id']]
+                del self.finished_at[job_id]
+                self.versions.pop(job_id, None)
+                removed.append(job_id)
+
+            if removed:
+                self._save_jobs()
+                self.changed.notify_all()
+        return removed
+
+    def wait_for_change(self, job_id: str, since_version: int, timeout: float) -> Optional[int]:
+        with self.changed:
+            self._load_jobs()
+            self.changed.wait_for(
+                lambda: job_id not in self.jobs or self.versions.get(job_id, 0) > since_version,
+                timeout=timeout
+            )
+            if job_id not in self.jobs:
+                return None
+            return self.versions.get(job_id, 0)
+
+
+class _PollingWaitMixin:
+    """wait_for_change for shared stores: wakes immediately on changes made
+    by this process, and polls the stored version every poll_interval to
+    notice changes made by other processes."""
+
+    poll_interval = JOB_POLL_INTERVAL_SECONDS
+
+    def _init_local_changes(self):
+        self._local_changes = threading.Condition()
+
+    def _notify_local(self):
+        with self._local_changes:
+            self._local_changes.notify_all()
+
+    def _get_version(self, job_id: str) -> Optional[int]:
+        raise NotImplementedError
+
+    def wait_for_change(self, job_id: str, since_version: int, timeout: float) -> Optional[int]:
+        deadline = time.monotonic() + timeout
+        while True:
+            version = self._get_version(job_id)
+            remaining = deadline - time.monotonic()
+            if version is None or version > since_version or remaining <= 0:
+                return version
+            with self._local_changes:
+                self._local_changes.wait(min(remaining, self.poll_interval))
+
+
+class SQLiteJobBackend(_PollingWaitMixin, JobBackend):
+    """Jobs in a SQLite database in WAL mode, shared by every worker process
+    on the host.
+
+    Each job is one row; updates rewrite only that row inside a short
+    BEGIN IMMEDIATE transaction, and the version column lets waiters in any
+    process notice changes.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY,
+            user_id TEXT NOT NULL,
+            created_at TEXT NOT NULL,
+            finished_at REAL,
+            version INTEGER NOT NULL DEFAULT 1,
+            data TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS jobs_user_created ON jobs (user_id, created_at);
+        CREATE INDEX IF NOT EXISTS jobs_finished ON jobs (finished_at) WHERE finished_at IS NOT NULL;
+    """
+
+    def __init__(self, db_path: str = JOB_DB_PATH):
+        self.db_path = db_path
+        # sqlite3 connections can't be shared between threads
+        self._local = threading.local()
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+        self._init_local_changes()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            with self._schema_lock:
+                if not self._schema_ready:
+                    conn.executescript(self.SCHEMA)
+                    self._schema_ready = True
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        """Write transaction; takes the database write lock up front"""
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+
+    def load(self) -> None:
+        self._conn()
+
+    def create(self, job: Dict[str, Any]) -> None:
+        with self._transaction() as conn:
+            conn.execute(
+                'INSERT INTO jobs (id, user_id, created_at, finished_at, data) VALUES (?, ?, ?, ?, ?)',
+                (job['id'], job['user_id'], job['created_at'], _finished_at(job), json.dumps(job))
+            )
+        self._notify_local()
+
+    def update(self, job_id: str, fields: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        with self._transaction() as conn:
+            row = conn.execute('SELECT data FROM jobs WHERE id = ?', (job_id,)).fetchone()
+            if row is None:
+                return None
+            job = json.loads(row[0])
+            job.update(fields)
+            conn.execute(
+                'UPDATE jobs SET data = ?, finished_at = ?, version = version + 1 WHERE id = ?',
+                (json.dumps(job), _finished_at(job), job_id)
+            )
+        self._notify_local()
+        return job
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        row = self._conn().execute('SELECT data FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def list_user_jobs(self, user_id: str, limit: int) -> List[Dict[str, Any]]:
+        rows = self._conn().execute(
+            'SELECT data FROM jobs WHERE user_id = ? ORDER BY created_at DESC LIMIT ?',
+            (user_id, limit)
+        ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def pop_expired(self, cutoff: float) -> List[str]:
+        with self._transaction() as conn:
+            rows = conn.execute(
+                'SELECT id FROM jobs WHERE finished_at IS NOT NULL AND finished_at <= ?', (cutoff,)
+            ).fetchall()
+            conn.execute('DELETE FROM jobs WHERE finished_at IS NOT NULL AND finished_at <= ?', (cutoff,))
+        if rows:
+            self._notify_local()
+        return [row[0] for row in rows]
+
+    def _get_version(self, job_id: str) -> Optional[int]:
+        row = self._conn().execute('SELECT version FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return row[0] if row else None
+
+
+class LocalRedis:
+    """In-process stand-in for the subset of redis-py that RedisJobBackend
+    uses, for development and tests without a Redis server. Values are
+    strings, as with decode_responses=True."""
+
+    def __init__(self):
+        self._data: Dict[str, Any] = {}
+        self._lock = threading.RLock()
+
+    def hset(self, name, key=None, value=None, mapping=None):
+        with self._lock:
+            hash_ = self._data.setdefault(name, {})
+            items = dict(mapping or {})
+            if key is not None:
+                items[key] = value
+            added = sum(1 for k in items if k not in hash_)
+            hash_.update({k: str(v) for k, v in items.items()})
+            return added
+
+    def hget(self, name, key):
+        with self._lock:
+            return self._data.get(name, {}).get(key)
+
+    def hgetall(self, name):
+        with self._lock:
+            return dict(self._data.get(name, {}))
+
+    def hincrby(self, name, key, amount=1):
+        with self._lock:
+            hash_ = self._data.setdefault(name, {})
+            hash_[key] = str(int(hash_.get(key, 0)) + amount)
+            return int(hash_[key])
+
+    def exists(self, *names):
+        with self._lock:
+            return sum(1 for name in names if name in self._data)
+
+    def delete(self, *names):
+        with self._lock:
+            return sum(1 for name in names if self._data.pop(name, None) is not None)
+
+    def zadd(self, name, mapping):
+        with self._lock:
+            zset = self._data.setdefault(name, {})
+            added = sum(1 for member in mapping if member not in zset)
+            zset.update({member: float(score) for member, score in mapping.items()})
+            return added
+
+    def zrem(self, name, *members):
+        with self._lock:
+            zset = self._data.get(name, {})
+            removed = sum(1 for member in members if zset.pop(member, None) is not None)
+            if name in self._data and not zset:
+                del self._data[name]
+            return removed
+
+    def zrevrange(self, name, start, end):
+        with self._lock:
+            members = sorted(self._data.get(name, {}).items(), key=lambda item: (item[1], item[0]), reverse=True)
+            end = len(members) if end == -1 else end + 1
+            return [member for member, _ in members[start:end]]
+
+    def zrangebyscore(self, name, min, max):
+        with self._lock:
+            low = float(min)
+            high = float(max)
+            members = sorted(self._data.get(name, {}).items(), key=lambda item: (item[1], item[0]))
+            return [member for member, score in members if low <= score <= high]
+
+    def pipeline(self, transaction=True):
+        return _LocalPipeline(self)
+
+
+class _LocalPipeline:
+    """Queues commands and runs them atomically under the stand-in's lock.
+
+    watch() takes the lock until execute() or reset(), so nothing else can
+    change the watched keys (a WatchError can't happen); commands until
+    multi() run immediately, as with redis-py.
+    """
+
+    def __init__(self, client: LocalRedis):
+        self._client = client
+        self._commands = []
+        self._watching = False
+        self._queueing = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.reset()
+
+    def watch(self, *names):
+        if not self._watching:
+            self._client._lock.acquire()
+            self._watching = True
+        self._queueing = False
+
+    def multi(self):
+        self._queueing = True
+
+    def __getattr__(self, name):
+        if not self._queueing:
+            return getattr(self._client, name)
+
+        def queue(*args, **kwargs):
+            self._commands.append((getattr(self._client, name), args, kwargs))
+            return self
+        return queue
+
+    def execute(self):
+        try:
+            with self._client._lock:
+                return [command(*args, **kwargs) for command, args, kwargs in self._commands]
+        finally:
+            self.reset()
+
+    def reset(self):
+        self._commands = []
+        self._queueing = True
+        if self._watching:
+            self._watching = False
+            self._client._lock.release()
+
+
+class RedisJobBackend(_PollingWaitMixin, JobBackend):
+    """Jobs in Redis, shared across processes and instances.
+
+    Each job is a hash of JSON-encoded fields, so an update writes only the
+    fields that changed (plus the version) in one MULTI block, watching the
+    job so it isn't written once deleted. Per-user
+    listing and expiry use sorted sets. Without a Redis URL an in-process
+    LocalRedis stand-in is used.
+    """
+
+    VERSION_FIELD = '__version'
+
+    def __init__(self, url: str = REDIS_URL, client=None, prefix: str = 'jobs'):
+        if client is None:
+            if url:
+                import redis
+                client = redis.Redis.from_url(url, decode_responses=True)
+            else:
+                logger.warning("REDIS_URL not set, using an in-process Redis stand-in")
+                client = LocalRedis()
+        self.redis = client
+        # Raised by a transaction whose watched key changed (the stand-in
+        # locks instead, so it never raises)
+        if isinstance(client, LocalRedis):
+            self._watch_errors = ()
+        else:
+            from redis.exceptions import WatchError
+            self._watch_errors = (WatchError,)
+        self.prefix = prefix
+        self._init_local_changes()
+
+    def _job_key(self, job_id: str) -> str:
+        return f"{self.prefix}:job:{job_id}"
+
+    def _user_key(self, user_id: str) -> str:
+        return f"{self.prefix}:user:{user_id}"
+
+    @property
+    def _expiry_key(self) -> str:
+        return f"{self.prefix}:expiry"
+
+    def _decode(self, fields: Dict[str, str]) -> Optional[Dict[str, Any]]:
+        if not fields:
+            return None
+        return {key: json.loads(value) for key, value in fields.items() if key != self.VERSION_FIELD}
+
+    def _track_expiry(self, pipe, job_id: str, job: Dict[str, Any]) -> None:
+        finished = _finished_at(job)
+        if finished is None:
+            pipe.zrem(self._expiry_key, job_id)
+        else:
+            pipe.zadd(self._expiry_key, {job_id: finished})
+
+    def create(self, job: Dict[str, Any]) -> None:
+        encoded = {key: json.dumps(value) for key, value in job.items()}
+        encoded[self.VERSION_FIELD] = 1
+        created = datetime.fromisoformat(job['created_at']).timestamp()
+
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.hset(self._job_key(job['id']), mapping=encoded)
+        pipe.zadd(self._user_key(job['user_id']), {job['id']: created})
+        self._track_expiry(pipe, job['id'], job)
+        pipe.execute()
+        self._notify_local()
+
+    def update(self, job_id: str, fields: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        key = self._job_key(job_id)
+        # Watched, so a job deleted (or expired) between the check and the
+        # write isn't recreated as a partial hash that never expires
+        with self.redis.pipeline(transaction=True) as pipe:
+            while True:
+                try:
+                    pipe.watch(key)
+                    if not pipe.exists(key):
+                        return None
+                    pipe.multi()
+                    pipe.hset(key, mapping={name: json.dumps(value) for name, value in fields.items()})
+                    pipe.hincrby(key, self.VERSION_FIELD, 1)
+                    if 'status' in fields:
+                        self._track_expiry(pipe, job_id, fields)
+                    pipe.hgetall(key)
+                    job = self._decode(pipe.execute()[-1])
+                    break
+                except self._watch_errors:
+                    continue
+        self._notify_local()
+        return job
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return self._decode(self.redis.hgetall(self._job_key(job_id)))
+
+    def list_user_jobs(self, user_id: str, limit: int) -> List[Dict[str, Any]]:
+        job_ids = self.redis.zrevrange(self._user_key(user_id), 0, limit - 1)
+        if not job_ids:
+            return []
+        pipe = self.redis.pipeline(transaction=False)
+        for job_id in job_ids:
+            pipe.hgetall(self._job_key(job_id))
+        return [job for job in map(self._decode, pipe.execute()) if job is not None]
+
+    def pop_expired(self, cutoff: float) -> List[str]:
+        removed = []
+        for job_id in self.redis.zrangebyscore(self._expiry_key, '-inf', cutoff):
+            # Whoever removes the expiry entry owns the deletion
+            if not self.redis.zrem(self._expiry_key, job_id):
+                continue
+            user_id = self.redis.hget(self._job_key(job_id), 'user_id')
+            pipe = self.redis.pipeline(transaction=True)
+            pipe.delete(self._job_key(job_id))
+            if user_id is not None:
+                pipe.zrem(self._user_key(json.loads(user_id)), job_id)
+            pipe.execute()
+            removed.append(job_id)
+        if removed:
+            self._notify_local()
+        return removed
+
+    def _get_version(self, job_id: str) -> Optional[int]:
+        version = self.redis.hget(self._job_key(job_id), self.VERSION_FIELD)
+        return int(version) if version is not None else None
+
+
+def create_backend(name: str = JOB_BACKEND) -> JobBackend:
+    """Build the job backend selected by JOB_BACKEND"""
+    if name == 'file':
+        return FileJobBackend()
+    if name == 'sqlite':
+        return SQLiteJobBackend()
+    if name == 'redis':
+        return RedisJobBackend()
+    raise ValueError(f"Unknown job backend: {name!r} (expected 'file', 'sqlite' or 'redis')")
@@ -1,40 +1,48 @@
-import json
-import os
-from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Any
+import time
 import threading
 import uuid
-import time
 import logging
+from datetime import datetime
+from typing import Dict, List, Optional, Any, Tuple
 from flask import session
 
+from config import LAZY_STARTUP, JOB_MAX_AGE_HOURS, JOB_SWEEP_INTERVAL_SECONDS
+from job_backends import JobBackend, TERMINAL_STATUSES, create_backend
+from result_store import ResultStore
+from checkpoint_store import checkpoint_store
+from metrics import JOB_UPDATES, JOB_STORE_SECONDS
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Fields streamed to clients as progress deltas
+PROGRESS_FIELDS = ('status', 'progress', 'message')
+
+# Result lists that can grow with import size; they are moved to the result
+# store and only their counts are kept in the job record
+DETAIL_FIELDS = ('failed_track_details', 'unmatched_tracks')
+
 class JobManager:
-    """Manages import jobs and their statuses with persistent storage"""
+    """Manages import jobs and their statuses with persistent storage.
     
-    def __init__(self, storage_file: str = "job_status.json"):
-        self.storage_file = storage_file
-        self.jobs: Dict[str, Dict[str, Any]] = {}
-        self.lock = threading.Lock()
-        self._load_jobs()
+    Storage is delegated to a JobBackend (see job_backends.py): the JSON file
+    backend for a single process, or SQLite/Redis when several worker
+    processes have to see the same jobs.
+    """
     
-    def _load_jobs(self):
-        """Load jobs from storage file"""
-        if os.path.exists(self.storage_file):
-            try:
-                with open(self.storage_file, 'r') as f:
-                    self.jobs = json.load(f)
-            except json.JSONDecodeError:
-                print("Error loading jobs file, starting fresh")
-                self.jobs = {}
+    def __init__(self, backend: JobBackend = None, lazy: bool = False,
+                 result_store: ResultStore = None):
+        self.backend = backend or create_backend()
+        self.result_store = result_store or ResultStore()
+        self._sweeper: Optional[threading.Thread] = None
+        self._stop_sweeper = threading.Event()
+        if not lazy:
+            self.load()
     
-    def _save_jobs(self):
-        """Save jobs to storage file"""
-        with open(self.storage_file, 'w') as f:
-            json.dump(self.jobs, f, indent=2)
+    def load(self) -> None:
+        """Load the job store now instead of on first use"""
+        self.backend.load()
     
     def _get_user_id(self) -> str:
         """Get the current user's ID from session"""
@@ -43,106 +51,165 @@ class JobManager:
     def create_job(self, job_type: str, params: Dict[str, Any]) -> str:
         """Create a new job with user-specific tracking"""
         user_id = self._get_user_id()
-        job_id = f"{user_id}_{int(time.time())}"
+        job_id = f"{user_id}_{int(time.time())}_{uuid.uuid4().hex[:8]}"
         
-        self.jobs[job_id] = {
-            'id': job_id,
-            'user_id': user_id,
-            'type': job_type,
-            'params': params,
-            'status': 'pending',
-            'progress': 0,
-            'message': 'Job created',
-            'created_at': datetime.now().isoformat(),
-            'updated_at': datetime.now().isoformat(),
-            'error': None,
-            'result': None
-        }
+        with JOB_STORE_SECONDS.time(operation='create'):
+            self.backend.create({
+                'id': job_id,
+                'user_id': user_id,
+                'type': job_type,
+                'params': params,
+                'status': 'pending',
+                'progress': 0,
+                'message': 'Job created',
+                'created_at': datetime.now().isoformat(),
+                'updated_at': datetime.now().isoformat(),
+                'error': None,
+                'result': None
+            })
         
         logger.info(f"Created job {job_id} for user {user_id}: {job_type}")
-        self._save_jobs()
         return job_id
     
     def update_job(self, job_id: str, status: str, progress: int = None, 
                   message: str = None, error: str = None, result: Any = None) -> None:
         """Update job status with logging"""
-        with self.lock:
-            if job_id not in self.jobs:
-                logger.error(f"Job {job_id} not found")
-                return
-            
-            job = self.jobs[job_id]
-            job['status'] = status
-            job['updated_at'] = datetime.now().isoformat()
-            
-            if progress is not None:
-                job['progress'] = progress
-            if message is not None:
-                job['message'] = message
-            if error is not None:
-                job['error'] = error
-                logger.error(f"Job {job_id} error: {error}")
-            if result is not None:
-                job['result'] = result
-                # Add detailed statistics if available
-                if isinstance(result, dict):
-                    if 'total_tracks' in result:
-                        job['stats'] = {
-                            'total_tracks': result['total_tracks'],
-                            'matched_tracks': result['matched_tracks'],
-                            'failed_tracks': result['failed_tracks']
-                        }
-                        if result.get('failed_tracks', 0) > 0:
-                            logger.warning(f"Job {job_id}: {result['failed_tracks']} tracks failed to match")
-            
-            logger.info(f"Updated job {job_id}: {status} - {message}")
-            self._save_jobs()
+        fields = {
+            'status': status,
+            'updated_at': datetime.now().isoformat()
+        }
+        
+        if progress is not None:
+            fields['progress'] = progress
+        if message is not None:
+            fields['message'] = message
+        if error is not None:
+            fields['error'] = error
+            logger.error(f"Job {job_id} error: {error}")
+        if result is not None:
+            if isinstance(result, dict):
+                # Large lists go to the result store; only counts stay in the job
+                result = self._store_result_details(job_id, result)
+            fields['result'] = result
+            # Add detailed statistics if available
+            if isinstance(result, dict):
+                if 'total_tracks' in result:
+                    fields['stats'] = {
+                        'total_tracks': result['total_tracks'],
+                        'matched_tracks': result['matched_tracks'],
+                        'failed_tracks': result['failed_tracks']
+                    }
+                    if result.get('failed_tracks', 0) > 0:
+                        logger.warning(f"Job {job_id}: {result['failed_tracks']} tracks failed to match")
+        
+        # Only the changed fields are written (one row/hash in shared backends)
+        JOB_UPDATES.inc(status=status)
+        with JOB_STORE_SECONDS.time(operation='update'):
+            updated = self.backend.update(job_id, fields)
+        if updated is None:
+            logger.error(f"Job {job_id} not found")
+            return
+        logger.info(f"Updated job {job_id}: {status} - {message}")
+    
+    def _store_result_details(self, job_id: str, result: Dict[str, Any]) -> Dict[str, Any]:
+        """Move large detail lists out of a result into the result store"""
+        result = dict(result)
+        details = {}
+        for field in DETAIL_FIELDS:
+            if isinstance(result.get(field), list):
+                details[field] = self.result_store.put_list(job_id, field, result.pop(field))
+        if details:
+            result['details'] = details
+        return result
+    
+    def get_result_details(self, job_id: str, field: str, offset: int = 0,
+                           limit: int = 100) -> Optional[Dict[str, Any]]:
+        """Get one page of a job's stored result details (None if the job isn't visible)"""
+        if field not in DETAIL_FIELDS or self.get_job(job_id) is None:
+            return None
+        
+        items, total = self.result_store.get_page(job_id, field, offset, limit)
+        return {'items': items, 'offset': offset, 'limit': limit, 'total': total}
+    
+    def wait_for_update(self, job_id: str, since_version: int,
+                        timeout: float) -> Tuple[int, Optional[Dict[str, Any]]]:
+        """Block until the job changes past since_version or timeout expires.
+        
+        Returns (version, snapshot). The snapshot holds only the progress fields,
+        plus result/error once the job is finished, so streaming a job never
+        sends its full record on every change. snapshot is None if the job
+        no longer exists. On timeout the version is returned unchanged.
+        """
+        version = self.backend.wait_for_change(job_id, since_version, timeout)
+        if version is None:
+            return since_version, None
+        if version == since_version:
+            return version, {}
+        
+        job = self.backend.get(job_id)
+        if job is None:
+            return since_version, None
+        
+        snapshot = {field: job.get(field) for field in PROGRESS_FIELDS}
+        if job['status'] in TERMINAL_STATUSES:
+            snapshot['result'] = job.get('result')
+            snapshot['error'] = job.get('error')
+            snapshot['stats'] = job.get('stats')
+        return version, snapshot
     
     def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
         """Get job details with user verification"""
-        with self.lock:
-            if job_id not in self.jobs:
-                return None
-            
-            job = self.jobs[job_id]
-            user_id = self._get_user_id()
-            
-            # Only return job if it belongs to the current user
-            if job['user_id'] != user_id:
-                logger.warning(f"User {user_id} attempted to access job {job_id} belonging to {job['user_id']}")
-                return None
-            
-            return job
+        with JOB_STORE_SECONDS.time(operation='get'):
+            job = self.backend.get(job_id)
+        if job is None:
+            return None
+        
+        user_id = self._get_user_id()
+        
+        # Only return job if it belongs to the current user
+        if job['user_id'] != user_id:
+            logger.warning(f"User {user_id} attempted to access job {job_id} belonging to {job['user_id']}")
+            return None
+        
+        return job
     
     def get_user_jobs(self, limit: int = 10) -> List[Dict[str, Any]]:
-        """Get recent jobs for a user"""
-        user_id = self._get_user_id()
-        user_jobs = [
-            job for job in self.jobs.values()
-            if job['user_id'] == user_id
-        ]
-        # Sort by creation date, newest first
-        user_jobs.sort(key=lambda x: x['created_at'], reverse=True)
-        return user_jobs[:limit]
+        """Get recent jobs for a user, newest first, without scanning other users' jobs"""
+        return self.backend.list_user_jobs(self._get_user_id(), limit)
     
-    def cleanup_old_jobs(self, max_age_hours: int = 24) -> None:
-        """Clean up old completed jobs"""
-        current_time = datetime.now()
-        jobs_to_remove = []
+    def cleanup_old_jobs(self, max_age_hours: int = JOB_MAX_AGE_HOURS) -> int:
+        """Clean up old completed jobs. Only expired jobs are visited; returns how many were removed."""
+        removed = self.backend.pop_expired(time.time() - max_age_hours * 3600)
+        for job_id in removed:
+            self.result_store.delete(job_id)
+            # A failed job keeps its checkpoint for a manual resume until it expires
+            checkpoint_store.delete(job_id)
+            logger.info(f"Cleaned up old job {job_id}")
+        return len(removed)
+    
+    def start_sweeper(self, interval_seconds: float = JOB_SWEEP_INTERVAL_SECONDS,
+                      max_age_hours: int = JOB_MAX_AGE_HOURS) -> None:
+        """Run cleanup_old_jobs periodically in a background thread"""
+        if self._sweeper is not None and self._sweeper.is_alive():
+            return
+        
+        def sweep():
+            while not self._stop_sweeper.wait(interval_seconds):
+                try:
+                    self.cleanup_old_jobs(max_age_hours)
+                except Exception as e:
+                    logger.error(f"Job sweeper failed: {str(e)}")
         
-        with self.lock:
-            for job_id, job in self.jobs.items():
-                if job['status'] in ['completed', 'failed']:
-                    job_time = datetime.fromisoformat(job['updated_at'])
-                    age_hours = (current_time - job_time).total_seconds() / 3600
-                    
-                    if age_hours > max_age_hours:
-                        jobs_to_remove.append(job_id)
-            
-            for job_id in jobs_to_remove:
-                del self.jobs[job_id]
-                logger.info(f"Cleaned up old job {job_id}")
-            self._save_jobs()
+        self._stop_sweeper.clear()
+        self._sweeper = threading.Thread(target=sweep, name='job-sweeper', daemon=True)
+        self._sweeper.start()
+    
+    def stop_sweeper(self) -> None:
+        """Stop the background sweeper thread"""
+        self._stop_sweeper.set()
+        if self._sweeper is not None:
+            self._sweeper.join()
+            self._sweeper = None
 
-# Global job manager instance
-job_manager = JobManager() 
\ No newline at end of file
+# Global job manager instance (the job store is read on first use in lazy startup mode)
+job_manager = JobManager(lazy=LAZY_STARTUP) 
\ No newline at end of file
@@ -0,0 +1,23 @@
+import json
+import logging
+
+from config import JSON_BACKEND
+
+logger = logging.getLogger(__name__)
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+if JSON_BACKEND not in ('auto', 'orjson', 'json'):
+    raise ValueError(f"Unknown JSON_BACKEND: {JSON_BACKEND}")
+if JSON_BACKEND == 'orjson' and orjson is None:
+    logger.warning("JSON_BACKEND is 'orjson' but the orjson package is missing, using json")
+
+# Name of the parser in use
+BACKEND = 'orjson' if orjson is not None and JSON_BACKEND != 'json' else 'json'
+
+# Parse a JSON document, given as bytes straight from a response body (or a
+# str). Both parsers raise a ValueError subclass on invalid input.
+loads = orjson.loads if BACKEND == 'orjson' else json.loads
@@ -1,41 +1,203 @@
-import requests
+import asyncio
+import functools
+import logging
 import time
-from typing import List, Dict, Optional
-from config import LASTFM_API_KEY, LASTFM_BASE_URL, RATE_LIMIT_DELAY
+from typing import Callable, List, Dict, Optional, Tuple
 
+import httpx
+import requests
 
-class LastFmClient:
-    """Client for interacting with Last.fm API"""
+from config import (
+    LASTFM_API_KEY, LASTFM_BASE_URL, LASTFM_MAX_RETRIES, REQUEST_TIMEOUT_SECONDS,
+    LASTFM_MAX_CONCURRENCY, LASTFM_HTTP2
+)
+from metrics import LASTFM_REQUESTS, LASTFM_REQUEST_SECONDS, RATE_LIMITED, RETRY_WAIT_SECONDS
+from tracing import tracer
+from cost_estimator import RequestBudget
+from concurrency import lastfm_limiter, retry_after_seconds, overload_errors, RateLimited, Retryable
+from event_loop import event_loop, loop_local
+from json_codec import loads
+
+logger = logging.getLogger(__name__)
+
+# Last.fm error code for "Rate Limit Exceeded"
+RATE_LIMIT_ERROR = 29
+# "Operation failed" and "Service temporarily unavailable": worth retrying
+TEMPORARY_ERRORS = (8, 11, 16)
+
+# Method and response key for each user track list
+TRACK_LISTS = {
+    'top': ('user.gettoptracks', 'toptracks'),
+    'recent': ('user.getrecenttracks', 'recenttracks'),
+    'loved': ('user.getlovedtracks', 'lovedtracks')
+}
+
+# Method and response key of the global and per-country charts
+CHARTS = {
+    'tracks': {'chart': ('chart.gettoptracks', 'tracks'), 'geo': ('geo.gettoptracks', 'tracks')},
+    'artists': {'chart': ('chart.gettopartists', 'artists'), 'geo': ('geo.gettopartists', 'topartists')}
+}
+
+# Fields of each track list entry dropped as soon as a page is parsed. Image
+# lists are most of a track's size, and a multi-page fetch holds every page
+# until the last one arrives.
+UNUSED_TRACK_FIELDS = ('image', 'streamable', 'duration', 'loved')
+UNUSED_ARTIST_FIELDS = ('image', 'url', 'mbid')
+
+# Transport errors that mean the API is overloaded (retried), and ones that don't
+_OVERLOAD_ERRORS = overload_errors() + (httpx.TimeoutException, httpx.NetworkError, httpx.RemoteProtocolError)
+_REQUEST_ERRORS = (requests.exceptions.RequestException, httpx.HTTPError)
+
+def _connection_pool() -> httpx.AsyncClient:
+    """Pooled keep-alive Last.fm connections (gzip, and HTTP/2 if enabled)"""
+    http2 = LASTFM_HTTP2
+    if http2:
+        try:
+            import h2  # noqa: F401
+        except ImportError:
+            logger.warning("LASTFM_HTTP2 is set but the h2 package is missing, using HTTP/1.1")
+            http2 = False
+    return httpx.AsyncClient(
+        http2=http2,
+        timeout=REQUEST_TIMEOUT_SECONDS,
+        # The concurrency limit already caps requests in flight
+        limits=httpx.Limits(max_connections=LASTFM_MAX_CONCURRENCY,
+                            max_keepalive_connections=LASTFM_MAX_CONCURRENCY,
+                            keepalive_expiry=30)
+    )
+
+
+def _project_track(track: Dict) -> Dict:
+    """Drop the fields of a Last.fm track nothing reads (in place: cheaper than copying)"""
+    for field in UNUSED_TRACK_FIELDS:
+        track.pop(field, None)
+    artist = track.get('artist')
+    if isinstance(artist, dict):
+        for field in UNUSED_ARTIST_FIELDS:
+            artist.pop(field, None)
+    return track
+
+
+def _track_list(data: Dict, key: str) -> List[Dict]:
+    """The tracks of a user track list response"""
+    if key not in data or 'track' not in data[key]:
+        return []
+    
+    tracks = data[key]['track']
+    # Handle case where only one track is returned (not in a list)
+    if isinstance(tracks, dict):
+        tracks = [tracks]
+    
+    return [_project_track(track) for track in tracks]
+
+
+def _artist_names(data: Dict, key: str) -> List[str]:
+    """The artist names of an artist chart response"""
+    artists = data.get(key, {}).get('artist', [])
+    if isinstance(artists, dict):
+        artists = [artists]
+    return [artist['name'] for artist in artists if artist.get('name')]
+
+
+class AsyncLastFmClient:
+    """asyncio client for the Last.fm API.
     
-    def __init__(self, api_key: str = None):
+    Requests go through one pooled keep-alive connection pool per event loop
+    and wait for the shared Last.fm concurrency limit without holding a
+    thread, so one loop can keep many page fetches in flight. A
+    requests.Session passed as session is used instead, from a worker
+    thread (e.g. the benchmark's replayed responses).
+    """
+    
+    def __init__(self, api_key: str = None, session: requests.Session = None,
+                 budget: RequestBudget = None):
         self.api_key = api_key or LASTFM_API_KEY
         self.base_url = LASTFM_BASE_URL
-        self.session = requests.Session()
+        self.session = session
+        self.budget = budget
     
-    def _make_request(self, method: str, params: Dict) -> Dict:
-        """Make a request to Last.fm API with rate limiting"""
+    async def _make_request(self, method: str, params: Dict) -> Dict:
+        """Make a request to Last.fm API, retrying rate limits, server errors and timeouts"""
         default_params = {
             'api_key': self.api_key,
             'method': method,
             'format': 'json'
         }
         default_params.update(params)
+        # One logical request is charged once, however many attempts it takes
+        if self.budget is not None:
+            self.budget.spend('lastfm')
         
+        for attempt in range(LASTFM_MAX_RETRIES + 1):
+            try:
+                return await self._attempt(method, params, default_params)
+            except Retryable as e:
+                if attempt == LASTFM_MAX_RETRIES:
+                    raise e.error
+                wait = e.retry_after or 0.5 * 2 ** attempt
+                RETRY_WAIT_SECONDS.inc(wait, api='lastfm')
+                await asyncio.sleep(wait)
+    
+    async def _get(self, request_params: Dict):
+        if self.session is not None:
+            return await asyncio.get_running_loop().run_in_executor(None, functools.partial(
+                self.session.get, self.base_url, params=request_params, timeout=REQUEST_TIMEOUT_SECONDS))
+        return await loop_local('lastfm_pool', _connection_pool).get(self.base_url, params=request_params)
+    
+    async def _attempt(self, method: str, params: Dict, request_params: Dict) -> Dict:
+        """One request, in a slot of the shared Last.fm concurrency limit"""
+        start = time.perf_counter()
+        status = 'error'
         try:
-            time.sleep(RATE_LIMIT_DELAY)  # Rate limiting
-            response = self.session.get(self.base_url, params=default_params)
-            response.raise_for_status()
-            data = response.json()
+            async with lastfm_limiter.async_slot() as feedback:
+                try:
+                    response = await self._get(request_params)
+                except _OVERLOAD_ERRORS as e:
+                    feedback.throttled()
+                    raise Retryable(Exception(f"Request failed: {str(e)}"))
+                except _REQUEST_ERRORS as e:
+                    raise Exception(f"Request failed: {str(e)}")
+                status = str(response.status_code)
+                if response.status_code == 429 or response.status_code >= 500:
+                    feedback.throttled(retry_after_seconds(response.headers))
             
-            if 'error' in data:
+            if response.status_code == 429:
+                RATE_LIMITED.inc(api='lastfm')
+                raise Retryable(RateLimited("Last.fm rate limit exceeded"),
+                                 retry_after_seconds(response.headers))
+            # Last.fm sends its own errors (user not found, invalid key...) with
+            # 4xx statuses: their message goes before the status code
+            try:
+                data = loads(response.content)
+            except ValueError as e:
+                data, parse_error = None, str(e)
+            
+            if isinstance(data, dict) and 'error' in data:
+                status = f"error_{data['error']}"
+                if data['error'] == RATE_LIMIT_ERROR:
+                    RATE_LIMITED.inc(api='lastfm')
+                    lastfm_limiter.on_overload()
+                    raise Retryable(RateLimited(f"Last.fm API error: {data['message']}"))
+                if data['error'] in TEMPORARY_ERRORS:
+                    raise Retryable(Exception(f"Last.fm API error: {data['message']}"))
                 raise Exception(f"Last.fm API error: {data['message']}")
+            if response.status_code >= 500:
+                raise Retryable(Exception(f"Request failed: Last.fm returned {response.status_code}"))
+            if response.status_code >= 400:
+                raise Exception(f"Request failed: Last.fm returned {response.status_code}")
+            if data is None:
+                raise Exception(f"Request failed: {parse_error}")
             
             return data
-        except requests.exceptions.RequestException as e:
-            raise Exception(f"Request failed: {str(e)}")
+        finally:
+            elapsed = time.perf_counter() - start
+            LASTFM_REQUESTS.inc(method=method, status=status)
+            LASTFM_REQUEST_SECONDS.observe(elapsed, method=method)
+            tracer.record('lastfm.request', elapsed, method=method, status=status,
+                          page=params.get('page', 1))
     
-    def get_user_top_tracks(self, username: str, period: str = 'overall', 
-                           limit: int = 50, page: int = 1) -> List[Dict]:
+    async def get_user_top_tracks(self, username: str, period: str = 'overall', 
+                                  limit: int = 50, page: int = 1) -> List[Dict]:
         """Get user's top tracks for a given time period"""
         params = {
             'user': username,
@@ -44,20 +206,10 @@ class LastFmClient:
             'page': page
         }
         
-        data = self._make_request('user.gettoptracks', params)
-        
-        if 'toptracks' not in data or 'track' not in data['toptracks']:
-            return []
-        
-        tracks = data['toptracks']['track']
-        # Handle case where only one track is returned (not in a list)
-        if isinstance(tracks, dict):
-            tracks = [tracks]
-        
-        return tracks
+        return _track_list(await self._make_request('user.gettoptracks', params), 'toptracks')
     
-    def get_user_recent_tracks(self, username: str, limit: int = 50, 
-                              page: int = 1, from_timestamp: int = None) -> List[Dict]:
+    async def get_user_recent_tracks(self, username: str, limit: int = 50, 
+                                     page: int = 1, from_timestamp: int = None) -> List[Dict]:
         """Get user's recent tracks"""
         params = {
             'user': username,
@@ -68,19 +220,10 @@ class LastFmClient:
         if from_timestamp:
             params['from'] = from_timestamp
         
-        data = self._make_request('user.getrecenttracks', params)
-        
-        if 'recenttracks' not in data or 'track' not in data['recenttracks']:
-            return []
-        
-        tracks = data['recenttracks']['track']
-        if isinstance(tracks, dict):
-            tracks = [tracks]
-        
-        return tracks
+        return _track_list(await self._make_request('user.getrecenttracks', params), 'recenttracks')
     
-    def get_user_loved_tracks(self, username: str, limit: int = 50, 
-                             page: int = 1) -> List[Dict]:
+    async def get_user_loved_tracks(self, username: str, limit: int = 50, 
+                                    page: int = 1) -> List[Dict]:
         """Get user's loved tracks"""
         params = {
             'user': username,
@@ -88,24 +231,89 @@ class LastFmClient:
             'page': page
         }
         
-        data = self._make_request('user.getlovedtracks', params)
+        return _track_list(await self._make_request('user.getlovedtracks', params), 'lovedtracks')
+    
+    async def get_track_page(self, data_type: str, username: str, page: int = 1, limit: int = 50,
+                             period: str = 'overall') -> Tuple[List[Dict], Optional[int]]:
+        """One page of a user's top, recent or loved tracks, and the list's number of pages.
         
-        if 'lovedtracks' not in data or 'track' not in data['lovedtracks']:
-            return []
+        Without Last.fm's page count, a short page is the last one; after a
+        full page the count is unknown (None).
+        """
+        method, key = TRACK_LISTS[data_type]
+        params = {'user': username, 'limit': limit, 'page': page}
+        if data_type == 'top':
+            params['period'] = period
         
-        tracks = data['lovedtracks']['track']
-        if isinstance(tracks, dict):
-            tracks = [tracks]
+        data = await self._make_request(method, params)
+        tracks = _track_list(data, key)
+        try:
+            total_pages = int(data[key]['@attr']['totalPages'])
+        except (KeyError, TypeError, ValueError):
+            total_pages = page if len(tracks) < limit else None
+        return tracks, total_pages
+    
+    async def get_track_pages(self, data_type: str, username: str, pages: List[int], limit: int = 50,
+                              period: str = 'overall',
+                              on_page: Callable[[int, List[Dict]], None] = None) -> Dict[int, List[Dict]]:
+        """Fetch several pages of a track list at once (as fast as the concurrency limit allows).
         
-        return tracks
+        on_page is called with each page as it arrives, so finished pages can
+        be kept even if another one fails.
+        """
+        async def fetch(page: int) -> List[Dict]:
+            tracks, _ = await self.get_track_page(data_type, username, page, limit, period)
+            if on_page is not None:
+                on_page(page, tracks)
+            return tracks
+        
+        results = await asyncio.gather(*(fetch(page) for page in pages), return_exceptions=True)
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+        return dict(zip(pages, results))
     
-    def get_user_info(self, username: str) -> Dict:
+    async def get_total_tracks(self, username: str, data_type: str, period: str = 'overall') -> int:
+        """How many tracks a user's top, recent or loved list holds (one small request)"""
+        method, key = TRACK_LISTS[data_type]
+        params = {'user': username, 'limit': 1}
+        if data_type == 'top':
+            params['period'] = period
+        
+        data = await self._make_request(method, params)
+        try:
+            return int(data[key]['@attr']['total'])
+        except (KeyError, TypeError, ValueError):
+            return 0
+    
+    async def get_user_info(self, username: str) -> Dict:
         """Get basic user information"""
         params = {'user': username}
-        data = self._make_request('user.getinfo', params)
+        data = await self._make_request('user.getinfo', params)
         return data.get('user', {})
     
-    def search_track(self, track: str, artist: str = None, limit: int = 10) -> List[Dict]:
+    async def get_top_tracks(self, country: str = None, limit: int = 50, page: int = 1) -> List[Dict]:
+        """The most played tracks on Last.fm, worldwide or in one country (e.g. 'germany')"""
+        method, key = CHARTS['tracks']['geo' if country else 'chart']
+        params = {'limit': limit, 'page': page}
+        if country:
+            params['country'] = country
+        return _track_list(await self._make_request(method, params), key)
+    
+    async def get_top_artists(self, country: str = None, limit: int = 50, page: int = 1) -> List[str]:
+        """The names of the most played artists, worldwide or in one country"""
+        method, key = CHARTS['artists']['geo' if country else 'chart']
+        params = {'limit': limit, 'page': page}
+        if country:
+            params['country'] = country
+        return _artist_names(await self._make_request(method, params), key)
+    
+    async def get_artist_top_tracks(self, artist: str, limit: int = 10) -> List[Dict]:
+        """An artist's most played tracks"""
+        data = await self._make_request('artist.gettoptracks', {'artist': artist, 'limit': limit})
+        return _track_list(data, 'toptracks')
+    
+    async def search_track(self, track: str, artist: str = None, limit: int = 10) -> List[Dict]:
         """Search for tracks"""
         query = track
         if artist:
@@ -116,7 +324,7 @@ class LastFmClient:
             'limit': limit
         }
         
-        data = self._make_request('track.search', params)
+        data = await self._make_request('track.search', params)
         
         if 'results' not in data or 'trackmatches' not in data['results']:
             return []
@@ -135,7 +343,8 @@ class LastFmClient:
         playcount = 0
         
         if isinstance(track.get('artist'), dict):
-            artist_name = track['artist'].get('name', '')
+            # user.getrecenttracks uses '#text' instead of 'name'
+            artist_name = track['artist'].get('name') or track['artist'].get('#text', '')
         elif isinstance(track.get('artist'), str):
             artist_name = track['artist']
         else:
@@ -159,4 +368,73 @@ class LastFmClient:
             'playcount': playcount,
             'url': track.get('url', ''),
             'mbid': track.get('mbid', '')
-        } 
\ No newline at end of file
+        } 
+
+
+class LastFmClient:
+    """Client for interacting with Last.fm API.
+    
+    A blocking facade over AsyncLastFmClient: each call runs on the shared
+    event loop (see event_loop.py), so every client in the process reuses
+    the same pooled connections.
+    """
+    
+    def __init__(self, api_key: str = None, session: requests.Session = None,
+                 budget: RequestBudget = None):
+        self.client = AsyncLastFmClient(api_key, session, budget)
+        self.api_key = self.client.api_key
+        self.budget = budget
+    
+    def get_user_top_tracks(self, username: str, period: str = 'overall', 
+                           limit: int = 50, page: int = 1) -> List[Dict]:
+        """Get user's top tracks for a given time period"""
+        return event_loop.run(self.client.get_user_top_tracks(username, period, limit, page))
+    
+    def get_user_recent_tracks(self, username: str, limit: int = 50, 
+                              page: int = 1, from_timestamp: int = None) -> List[Dict]:
+        """Get user's recent tracks"""
+        return event_loop.run(self.client.get_user_recent_tracks(username, limit, page, from_timestamp))
+    
+    def get_user_loved_tracks(self, username: str, limit: int = 50, 
+                             page: int = 1) -> List[Dict]:
+        """Get user's loved tracks"""
+        return event_loop.run(self.client.get_user_loved_tracks(username, limit, page))
+    
+    def get_track_page(self, data_type: str, username: str, page: int = 1, limit: int = 50,
+                       period: str = 'overall') -> Tuple[List[Dict], Optional[int]]:
+        """One page of a user's top, recent or loved tracks, and the list's number of pages (or None)"""
+        return event_loop.run(self.client.get_track_page(data_type, username, page, limit, period))
+    
+    def get_track_pages(self, data_type: str, username: str, pages: List[int], limit: int = 50,
+                        period: str = 'overall',
+                        on_page: Callable[[int, List[Dict]], None] = None) -> Dict[int, List[Dict]]:
+        """Fetch several pages of a track list at once; on_page runs on the event loop thread"""
+        return event_loop.run(self.client.get_track_pages(data_type, username, pages, limit, period, on_page))
+    
+    def get_total_tracks(self, username: str, data_type: str, period: str = 'overall') -> int:
+        """How many tracks a user's top, recent or loved list holds (one small request)"""
+        return event_loop.run(self.client.get_total_tracks(username, data_type, period))
+    
+    def get_user_info(self, username: str) -> Dict:
+        """Get basic user information"""
+        return event_loop.run(self.client.get_user_info(username))
+    
+    def get_top_tracks(self, country: str = None, limit: int = 50, page: int = 1) -> List[Dict]:
+        """The most played tracks on Last.fm, worldwide or in one country (e.g. 'germany')"""
+        return event_loop.run(self.client.get_top_tracks(country, limit, page))
+    
+    def get_top_artists(self, country: str = None, limit: int = 50, page: int = 1) -> List[str]:
+        """The names of the most played artists, worldwide or in one country"""
+        return event_loop.run(self.client.get_top_artists(country, limit, page))
+    
+    def get_artist_top_tracks(self, artist: str, limit: int = 10) -> List[Dict]:
+        """An artist's most played tracks"""
+        return event_loop.run(self.client.get_artist_top_tracks(artist, limit))
+    
+    def search_track(self, track: str, artist: str = None, limit: int = 10) -> List[Dict]:
+        """Search for tracks"""
+        return event_loop.run(self.client.search_track(track, artist, limit))
+    
+    def normalize_track_data(self, track: Dict) -> Dict:
+        """Normalize track data from different Last.fm endpoints"""
+        return self.client.normalize_track_data(track)
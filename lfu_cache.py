@@ -0,0 +1,246 @@
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from metrics import CACHE_REQUESTS, CACHE_EVICTIONS, CACHE_BYTES
+
+# Rough cost of an entry's bookkeeping (ordered dict node, entry tuple)
+ENTRY_OVERHEAD = 160
+
+# Table halving every 4-bit counter of the frequency sketch at once
+_HALVE = bytes(count >> 1 for count in range(256))
+
+
+def approximate_size(value: Any) -> int:
+    """Bytes a key or value takes in memory, following dicts, lists and tuples"""
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(approximate_size(k) + approximate_size(v) for k, v in value.items())
+    elif isinstance(value, (list, tuple)):
+        size += sum(approximate_size(item) for item in value)
+    return size
+
+
+class FrequencySketch:
+    """Approximate access counts (count-min sketch of 4-bit counters).
+
+    Four counters per key, one in each row; a key's estimate is the smallest
+    of them. After sample_size increments every counter is halved, so the
+    counts follow what is popular now rather than what once was.
+    """
+
+    DEPTH = 4
+    MAX_COUNT = 15
+
+    def __init__(self, expected_entries: int):
+        width = 64
+        while width < expected_entries:
+            width *= 2
+        self._mask = width - 1
+        self._width = width
+        self._table = bytearray(width * self.DEPTH)
+        self.sample_size = 10 * width
+        self._additions = 0
+
+    def _slots(self, key: Hashable):
+        h = hash(key) & 0xFFFFFFFFFFFFFFFF
+        step = (h >> 32) | 1
+        return [row * self._width + ((h + row * step) & self._mask) for row in range(self.DEPTH)]
+
+    def frequency(self, key: Hashable) -> int:
+        table = self._table
+        return min(table[slot] for slot in self._slots(key))
+
+    def increment(self, key: Hashable) -> None:
+        table = self._table
+        slots = self._slots(key)
+        # Conservative update: only the smallest counters grow
+        least = min(table[slot] for slot in slots)
+        if least < self.MAX_COUNT:
+            for slot in slots:
+                if table[slot] == least:
+                    table[slot] += 1
+        self._additions += 1
+        if self._additions >= self.sample_size:
+            self._table = table.translate(_HALVE)
+            self._additions //= 2
+
+
+class TinyLfuCache:
+    """An in-memory cache bounded in bytes, with W-TinyLFU admission and eviction.
+
+    New entries go into a small LRU window (window_fraction of the budget).
+    An entry pushed out of the window only gets into the main space if it
+    has been asked for more often, by the frequency sketch, than the main
+    space's least recently used entries it would push out. So a long run of
+    one-off keys (a big import's long tail) can only churn the window, and
+    entries many users ask for stay resident. The main space is a segmented
+    LRU: entries hit again move from probation to the protected segment.
+
+    Every lookup counts towards a key's frequency, hits or not. Entries may
+    expire (ttl); sizes come from sizeof(key, value). Thread-safe.
+    """
+
+    def __init__(self, name: str, max_bytes: int, window_fraction: float = 0.01,
+                 protected_fraction: float = 0.8, average_entry_bytes: int = 512,
+                 sizeof: Callable[[Hashable, Any], int] = None):
+        self.name = name
+        self.max_bytes = max_bytes
+        self.window_max = max(1, int(max_bytes * window_fraction))
+        self.main_max = max_bytes - self.window_max
+        self.protected_max = int(self.main_max * protected_fraction)
+        self.sizeof = sizeof or (lambda key, value: approximate_size(key) + approximate_size(value))
+        self.sketch = FrequencySketch(max(1, max_bytes // average_entry_bytes))
+
+        # key -> (value, size, expires_at); least recently used first
+        self._window: 'OrderedDict[Hashable, tuple]' = OrderedDict()
+        self._probation: 'OrderedDict[Hashable, tuple]' = OrderedDict()
+        self._protected: 'OrderedDict[Hashable, tuple]' = OrderedDict()
+        self._bytes = {'window': 0, 'probation': 0, 'protected': 0}
+        self._counts = {'hits': 0, 'misses': 0, 'evictions': 0, 'rejections': 0, 'expirations': 0}
+        self._lock = threading.Lock()
+
+    def _segments(self):
+        return (('window', self._window), ('probation', self._probation), ('protected', self._protected))
+
+    def _find(self, key: Hashable) -> Tuple[Optional[str], Optional[tuple]]:
+        for segment, entries in self._segments():
+            entry = entries.get(key)
+            if entry is not None:
+                return segment, entry
+        return None, None
+
+    def get(self, key: Hashable) -> Tuple[bool, Any]:
+        """(found, value); found is False for missing and expired keys"""
+        with self._lock:
+            self.sketch.increment(key)
+            segment, entry = self._find(key)
+            if entry is not None and entry[2] is not None and entry[2] <= time.time():
+                self._remove(segment, key)
+                self._counts['expirations'] += 1
+                CACHE_BYTES.set(self._total_bytes(), cache=self.name)
+                entry = None
+            if entry is None:
+                self._counts['misses'] += 1
+                CACHE_REQUESTS.inc(cache=self.name, result='miss')
+                return False, None
+
+            if segment == 'probation':
+                # Hit again: promote, making room by demoting protected entries
+                self._remove('probation', key)
+                self._add('protected', key, entry)
+                self._demote()
+            else:
+                getattr(self, f"_{segment}").move_to_end(key)
+            self._counts['hits'] += 1
+        CACHE_REQUESTS.inc(cache=self.name, result='hit')
+        return True, entry[0]
+
+    def peek(self, key: Hashable) -> bool:
+        """Whether an unexpired entry is stored, without counting as a lookup
+        (no frequency, recency or metrics update)"""
+        with self._lock:
+            _, entry = self._find(key)
+            return entry is not None and (entry[2] is None or entry[2] > time.time())
+
+    def put(self, key: Hashable, value: Any, ttl: float = None) -> None:
+        """Store a value (expiring after ttl seconds, if given)"""
+        size = self.sizeof(key, value) + ENTRY_OVERHEAD
+        expires_at = time.time() + ttl if ttl is not None else None
+        with self._lock:
+            segment, entry = self._find(key)
+            if segment is not None:
+                self._remove(segment, key)
+            if size > self.main_max:
+                return
+            target = segment or 'window'
+            self._add(target, key, (value, size, expires_at))
+            self._demote()
+            self._evict()
+            CACHE_BYTES.set(self._total_bytes(), cache=self.name)
+
+    def _add(self, segment: str, key: Hashable, entry: tuple) -> None:
+        getattr(self, f"_{segment}")[key] = entry
+        self._bytes[segment] += entry[1]
+
+    def _remove(self, segment: str, key: Hashable) -> tuple:
+        entry = getattr(self, f"_{segment}").pop(key)
+        self._bytes[segment] -= entry[1]
+        return entry
+
+    def _demote(self) -> None:
+        """Move protected entries over its share back to probation. Holds the lock."""
+        while self._bytes['protected'] > self.protected_max:
+            key, entry = self._protected.popitem(last=False)
+            self._bytes['protected'] -= entry[1]
+            self._add('probation', key, entry)
+
+    def _total_bytes(self) -> int:
+        return sum(self._bytes.values())
+
+    def _evict(self) -> None:
+        """Move window overflow into the main space, if the sketch admits it. Holds the lock."""
+        while self._bytes['window'] > self.window_max:
+            candidate, entry = self._window.popitem(last=False)
+            self._bytes['window'] -= entry[1]
+            self._admit(candidate, entry)
+        while self._bytes['probation'] + self._bytes['protected'] > self.main_max:
+            # Only after a protected entry grew in place
+            segment = 'probation' if self._probation else 'protected'
+            _, entry = getattr(self, f"_{segment}").popitem(last=False)
+            self._bytes[segment] -= entry[1]
+            self._counts['evictions'] += 1
+            CACHE_EVICTIONS.inc(cache=self.name)
+
+    def _admit(self, candidate: Hashable, entry: tuple) -> None:
+        frequency = self.sketch.frequency(candidate)
+        victims = []
+        free = self.main_max - self._bytes['probation'] - self._bytes['protected']
+        # The victims are the main space's least recently used entries, probation first
+        for segment, entries in (('probation', self._probation), ('protected', self._protected)):
+            for key, victim in entries.items():
+                if free >= entry[1]:
+                    break
+                if self.sketch.frequency(key) >= frequency:
+                    # Not asked for more often than what it would push out
+                    self._counts['rejections'] += 1
+                    CACHE_EVICTIONS.inc(cache=self.name)
+                    return
+                victims.append((segment, key))
+                free += victim[1]
+        for segment, key in victims:
+            self._remove(segment, key)
+            self._counts['evictions'] += 1
+            CACHE_EVICTIONS.inc(cache=self.name)
+        self._add('probation', candidate, entry)
+
+    def discard(self, key: Hashable) -> None:
+        with self._lock:
+            segment, _ = self._find(key)
+            if segment is not None:
+                self._remove(segment, key)
+                CACHE_BYTES.set(self._total_bytes(), cache=self.name)
+
+    def clear(self) -> None:
+        with self._lock:
+            for segment, entries in self._segments():
+                entries.clear()
+                self._bytes[segment] = 0
+            CACHE_BYTES.set(0, cache=self.name)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._window) + len(self._probation) + len(self._protected)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._counts['hits'] + self._counts['misses']
+            return dict(
+                self._counts,
+                entries=len(self._window) + len(self._probation) + len(self._protected),
+                bytes=self._total_bytes(),
+                max_bytes=self.max_bytes,
+                hit_rate=round(self._counts['hits'] / lookups, 4) if lookups else None
+            )
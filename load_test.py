@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+Multi-user load test for the web app
+
+Simulates N signed-in users against a running instance. Each one starts
+imports through /api/import and polls /job_status and /check_auth the way
+the page does, and the run reports:
+
+- request latency percentiles per endpoint
+- job completion throughput and job durations
+- thread count and RSS of the server process(es), sampled from /proc
+
+Sessions are forged by signing cookies with the server's FLASK_SECRET_KEY,
+so no Spotify login is needed. Run it against fake_apis.py to stay offline:
+
+    python fake_apis.py --port 8900 --latency-ms 40 &
+    FLASK_SECRET_KEY=loadtest LASTFM_API_KEY=fake \\
+    LASTFM_BASE_URL=http://127.0.0.1:8900/2.0/ SPOTIFY_API_PREFIX=http://127.0.0.1:8900/v1/ \\
+    python app.py &
+    FLASK_SECRET_KEY=loadtest python load_test.py --sessions 20 --pid $! --output load_test.json
+"""
+
+import json
+import threading
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List
+from urllib.parse import urlparse
+
+import click
+import requests
+
+from conversion_benchmark import percentile
+
+
+def session_cookie(secret_key: str, data: Dict) -> str:
+    """Sign session data exactly as the app's Flask session would"""
+    from flask import Flask
+    from flask.sessions import SecureCookieSessionInterface
+
+    app = Flask(__name__)
+    app.secret_key = secret_key
+    return SecureCookieSessionInterface().get_signing_serializer(app).dumps(data)
+
+
+def _process_tree(pid: int) -> List[int]:
+    """pid and all its descendants (e.g. gunicorn's master and workers)"""
+    pids = [pid]
+    for current in pids:
+        try:
+            with open(f"/proc/{current}/task/{current}/children") as f:
+                pids.extend(int(child) for child in f.read().split())
+        except OSError:
+            pass
+    return pids
+
+
+def sample_process(pids: List[int]) -> Dict[str, float]:
+    """Total threads and RSS (MB) across the given processes and their children"""
+    threads = 0
+    rss_kb = 0
+    for root in pids:
+        for pid in _process_tree(root):
+            try:
+                with open(f"/proc/{pid}/status") as f:
+                    for line in f:
+                        if line.startswith('Threads:'):
+                            threads += int(line.split()[1])
+                        elif line.startswith('VmRSS:'):
+                            rss_kb += int(line.split()[1])
+            except OSError:
+                continue
+    return {'threads': threads, 'rss_mb': rss_kb / 1024}
+
+
+class LoadTest:
+    """Runs the simulated users and collects their measurements"""
+
+    def __init__(self, url: str, secret_key: str, sessions: int, imports_per_session: int,
+                 import_type: str, limit: int, poll_interval: float, timeout: float):
+        self.url = url.rstrip('/')
+        self.secret_key = secret_key
+        self.sessions = sessions
+        self.imports_per_session = imports_per_session
+        self.import_type = import_type
+        self.limit = limit
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self.run_id = uuid.uuid4().hex[:8]
+
+        self.lock = threading.Lock()
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.jobs: List[Dict] = []
+
+    def _request(self, http: requests.Session, endpoint: str, method: str, path: str, **kwargs):
+        start = time.perf_counter()
+        try:
+            response = http.request(method, self.url + path, timeout=30, **kwargs)
+        except requests.RequestException:
+            with self.lock:
+                self.errors[endpoint] += 1
+            return None
+        elapsed = time.perf_counter() - start
+
+        with self.lock:
+            self.latencies[endpoint].append(elapsed)
+            if response.status_code >= 400:
+                self.errors[endpoint] += 1
+        return response
+
+    def _user(self, index: int):
+        user_id = f"loadtest_{self.run_id}_{index}"
+        http = requests.Session()
+        http.cookies.set('session', session_cookie(self.secret_key, {
+            '_permanent': True,
+            'spotify_token': f"loadtest-{self.run_id}-{index}",
+            'spotify_refresh_token': None,
+            'spotify_token_expires_at': int(time.time()) + 86400,
+            'spotify_user_id': user_id
+        }), domain=urlparse(self.url).hostname)
+
+        self._request(http, 'check_auth', 'GET', '/check_auth')
+
+        for n in range(self.imports_per_session):
+            job = {'user': user_id, 'started': time.time(), 'status': 'not_started'}
+            response = self._request(http, 'api_import', 'POST', '/api/import', json={
+                'username': f"{user_id}_{n}",
+                'import_type': self.import_type,
+                'period': 'overall',
+                'limit': self.limit
+            })
+            if response is None or response.status_code != 200:
+                with self.lock:
+                    self.jobs.append(job)
+                continue
+
+            job_id = response.json()['job_id']
+            job['status'] = 'pending'
+            deadline = job['started'] + self.timeout
+            while time.time() < deadline:
+                time.sleep(self.poll_interval)
+                response = self._request(http, 'job_status', 'GET', f"/job_status/{job_id}")
+                self._request(http, 'check_auth', 'GET', '/check_auth')
+                if response is not None and response.status_code == 200:
+                    job['status'] = response.json().get('status')
+                    if job['status'] in ('completed', 'failed'):
+                        break
+            else:
+                job['status'] = 'timed_out'
+
+            job['finished'] = time.time()
+            with self.lock:
+                self.jobs.append(job)
+
+    def run(self, pids: List[int], sample_interval: float = 0.5) -> Dict:
+        samples = []
+        done = threading.Event()
+
+        def sampler():
+            while True:
+                samples.append(dict(sample_process(pids), t=time.time()))
+                if done.wait(sample_interval):
+                    break
+
+        if pids:
+            sampler_thread = threading.Thread(target=sampler, daemon=True)
+            sampler_thread.start()
+
+        started = time.time()
+        users = [threading.Thread(target=self._user, args=(i,), daemon=True) for i in range(self.sessions)]
+        for user in users:
+            user.start()
+        for user in users:
+            user.join()
+        elapsed = time.time() - started
+
+        done.set()
+        if pids:
+            sampler_thread.join()
+
+        return self._report(elapsed, samples)
+
+    def _report(self, elapsed: float, samples: List[Dict]) -> Dict:
+        statuses = defaultdict(int)
+        for job in self.jobs:
+            statuses[job['status']] += 1
+        durations = [job['finished'] - job['started'] for job in self.jobs if job['status'] == 'completed']
+
+        report = {
+            'created_at': datetime.now().isoformat(),
+            'url': self.url,
+            'sessions': self.sessions,
+            'imports_per_session': self.imports_per_session,
+            'import_type': self.import_type,
+            'limit': self.limit,
+            'elapsed_s': elapsed,
+            'jobs': dict(statuses),
+            'jobs_per_minute': statuses['completed'] / elapsed * 60 if elapsed else 0.0,
+            'job_duration_s': {
+                'p50': percentile(durations, 50),
+                'p99': percentile(durations, 99),
+                'max': max(durations)
+            } if durations else None,
+            'endpoints': {
+                endpoint: {
+                    'requests': len(latencies),
+                    'errors': self.errors.get(endpoint, 0),
+                    'p50_ms': percentile(latencies, 50) * 1000,
+                    'p90_ms': percentile(latencies, 90) * 1000,
+                    'p99_ms': percentile(latencies, 99) * 1000,
+                    'max_ms': max(latencies) * 1000
+                }
+                for endpoint, latencies in sorted(self.latencies.items()) if latencies
+            }
+        }
+
+        if samples:
+            report['server'] = {
+                'threads': {'start': samples[0]['threads'], 'peak': max(s['threads'] for s in samples),
+                            'end': samples[-1]['threads']},
+                'rss_mb': {'start': samples[0]['rss_mb'], 'peak': max(s['rss_mb'] for s in samples),
+                           'end': samples[-1]['rss_mb']},
+                'samples': [{'t': round(s['t'] - samples[0]['t'], 2), 'threads': s['threads'],
+                             'rss_mb': round(s['rss_mb'], 1)} for s in samples]
+            }
+        return report
+
+
+@click.command()
+@click.option('--url', default='http://127.0.0.1:8000', help='Base URL of the running app')
+@click.option('--sessions', '-n', default=10, help='Simultaneous signed-in users')
+@click.option('--imports-per-session', default=1, help='Imports each user runs, one after another')
+@click.option('--import-type', default='top', type=click.Choice(['top', 'recent', 'loved']))
+@click.option('--limit', '-l', default=100, help='Tracks per import')
+@click.option('--poll-interval', default=1.0, help='Seconds between status polls')
+@click.option('--timeout', default=600.0, help='Give up on a job after this many seconds')
+@click.option('--pid', 'pids', type=int, multiple=True,
+              help='Server process to sample threads/RSS from (children included); repeatable')
+@click.option('--secret-key', envvar='FLASK_SECRET_KEY', required=True,
+              help="The server's FLASK_SECRET_KEY (read from the environment by default)")
+@click.option('--output', '-o', type=click.Path(), help='Write the report JSON to this file')
+def main(url: str, sessions: int, imports_per_session: int, import_type: str, limit: int,
+         poll_interval: float, timeout: float, pids: tuple, secret_key: str, output: str):
+    """Load test the web app with many simultaneous imports"""
+    click.echo(f"🚦 {sessions} sessions x {imports_per_session} {import_type} imports of {limit} tracks -> {url}")
+    test = LoadTest(url, secret_key, sessions, imports_per_session, import_type, limit, poll_interval, timeout)
+    report = test.run(list(pids))
+
+    jobs = ', '.join(f"{count} {status}" for status, count in sorted(report['jobs'].items()))
+    click.echo(f"\n📊 Jobs: {jobs} in {report['elapsed_s']:.1f}s ({report['jobs_per_minute']:.1f} completed/min)")
+    if report['job_duration_s']:
+        click.echo(f"   job duration: p50 {report['job_duration_s']['p50']:.1f}s, "
+                   f"p99 {report['job_duration_s']['p99']:.1f}s")
+
+    click.echo("\n⏱️  Request latency:")
+    for endpoint, stats in report['endpoints'].items():
+        click.echo(f"   {endpoint:<12} p50 {stats['p50_ms']:8.1f}ms  p90 {stats['p90_ms']:8.1f}ms  "
+                   f"p99 {stats['p99_ms']:8.1f}ms  ({stats['requests']} requests, {stats['errors']} errors)")
+
+    if 'server' in report:
+        server = report['server']
+        click.echo(f"\n🧵 Server threads: {server['threads']['start']} -> peak {server['threads']['peak']}"
+                   f" -> {server['threads']['end']}")
+        click.echo(f"💾 Server RSS: {server['rss_mb']['start']:.1f} -> peak {server['rss_mb']['peak']:.1f}"
+                   f" -> {server['rss_mb']['end']:.1f} MB")
+
+    if output:
+        with open(output, 'w') as f:
+            json.dump(report, f, indent=2)
+        click.echo(f"\n✅ Report saved to {output}")
+
+
+if __name__ == '__main__':
+    main()
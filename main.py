@@ -3,14 +3,24 @@
 import click
 import json
 import os
-from typing import Dict, List
+import time
+import uuid
+from typing import Any, Dict, List
 from playlist_converter import PlaylistConverter
-from config import LASTFM_PERIODS
+from checkpoint_store import checkpoint_store, Checkpoint, CheckpointBusy
+from config import LASTFM_PERIODS, MATCH_SNAPSHOT_FILE, CACHE_WARM_MAX_SEARCHES
+from config import CACHE_REVALIDATE_MAX_REQUESTS, CACHE_REVALIDATE_AFTER_DAYS
+from config import MAX_TRACKS_PER_PLAYLIST, BATCH_PROCESSES, BATCH_THREADS, BATCH_SUMMARY_FILE
+from tracing import tracer
+from concurrency import priority
+from cost_estimator import estimate, job_budget, conversion_stats
+from match_cache import match_cache
 
 
 @click.group()
 @click.version_option(version='1.0.0')
-def cli():
+@click.option('--trace', is_flag=True, help='Record a trace of this run (see TRACE_EXPORTER)')
+def cli(trace: bool):
     """
     🎵 Last.fm to Spotify Playlist Converter
     
@@ -32,7 +42,8 @@ def cli():
     - SPOTIFY_CLIENT_ID=your_spotify_client_id
     - SPOTIFY_CLIENT_SECRET=your_spotify_client_secret
     """
-    pass
+    if trace:
+        tracer.sample_rate = 1.0
 
 
 @cli.command()
@@ -45,12 +56,17 @@ def cli():
 @click.option('--description', '-d', help='Custom playlist description')
 @click.option('--private', is_flag=True, help='Make playlist private')
 @click.option('--preview', is_flag=True, help='Preview tracks without creating playlist')
+@click.option('--dry-run', is_flag=True, help='Estimate API requests and duration without converting')
 def top(username: str, period: str, limit: int, name: str, description: str, 
-        private: bool, preview: bool):
+        private: bool, preview: bool, dry_run: bool):
     """Convert Last.fm top tracks to Spotify playlist"""
     
     try:
-        converter = PlaylistConverter()
+        if dry_run:
+            _display_estimate(username, 'top', period, limit)
+            return
+        
+        converter = PlaylistConverter(budget=job_budget(limit, capped=False))
         
         if preview:
             print(f"\n🔍 Previewing top {limit} tracks for {username} ({period})...")
@@ -71,10 +87,10 @@ def top(username: str, period: str, limit: int, name: str, description: str,
                 return
         
         if not preview:
-            result = converter.convert_top_tracks(
-                username, period, limit, name, description, not private
-            )
-            _display_result(result)
+            _convert(converter, {
+                'import_type': 'top', 'username': username, 'period': period, 'limit': limit,
+                'name': name, 'description': description, 'public': not private
+            })
             
     except Exception as e:
         click.echo(f"❌ Error: {str(e)}", err=True)
@@ -87,12 +103,17 @@ def top(username: str, period: str, limit: int, name: str, description: str,
 @click.option('--description', '-d', help='Custom playlist description')
 @click.option('--private', is_flag=True, help='Make playlist private')
 @click.option('--preview', is_flag=True, help='Preview tracks without creating playlist')
+@click.option('--dry-run', is_flag=True, help='Estimate API requests and duration without converting')
 def recent(username: str, limit: int, name: str, description: str, 
-           private: bool, preview: bool):
+           private: bool, preview: bool, dry_run: bool):
     """Convert Last.fm recent tracks to Spotify playlist"""
     
     try:
-        converter = PlaylistConverter()
+        if dry_run:
+            _display_estimate(username, 'recent', 'overall', limit)
+            return
+        
+        converter = PlaylistConverter(budget=job_budget(limit, capped=False))
         
         if preview:
             print(f"\n🔍 Previewing recent {limit} tracks for {username}...")
@@ -112,10 +133,10 @@ def recent(username: str, limit: int, name: str, description: str,
                 return
         
         if not preview:
-            result = converter.convert_recent_tracks(
-                username, limit, name, description, not private
-            )
-            _display_result(result)
+            _convert(converter, {
+                'import_type': 'recent', 'username': username, 'limit': limit,
+                'name': name, 'description': description, 'public': not private
+            })
             
     except Exception as e:
         click.echo(f"❌ Error: {str(e)}", err=True)
@@ -128,12 +149,17 @@ def recent(username: str, limit: int, name: str, description: str,
 @click.option('--description', '-d', help='Custom playlist description')
 @click.option('--private', is_flag=True, help='Make playlist private')
 @click.option('--preview', is_flag=True, help='Preview tracks without creating playlist')
+@click.option('--dry-run', is_flag=True, help='Estimate API requests and duration without converting')
 def loved(username: str, limit: int, name: str, description: str, 
-          private: bool, preview: bool):
+          private: bool, preview: bool, dry_run: bool):
     """Convert Last.fm loved tracks to Spotify playlist"""
     
     try:
-        converter = PlaylistConverter()
+        if dry_run:
+            _display_estimate(username, 'loved', 'overall', limit)
+            return
+        
+        converter = PlaylistConverter(budget=job_budget(limit, capped=False))
         
         if preview:
             print(f"\n🔍 Previewing loved tracks for {username}...")
@@ -153,15 +179,99 @@ def loved(username: str, limit: int, name: str, description: str,
                 return
         
         if not preview:
-            result = converter.convert_loved_tracks(
-                username, limit, name, description, not private
-            )
-            _display_result(result)
+            _convert(converter, {
+                'import_type': 'loved', 'username': username, 'limit': limit,
+                'name': name, 'description': description, 'public': not private
+            })
             
     except Exception as e:
         click.echo(f"❌ Error: {str(e)}", err=True)
 
 
+@cli.command()
+@click.argument('job_id')
+def resume(job_id: str):
+    """Resume an interrupted conversion from its checkpoint"""
+    
+    try:
+        checkpoint = checkpoint_store.open(job_id)
+        if checkpoint is None:
+            click.echo(f"❌ No checkpoint found for {job_id}")
+            return
+        
+        if checkpoint.params.get('kind') == 'web':
+            # Web import jobs report back to the job store they were started from
+            checkpoint.release()
+            from import_runner import resume_job
+            click.echo(f"\n🔄 Resuming web import job {job_id}...")
+            resume_job(job_id)
+            click.echo("✅ Job finished, check its status in the web app")
+            return
+        
+        click.echo(f"\n🔄 Resuming {checkpoint.params['import_type']} tracks for {checkpoint.params['username']} "
+                   f"({len(checkpoint.pages)} pages, {len(checkpoint.matches)} matches already done)...")
+        # Batch jobs may import into an account of their own
+        access_token = checkpoint.access_token() if checkpoint.params.get('token') else None
+        _finish_conversion(PlaylistConverter(spotify_access_token=access_token,
+                                             budget=job_budget(checkpoint.params['limit'], capped=False)), checkpoint)
+        
+    except CheckpointBusy:
+        click.echo(f"❌ {job_id} is still running", err=True)
+    except Exception as e:
+        click.echo(f"❌ Error: {str(e)}", err=True)
+
+
+@cli.command()
+@click.argument('manifest', type=click.Path(exists=True, dir_okay=False))
+@click.option('--processes', '-P', default=BATCH_PROCESSES, type=click.IntRange(1),
+              help='Worker processes (they split the API concurrency limits)')
+@click.option('--threads', '-t', default=BATCH_THREADS, type=click.IntRange(1),
+              help='Imports running at once in each process')
+@click.option('--summary', '-o', default=BATCH_SUMMARY_FILE, help='JSON summary file to write')
+@click.pass_context
+def batch(ctx, manifest: str, processes: int, threads: int, summary: str):
+    """Run the imports listed in a YAML manifest"""
+    from batch_runner import load_manifest, run_batch, write_summary, cli_authorized, ManifestError
+    
+    try:
+        jobs = load_manifest(manifest)
+    except ManifestError as e:
+        raise click.ClickException(str(e))
+    if not jobs:
+        click.echo("❌ The manifest lists no jobs")
+        return
+    tokenless = [job for job in jobs if not (job.get('spotify_refresh_token') or job.get('spotify_access_token'))]
+    if tokenless and not cli_authorized():
+        raise click.ClickException(
+            f"{len(tokenless)} jobs have no Spotify token and the CLI isn't authorized yet: "
+            f"run `python main.py top <username>` once, or give each job a spotify_refresh_token")
+    
+    click.echo(f"\n📦 Running {len(jobs)} imports on {processes} process(es) x {threads} thread(s)...")
+    
+    def report(entry: Dict[str, Any]):
+        who = f"{entry['username']} ({entry['import_type']})"
+        if entry['status'] == 'completed':
+            click.echo(f"✅ {who}: {entry['added_tracks']}/{entry['total_tracks']} tracks, "
+                       f"{entry['match_rate']:.1f}% matched, in {entry['seconds']:.0f}s")
+        else:
+            resume_hint = f" (resume with: python main.py resume {entry['job_id']})" if entry['job_id'] else ""
+            click.echo(f"❌ {who}: {entry['error']}{resume_hint}", err=True)
+    
+    result = run_batch(jobs, processes, threads, on_result=report)
+    write_summary(result, summary)
+    
+    click.echo("\n🎉 Batch Complete!")
+    click.echo("=" * 50)
+    click.echo(f"   Jobs: {result['completed']} completed, {result['failed']} failed")
+    click.echo(f"   Tracks: {result['tracks']:,} ({result['tracks_per_second'] or 0:,.1f}/s over {result['seconds']:.0f}s)")
+    if result['match_rate'] is not None:
+        click.echo(f"   Match rate: {result['match_rate']:.1f}% "
+                   f"({(result['cache_hit_rate'] or 0) * 100:.0f}% of unique tracks needed no search)")
+    click.echo(f"   Summary: {summary}")
+    if result['failed']:
+        ctx.exit(1)
+
+
 @cli.command()
 @click.argument('username')
 def info(username: str):
@@ -196,6 +306,58 @@ def periods():
         click.echo(f"   {period:<8} - {display_name}")
 
 
+@cli.command('export-matches')
+@click.option('--output', '-o', default=MATCH_SNAPSHOT_FILE, help='Snapshot file to write')
+def export_matches(output: str):
+    """Export the match cache as a snapshot new instances start warm from"""
+    
+    start = time.perf_counter()
+    count = match_cache.export_snapshot(output)
+    click.echo(f"📦 Wrote {count:,} matches to {output} ({os.path.getsize(output) / 1024:,.0f} KB) "
+               f"in {time.perf_counter() - start:.1f}s")
+
+
+@cli.command('warm-cache')
+@click.option('--country', '-c', 'countries', multiple=True,
+              help='Last.fm country whose chart to warm (repeatable; default CACHE_WARM_COUNTRIES)')
+@click.option('--max-searches', default=CACHE_WARM_MAX_SEARCHES, help='Spotify requests to spend at most')
+def warm_cache(countries: tuple, max_searches: int):
+    """Match Last.fm's chart tracks into the match cache ahead of imports"""
+    from cache_warmer import create_warmer
+    
+    warmer = create_warmer(countries=list(countries) or None, max_searches=max_searches)
+    if warmer is None:
+        raise click.ClickException("Cache warming needs LASTFM_API_KEY, SPOTIFY_CLIENT_ID and SPOTIFY_CLIENT_SECRET")
+    
+    click.echo("🔥 Warming the match cache from Last.fm's charts...")
+    counts = warmer.run_locked()
+    if counts is None:
+        click.echo("⏭️  Another process is already warming the cache")
+        return
+    click.echo(f"✅ {counts['matched']} matched, {counts['unmatched']} not on Spotify, "
+               f"{counts['cached']} already cached, {counts['failed']} failed")
+
+
+@cli.command('revalidate-cache')
+@click.option('--max-requests', default=CACHE_REVALIDATE_MAX_REQUESTS, help='Spotify requests to spend at most (50 matches each)')
+@click.option('--after-days', default=CACHE_REVALIDATE_AFTER_DAYS, help='Check matches not confirmed for this many days')
+def revalidate_cache(max_requests: int, after_days: float):
+    """Check cached matches against Spotify for relinked or withdrawn tracks"""
+    from cache_revalidator import create_revalidator
+    
+    revalidator = create_revalidator(max_requests=max_requests, after_days=after_days)
+    if revalidator is None:
+        raise click.ClickException("Cache revalidation needs SPOTIFY_CLIENT_ID and SPOTIFY_CLIENT_SECRET")
+    
+    click.echo("🔎 Revalidating cached matches...")
+    counts = revalidator.run_locked()
+    if counts is None:
+        click.echo("⏭️  Another process is already revalidating the cache")
+        return
+    click.echo(f"✅ {counts['valid']} still valid, {counts['relinked']} relinked, "
+               f"{counts['unplayable'] + counts['removed']} dropped to be searched again")
+
+
 @cli.command()
 def setup():
     """Interactive setup for API credentials"""
@@ -259,6 +421,56 @@ SPOTIFY_REDIRECT_URI=http://127.0.0.1:8000/callback
     click.echo("You can now use the playlist converter!")
 
 
+def _convert(converter: PlaylistConverter, params: Dict[str, Any]):
+    """Run a conversion under a new checkpoint and display the result"""
+    job_id = f"cli_{int(time.time())}_{uuid.uuid4().hex[:8]}"
+    checkpoint = checkpoint_store.create(job_id, dict(params, kind='cli'))
+    _finish_conversion(converter, checkpoint)
+
+
+def _finish_conversion(converter: PlaylistConverter, checkpoint: Checkpoint):
+    """Run (or continue) a checkpointed conversion, keeping the checkpoint if it stops early"""
+    params = checkpoint.params
+    try:
+        with priority('bulk'), \
+                tracer.trace('conversion', job_id=checkpoint.job_id, import_type=params['import_type'],
+                             limit=params['limit'], resumed=bool(checkpoint.pages)):
+            result = converter.resume_conversion(checkpoint)
+    except BaseException:
+        checkpoint.release()
+        click.echo(f"\n💾 Progress saved. Resume with: python main.py resume {checkpoint.job_id}", err=True)
+        raise
+    
+    checkpoint_store.complete(checkpoint)
+    conversion_stats.record(params['import_type'], converter.stats)
+    _display_result(result)
+
+
+def _display_estimate(username: str, import_type: str, period: str, limit: int):
+    """Display what a conversion would cost, asking Last.fm only for the track count"""
+    from lastfm_client import LastFmClient
+    available = LastFmClient().get_total_tracks(username, import_type, period)
+    cost = estimate(import_type, limit, available, capped=False)
+    
+    click.echo(f"\n🧮 Estimate for {username}'s {import_type} tracks ({available:,} available):")
+    click.echo(f"   Tracks to convert: {cost['tracks']:,} ({cost['unique_tracks']:,} unique)")
+    click.echo(f"   Last.fm pages: {cost['lastfm_pages']:,}")
+    click.echo(f"   Spotify searches: {cost['spotify_searches']:,}")
+    click.echo(f"   Playlist chunks: {cost['playlist_chunks']:,} (~{cost['expected_matches']:,} tracks found)")
+    if cost['playlists'] > 1:
+        click.echo(f"   Playlists: {cost['playlists']} (up to {MAX_TRACKS_PER_PLAYLIST:,} tracks each)")
+    click.echo(f"   Spotify requests: {cost['spotify_requests']:,} (budget {cost['budget']['spotify']:,})")
+    click.echo(f"   Expected duration: {cost['expected_seconds'] / 60:.1f} minutes")
+    for api, requests in (('lastfm', cost['lastfm_requests']), ('spotify', cost['spotify_requests'])):
+        if requests > cost['budget'][api]:
+            click.echo(f"   ⚠️ Expected {api} requests exceed the budget of {cost['budget'][api]:,}: "
+                       f"the conversion would stop early (resume it to continue)", err=True)
+    if cost['based_on_conversions']:
+        click.echo(f"   Based on {cost['based_on_conversions']} recent conversions")
+    else:
+        click.echo("   Based on default rates (no conversions recorded yet)")
+
+
 def _display_result(result: Dict):
     """Display conversion result"""
     playlist = result['playlist']
@@ -267,6 +479,9 @@ def _display_result(result: Dict):
     click.echo("=" * 50)
     click.echo(f"📝 Playlist: {playlist['name']}")
     click.echo(f"🔗 URL: {playlist['url']}")
+    for part in result.get('playlists', [])[1:]:
+        click.echo(f"📝 Playlist: {part['name']}")
+        click.echo(f"🔗 URL: {part['url']}")
     click.echo(f"📊 Statistics:")
     click.echo(f"   Last.fm tracks: {result['total_lastfm_tracks']}")
     click.echo(f"   Found on Spotify: {result['matched_tracks']}")
@@ -0,0 +1,256 @@
+import fcntl
+import json
+import logging
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from config import MATCH_CACHE_DB, MATCH_CACHE_TTL_DAYS, MATCH_CACHE_MISS_TTL_DAYS, MATCH_MEMORY_CACHE_MB
+from lfu_cache import TinyLfuCache
+from metrics import CACHE_REQUESTS
+from match_snapshot import SnapshotReader, match_snapshot, write_snapshot
+
+logger = logging.getLogger(__name__)
+
+
+def match_key(track: Dict) -> str:
+    """Cache key of a normalized Last.fm track (same as a checkpoint's match key)"""
+    return f"{track['artist'].lower()}\x1f{track['track'].lower()}"
+
+
+class MatchCache:
+    """Spotify matches of Last.fm tracks, shared by every conversion on the host.
+
+    Looked up before searching: first in memory (a bounded TinyLfuCache
+    shared by the process's jobs, see lfu_cache.py), then in a SQLite
+    database of recently resolved tracks that every worker process reads and
+    writes, then in the read-only snapshot (see match_snapshot.py); hits in
+    the latter two are kept in memory too. The database goes before the
+    snapshot so revalidation can override it: replaced matches are written
+    to the database, and withdrawn ones are recorded there so the snapshot's
+    copy isn't used. Matches are kept for
+    MATCH_CACHE_TTL_DAYS; tracks without one only for
+    MATCH_CACHE_MISS_TTL_DAYS, as they may turn up on Spotify later. An
+    empty db_path turns the database off. Database errors are logged and
+    count as misses: the cache never fails a conversion.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS matches (
+            key TEXT PRIMARY KEY,
+            track_id TEXT,
+            match TEXT,
+            updated_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS matches_by_age ON matches (updated_at);
+        CREATE TABLE IF NOT EXISTS withdrawn (
+            key TEXT PRIMARY KEY,
+            withdrawn_at REAL NOT NULL
+        );
+    """
+
+    def __init__(self, db_path: str = MATCH_CACHE_DB, snapshot: SnapshotReader = None,
+                 ttl_days: int = MATCH_CACHE_TTL_DAYS, miss_ttl_days: int = MATCH_CACHE_MISS_TTL_DAYS,
+                 memory: TinyLfuCache = None):
+        self.db_path = db_path
+        self.snapshot = snapshot
+        self.memory = memory
+        self.ttl_seconds = ttl_days * 86400
+        self.miss_ttl_seconds = miss_ttl_days * 86400
+        # sqlite3 connections can't be shared between threads
+        self._local = threading.local()
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            with self._schema_lock:
+                if not self._schema_ready:
+                    conn.executescript(self.SCHEMA)
+                    self._schema_ready = True
+        return conn
+
+    def get(self, track: Dict) -> Tuple[bool, Optional[Dict]]:
+        """(known, match): known is False if the track has to be searched"""
+        key = match_key(track)
+        if self.memory is not None:
+            found, match = self.memory.get(key)
+            if found:
+                return True, match
+        row, withdrawn = self._stored(key)
+        if self.db_path:
+            CACHE_REQUESTS.inc(cache='match_db', result='hit' if row is not None else 'miss')
+            if row is not None:
+                match, ttl = row
+                self._remember(key, match, ttl)
+                return True, match
+        if self.snapshot is not None and not withdrawn:
+            match = self.snapshot.lookup(key)
+            CACHE_REQUESTS.inc(cache='match_snapshot', result='hit' if match else 'miss')
+            if match:
+                self._remember(key, match, self.ttl_seconds)
+                return True, match
+        return False, None
+
+    def contains(self, track: Dict) -> bool:
+        """Whether get() would know the track, without counting as a lookup:
+        the memory layer's frequencies and the cache metrics are left as they are"""
+        key = match_key(track)
+        if self.memory is not None and self.memory.peek(key):
+            return True
+        row, withdrawn = self._stored(key)
+        if row is not None:
+            return True
+        return self.snapshot is not None and not withdrawn and self.snapshot.lookup(key) is not None
+
+    def _stored(self, key: str) -> Tuple[Optional[Tuple[Optional[Dict], float]], bool]:
+        """((match, seconds left) of the key's unexpired database entry or None,
+        whether revalidation withdrew the key's snapshot match)"""
+        if not self.db_path:
+            return None, False
+        try:
+            row = self._conn().execute(
+                'SELECT m.match, m.updated_at, w.key IS NOT NULL FROM (SELECT ? AS key) k '
+                'LEFT JOIN matches m ON m.key = k.key LEFT JOIN withdrawn w ON w.key = k.key',
+                (key,)).fetchone()
+        except sqlite3.Error as e:
+            logger.warning(f"Match cache lookup failed: {str(e)}")
+            return None, False
+        match_json, updated_at, withdrawn = row
+        if updated_at is not None:
+            match = json.loads(match_json) if match_json is not None else None
+            left = (self.ttl_seconds if match is not None else self.miss_ttl_seconds) - (time.time() - updated_at)
+            if left > 0:
+                return (match, left), bool(withdrawn)
+        return None, bool(withdrawn)
+
+    def _remember(self, key: str, match: Optional[Dict], ttl: float) -> None:
+        if self.memory is not None:
+            self.memory.put(key, match, ttl)
+
+    def put_many(self, results: Iterable[Tuple[Dict, Optional[Dict]]]) -> None:
+        """Store searched (track, match) pairs, match None for a track Spotify doesn't have"""
+        results = list(results)
+        for track, match in results:
+            self._remember(match_key(track), match,
+                           self.ttl_seconds if match is not None else self.miss_ttl_seconds)
+        if not self.db_path:
+            return
+        now = time.time()
+        rows = [(match_key(track), match['id'] if match else None,
+                 json.dumps(match) if match is not None else None, now)
+                for track, match in results]
+        if not rows:
+            return
+        try:
+            conn = self._conn()
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                conn.executemany('INSERT OR REPLACE INTO matches (key, track_id, match, updated_at) '
+                                 'VALUES (?, ?, ?, ?)', rows)
+                conn.executemany('DELETE FROM withdrawn WHERE key = ?', [(row[0],) for row in rows])
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+            conn.execute('COMMIT')
+        except sqlite3.Error as e:
+            logger.warning(f"Dropped {len(rows)} match cache entries: {str(e)}")
+
+    def oldest_matches(self, older_than_seconds: float, limit: int) -> List[Tuple[str, str]]:
+        """(key, Spotify track id) of up to limit matches not confirmed for older_than_seconds, oldest first"""
+        if not self.db_path:
+            return []
+        return self._conn().execute(
+            'SELECT key, track_id FROM matches WHERE track_id IS NOT NULL AND updated_at < ? '
+            'ORDER BY updated_at LIMIT ?', (time.time() - older_than_seconds, limit)).fetchall()
+
+    def revalidated(self, confirmed: Iterable[str], replaced: Dict[str, Dict],
+                    stale: Iterable[str]) -> None:
+        """Apply a revalidation: confirmed keys are fresh again, replaced ones
+        get a new match, and stale ones are dropped so they get searched again.
+
+        Keys may come from the snapshot alone: replaced ones are inserted, and
+        stale ones are recorded as withdrawn so the snapshot's match is skipped.
+        """
+        stale = list(stale)
+        for key in stale:
+            if self.memory is not None:
+                self.memory.discard(key)
+        for key, match in replaced.items():
+            self._remember(key, match, self.ttl_seconds)
+        if not self.db_path:
+            return
+        now = time.time()
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.executemany('UPDATE matches SET updated_at = ? WHERE key = ?',
+                             [(now, key) for key in confirmed])
+            conn.executemany('INSERT OR REPLACE INTO matches (key, track_id, match, updated_at) '
+                             'VALUES (?, ?, ?, ?)',
+                             [(key, match['id'], json.dumps(match), now) for key, match in replaced.items()])
+            conn.executemany('DELETE FROM matches WHERE key = ?', [(key,) for key in stale])
+            conn.executemany('INSERT OR REPLACE INTO withdrawn (key, withdrawn_at) VALUES (?, ?)',
+                             [(key, now) for key in stale])
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+
+    @contextmanager
+    def host_lock(self, name: str):
+        """Yields whether this process got the named lock on the database,
+        which one process on the host holds at a time (without waiting)"""
+        if not self.db_path:
+            yield True
+            return
+        with open(f"{self.db_path}.{name}.lock", 'a') as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def prune(self) -> int:
+        """Delete expired entries; returns how many"""
+        if not self.db_path:
+            return 0
+        now = time.time()
+        # Snapshots from before a withdrawal are past the TTL by then
+        self._conn().execute('DELETE FROM withdrawn WHERE withdrawn_at < ?', (now - self.ttl_seconds,))
+        cursor = self._conn().execute(
+            'DELETE FROM matches WHERE (track_id IS NOT NULL AND updated_at < ?) '
+            'OR (track_id IS NULL AND updated_at < ?)',
+            (now - self.ttl_seconds, now - self.miss_ttl_seconds))
+        return cursor.rowcount
+
+    def matches(self) -> Iterator[Tuple[str, str]]:
+        """(key, match as JSON) of every unexpired match in the database"""
+        if not self.db_path:
+            return iter(())
+        return iter(self._conn().execute(
+            'SELECT key, match FROM matches WHERE track_id IS NOT NULL AND updated_at >= ?',
+            (time.time() - self.ttl_seconds,)))
+
+    def export_snapshot(self, path: str) -> int:
+        """Write the database's matches as a snapshot file; returns the entry count"""
+        self.prune()
+        return write_snapshot(path, self.matches())
+
+
+# Global cache shared by every conversion in the process
+# (MATCH_MEMORY_CACHE_MB=0 leaves out the in-memory layer)
+match_cache = MatchCache(snapshot=match_snapshot,
+                         memory=TinyLfuCache('match_memory', int(MATCH_MEMORY_CACHE_MB * 1024 * 1024))
+                         if MATCH_MEMORY_CACHE_MB > 0 else None)
@@ -0,0 +1,182 @@
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+from typing import Dict, Iterable, Optional, Tuple
+
+from config import MATCH_SNAPSHOT_FILE, MATCH_CACHE_TTL_DAYS
+
+logger = logging.getLogger(__name__)
+
+# Header: magic, entry count, export time (Unix seconds)
+MAGIC = b'LFSPMAT2'
+HEADER = struct.Struct('>8sQd8x')
+HASH_SIZE = 8
+# Index record: key hash, then the offset and length of the match's JSON in
+# the data section that follows the index
+RECORD = struct.Struct('>8sQI')
+RECORD_SIZE = RECORD.size
+
+# How often a reader checks whether the snapshot file was replaced
+RELOAD_CHECK_SECONDS = 30
+
+
+def key_hash(key: str) -> bytes:
+    """8-byte hash of a match key; big-endian, so byte order is numeric order"""
+    return hashlib.blake2b(key.encode('utf-8'), digest_size=HASH_SIZE).digest()
+
+
+def write_snapshot(path: str, entries: Iterable[Tuple[str, str]]) -> int:
+    """Write (match key, match as JSON) pairs as a snapshot; returns the entry count.
+
+    The index is sorted by key hash into fixed-width records, so readers can
+    binary search the file in place; each points at its match's compact
+    JSON in the data section after it, so a snapshot hit has the same fields
+    as a database hit. Of two keys whose hashes collide only the first is
+    kept. The file is written next to path and renamed over it: readers that
+    still have the old snapshot mapped keep reading it.
+    """
+    records = {}
+    for key, match in entries:
+        compact = json.dumps(json.loads(match), separators=(',', ':'))
+        records.setdefault(key_hash(key), compact.encode('utf-8'))
+
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(temp_path, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, len(records), time.time()))
+            digests = sorted(records)
+            offset = 0
+            for digest in digests:
+                f.write(RECORD.pack(digest, offset, len(records[digest])))
+                offset += len(records[digest])
+            for digest in digests:
+                f.write(records[digest])
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return len(records)
+
+
+class MatchSnapshot:
+    """A read-only snapshot of the match cache, memory-mapped from disk.
+
+    Opening only maps the file and checks its header, so it takes the same
+    few milliseconds at any size; lookups binary search the mapped records
+    and touch a few pages. Every worker process maps the same file, so they
+    share one copy through the page cache. Only matched tracks are stored
+    (the whole match, as in the database), by a 64-bit hash of their key (a
+    false hit needs two of the keys to collide, about one in 10^7 for a
+    million entries).
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.count = 0
+        self.created_at = 0.0
+        self._file = open(path, 'rb')
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # An empty file can't be mapped
+            self._file.close()
+            raise ValueError(f"{path} is not a match snapshot")
+
+        if len(self._map) < HEADER.size:
+            self.close()
+            raise ValueError(f"{path} is not a match snapshot")
+        magic, self.count, self.created_at = HEADER.unpack_from(self._map)
+        self._data_start = HEADER.size + self.count * RECORD_SIZE
+        if magic != MAGIC or len(self._map) < self._data_start:
+            self.close()
+            raise ValueError(f"{path} is not a current match snapshot (or is truncated)")
+
+    def lookup(self, key: str) -> Optional[Dict]:
+        """The match stored for a match key, or None"""
+        digest = key_hash(key)
+        mapped = self._map
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            offset = HEADER.size + middle * RECORD_SIZE
+            found = mapped[offset:offset + HASH_SIZE]
+            if found < digest:
+                low = middle + 1
+            elif found > digest:
+                high = middle
+            else:
+                _, start, length = RECORD.unpack_from(mapped, offset)
+                start += self._data_start
+                return json.loads(mapped[start:start + length])
+        return None
+
+    def age_seconds(self) -> float:
+        return time.time() - self.created_at
+
+    def close(self) -> None:
+        self._map.close()
+        self._file.close()
+
+
+class SnapshotReader:
+    """The current snapshot at a path, opened on first use.
+
+    A snapshot exported over the file (or added after startup) is picked up
+    within RELOAD_CHECK_SECONDS. A snapshot older than the match cache TTL is
+    ignored.
+    """
+
+    def __init__(self, path: str = MATCH_SNAPSHOT_FILE, max_age_days: int = MATCH_CACHE_TTL_DAYS):
+        self.path = path
+        self.max_age_seconds = max_age_days * 86400
+        self._snapshot: Optional[MatchSnapshot] = None
+        self._identity = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def _refresh(self) -> None:
+        now = time.monotonic()
+        if self._checked_at and now - self._checked_at < RELOAD_CHECK_SECONDS:
+            return
+        with self._lock:
+            if self._checked_at and now - self._checked_at < RELOAD_CHECK_SECONDS:
+                return
+            self._checked_at = now
+            try:
+                stat = os.stat(self.path)
+            except OSError:
+                self._snapshot, self._identity = None, None
+                return
+            identity = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+            if identity == self._identity:
+                return
+            self._identity = identity
+            try:
+                # The replaced snapshot is unmapped once no lookup holds it
+                self._snapshot = MatchSnapshot(self.path)
+                logger.info(f"Loaded match snapshot {self.path} ({self._snapshot.count:,} matches)")
+            except (OSError, ValueError) as e:
+                self._snapshot = None
+                logger.warning(f"Ignoring match snapshot: {str(e)}")
+
+    def lookup(self, key: str) -> Optional[Dict]:
+        """The match the snapshot has for a match key, or None"""
+        if not self.path:
+            return None
+        self._refresh()
+        snapshot = self._snapshot
+        if snapshot is None or snapshot.age_seconds() > self.max_age_seconds:
+            return None
+        return snapshot.lookup(key)
+
+
+# Global reader shared by every conversion in the process
+match_snapshot = SnapshotReader()
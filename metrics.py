@@ -0,0 +1,255 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Sequence, Tuple
+
+# Seconds; covers a single cached lookup up to a 10,000-track import
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Tuple = ()) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs.extend(f'{name}="{_escape(value)}"' for name, value in extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    """Base for labelled metrics; children are keyed by their label values"""
+
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return lines
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """A value that only goes up"""
+
+    kind = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+                for key, value in values]
+
+
+class Gauge(_Metric):
+    """A value that goes up and down, or is read from a callback at scrape time"""
+
+    kind = 'gauge'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 function: Callable[[], float] = None):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._function = function
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def value(self, **labels) -> float:
+        if self._function is not None:
+            return self._function()
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def _samples(self) -> List[str]:
+        if self._function is not None:
+            return [f"{self.name} {_format_value(self._function())}"]
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+                for key, value in values]
+
+
+class Histogram(_Metric):
+    """Observations counted into cumulative buckets, with their sum and count"""
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # key -> [per-bucket counts (last one is +Inf), sum]
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of the with-block"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels) -> int:
+        with self._lock:
+            entry = self._values.get(self._key(labels))
+            return sum(entry[0]) if entry else 0
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            values = sorted((key, (list(counts), total)) for key, (counts, total) in self._values.items())
+
+        lines = []
+        for key, (counts, total) in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, (('le', _format_value(bound)),))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    """The set of metrics exposed together on /metrics"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+              function: Callable[[], float] = None) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames, function))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        """The Prometheus text exposition format (version 0.0.4)"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+# Global registry, and the metrics recorded across the app. Each process keeps
+# its own values, so with several gunicorn workers a scrape sees one worker.
+registry = Registry()
+
+LASTFM_REQUESTS = registry.counter(
+    'lastfm_requests_total', 'Last.fm API calls by method and outcome', ('method', 'status'))
+LASTFM_REQUEST_SECONDS = registry.histogram(
+    'lastfm_request_seconds', 'Last.fm API call latency by method', ('method',))
+
+SPOTIFY_REQUESTS = registry.counter(
+    'spotify_requests_total', 'Spotify API calls by endpoint and outcome', ('endpoint', 'status'))
+SPOTIFY_REQUEST_SECONDS = registry.histogram(
+    'spotify_request_seconds', 'Spotify API call latency by endpoint (including retries)', ('endpoint',))
+
+RATE_LIMITED = registry.counter(
+    'api_rate_limited_total', 'HTTP 429 responses received', ('api',))
+RETRY_WAIT_SECONDS = registry.counter(
+    'api_retry_wait_seconds_total', 'Time spent waiting before retrying API calls', ('api',))
+
+CACHE_REQUESTS = registry.counter(
+    'cache_requests_total', 'Lookups in the caches that save API calls', ('cache', 'result'))
+CACHE_EVICTIONS = registry.counter(
+    'cache_evictions_total', 'Entries dropped (or not admitted) by the in-memory caches to stay in budget', ('cache',))
+CACHE_BYTES = registry.gauge(
+    'cache_bytes', 'Approximate memory held by the in-memory caches', ('cache',))
+
+CACHE_WARM_TRACKS = registry.counter(
+    'cache_warm_tracks_total', 'Chart tracks handled by the cache warmer, by outcome', ('result',))
+
+CACHE_REVALIDATIONS = registry.counter(
+    'cache_revalidations_total', 'Cached matches checked against Spotify, by outcome', ('result',))
+
+STAGE_SECONDS = registry.histogram(
+    'conversion_stage_seconds', 'Duration of conversion stages (fetch, match, add)', ('stage',))
+
+JOB_UPDATES = registry.counter(
+    'job_updates_total', 'Job status writes by status', ('status',))
+JOB_STORE_SECONDS = registry.histogram(
+    'job_store_seconds', 'Job store operation latency', ('operation',),
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1))
+JOBS_QUEUED = registry.gauge(
+    'import_jobs_queued', 'Import jobs accepted but not yet running')
+WORKERS_ACTIVE = registry.gauge(
+    'import_workers_active', 'Import jobs currently being processed')
+API_CONCURRENCY_LIMIT = registry.gauge(
+    'api_concurrency_limit', 'Current adaptive limit on in-flight requests per API', ('api',))
+API_IN_FLIGHT = registry.gauge(
+    'api_requests_in_flight', 'Requests currently in flight per API', ('api',))
+API_QUEUE_SECONDS = registry.histogram(
+    'api_queue_wait_seconds', 'Time requests waited for a concurrency slot, per API and lane', ('api', 'lane'))
+THREADS = registry.gauge(
+    'process_threads', 'Live threads in this process', function=threading.active_count)
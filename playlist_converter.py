@@ -1,33 +1,54 @@
-from typing import List, Dict, Tuple, Optional, Any
+from typing import List, Dict, Tuple, Optional, Any, Callable
 from tqdm import tqdm
-import time
 from datetime import datetime
-import requests
 import logging
+import asyncio
+import math
+import time
 
 from lastfm_client import LastFmClient
 from spotify_client import SpotifyClient
-from config import MAX_TRACKS_PER_PLAYLIST, LASTFM_PERIODS
+from checkpoint_store import Checkpoint
+from match_cache import MatchCache, match_cache as shared_match_cache
+from config import MAX_TRACKS_PER_PLAYLIST, LASTFM_PERIODS, MATCH_WORKERS
+from metrics import STAGE_SECONDS, CACHE_REQUESTS
+from tracing import tracer
+from cost_estimator import RequestBudget, BudgetExceeded, LASTFM_PAGE_SIZE, PLAYLIST_CHUNK_SIZE
+from concurrency import RateLimited
+from event_loop import event_loop
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Searched matches are written to the shared match cache in batches this big
+MATCH_CACHE_BATCH = 500
+
 class PlaylistConverter:
     """Main class for converting Last.fm data to Spotify playlists"""
     
     def __init__(self, lastfm_api_key: str = None, spotify_client_id: str = None, 
                  spotify_client_secret: str = None, spotify_redirect_uri: str = None,
-                 spotify_access_token: str = None):
+                 spotify_access_token: str = None, requests_session=None,
+                 budget: RequestBudget = None, match_cache: MatchCache = None):
+        """requests_session, if given, carries every Last.fm and Spotify API call.
+        API calls are charged to budget (only counted if it's not given).
+        match_cache defaults to the one shared by every conversion on the host."""
+        self.budget = budget or RequestBudget()
+        self.match_cache = match_cache if match_cache is not None else shared_match_cache
+        # Counts and timings of this conversion, for cost_estimator
+        self.stats: Dict[str, Any] = {}
         
         print("Initializing Last.fm client...")
-        self.lastfm = LastFmClient(lastfm_api_key)
+        self.lastfm = LastFmClient(lastfm_api_key, session=requests_session, budget=self.budget)
         
         print("Initializing Spotify client...")
         if spotify_access_token:
             # Use provided access token
             print(f"Using provided Spotify access token: {spotify_access_token[:10]}...")
-            self.spotify = SpotifyClient(access_token=spotify_access_token)
+            self.spotify = SpotifyClient(access_token=spotify_access_token,
+                                         requests_session=requests_session or True,
+                                         budget=self.budget)
             # Get current user info to verify
             user_info = self.spotify.get_current_user_info()
             print(f"Authenticated as Spotify user: {user_info['name']} (ID: {user_info['id']})")
@@ -37,209 +58,168 @@ class PlaylistConverter:
             self.spotify = SpotifyClient(
                 spotify_client_id, 
                 spotify_client_secret, 
-                spotify_redirect_uri
+                spotify_redirect_uri,
+                requests_session=requests_session or True,
+                budget=self.budget
             )
         
+        # Searches run as coroutines on the shared event loop
+        self.spotify_async = self.spotify.async_client()
+        
         print("✅ Initialization complete!")
     
-    def convert_top_tracks(self, username: str, period: str = 'overall', limit: int = 50) -> Dict[str, Any]:
-        """Convert Last.fm top tracks to Spotify playlist with better error handling"""
-        try:
-            # Get tracks from Last.fm
-            tracks = self.get_lastfm_tracks(username, 'top', period, limit)
-            if not tracks:
-                raise Exception("No tracks found")
-            
-            # Search tracks on Spotify with progress tracking
-            spotify_tracks = []
-            failed_tracks = []
-            
-            for i, track in enumerate(tracks):
-                try:
-                    spotify_track = self.search_spotify_track(track)
-                    if spotify_track:
-                        spotify_tracks.append(spotify_track)
-                    else:
-                        failed_tracks.append(track)
-                except Exception as e:
-                    logger.error(f"Error processing track {track.get('name', 'unknown')}: {str(e)}")
-                    failed_tracks.append(track)
-                    continue
-            
-            if not spotify_tracks:
-                raise Exception("No matching tracks found on Spotify")
-            
-            # Create playlist
-            playlist = self.create_spotify_playlist(
-                f"Last.fm Top Tracks - {period}",
-                spotify_tracks
-            )
-            
-            return {
-                'playlist': playlist,
-                'total_tracks': len(tracks),
-                'matched_tracks': len(spotify_tracks),
-                'failed_tracks': len(failed_tracks),
-                'failed_track_details': failed_tracks
-            }
-            
-        except Exception as e:
-            logger.error(f"Error converting top tracks: {str(e)}")
-            raise
+    def convert_top_tracks(self, username: str, period: str = 'overall', limit: int = 50,
+                           name: str = None, description: str = None, public: bool = True,
+                           checkpoint: Checkpoint = None) -> Dict[str, Any]:
+        """Convert Last.fm top tracks to Spotify playlist"""
+        tracks = self.fetch_tracks(username, 'top', period, limit, checkpoint=checkpoint)
+        if not tracks:
+            raise Exception("No tracks found")
+        
+        return self._create_spotify_playlist(
+            tracks,
+            name or self.default_playlist_name('top', period),
+            description or f"{username}'s Last.fm top tracks ({period})",
+            public,
+            checkpoint=checkpoint
+        )
     
-    def convert_recent_tracks(self, username: str, limit: int = 50) -> Dict[str, Any]:
-        """Convert Last.fm recent tracks to Spotify playlist with better error handling"""
-        try:
-            # Get tracks from Last.fm
-            tracks = self.get_lastfm_tracks(username, 'recent', limit=limit)
-            if not tracks:
-                raise Exception("No tracks found")
-            
-            # Search tracks on Spotify with progress tracking
-            spotify_tracks = []
-            failed_tracks = []
-            
-            for i, track in enumerate(tracks):
-                try:
-                    spotify_track = self.search_spotify_track(track)
-                    if spotify_track:
-                        spotify_tracks.append(spotify_track)
-                    else:
-                        failed_tracks.append(track)
-                except Exception as e:
-                    logger.error(f"Error processing track {track.get('name', 'unknown')}: {str(e)}")
-                    failed_tracks.append(track)
-                    continue
-            
-            if not spotify_tracks:
-                raise Exception("No matching tracks found on Spotify")
-            
-            # Create playlist
-            playlist = self.create_spotify_playlist(
-                f"Last.fm Recent Tracks",
-                spotify_tracks
-            )
-            
-            return {
-                'playlist': playlist,
-                'total_tracks': len(tracks),
-                'matched_tracks': len(spotify_tracks),
-                'failed_tracks': len(failed_tracks),
-                'failed_track_details': failed_tracks
-            }
-            
-        except Exception as e:
-            logger.error(f"Error converting recent tracks: {str(e)}")
-            raise
+    def convert_recent_tracks(self, username: str, limit: int = 50, name: str = None,
+                              description: str = None, public: bool = True,
+                              checkpoint: Checkpoint = None) -> Dict[str, Any]:
+        """Convert Last.fm recent tracks to Spotify playlist"""
+        tracks = self.fetch_tracks(username, 'recent', limit=limit, checkpoint=checkpoint)
+        if not tracks:
+            raise Exception("No tracks found")
+        
+        return self._create_spotify_playlist(
+            tracks,
+            name or self.default_playlist_name('recent'),
+            description or f"{username}'s recent Last.fm scrobbles",
+            public,
+            checkpoint=checkpoint
+        )
     
-    def convert_loved_tracks(self, username: str, limit: int = 50) -> Dict[str, Any]:
-        """Convert Last.fm loved tracks to Spotify playlist with better error handling"""
-        try:
-            # Get tracks from Last.fm
-            tracks = self.get_lastfm_tracks(username, 'loved', limit=limit)
-            if not tracks:
-                raise Exception("No tracks found")
-            
-            # Search tracks on Spotify with progress tracking
-            spotify_tracks = []
-            failed_tracks = []
-            
-            for i, track in enumerate(tracks):
-                try:
-                    spotify_track = self.search_spotify_track(track)
-                    if spotify_track:
-                        spotify_tracks.append(spotify_track)
-                    else:
-                        failed_tracks.append(track)
-                except Exception as e:
-                    logger.error(f"Error processing track {track.get('name', 'unknown')}: {str(e)}")
-                    failed_tracks.append(track)
-                    continue
-            
-            if not spotify_tracks:
-                raise Exception("No matching tracks found on Spotify")
-            
-            # Create playlist
-            playlist = self.create_spotify_playlist(
-                f"Last.fm Loved Tracks",
-                spotify_tracks
-            )
-            
-            return {
-                'playlist': playlist,
-                'total_tracks': len(tracks),
-                'matched_tracks': len(spotify_tracks),
-                'failed_tracks': len(failed_tracks),
-                'failed_track_details': failed_tracks
-            }
-            
-        except Exception as e:
-            logger.error(f"Error converting loved tracks: {str(e)}")
-            raise
+    def convert_loved_tracks(self, username: str, limit: int = 50, name: str = None,
+                             description: str = None, public: bool = True,
+                             checkpoint: Checkpoint = None) -> Dict[str, Any]:
+        """Convert Last.fm loved tracks to Spotify playlist"""
+        tracks = self.fetch_tracks(username, 'loved', limit=limit, checkpoint=checkpoint)
+        if not tracks:
+            raise Exception("No tracks found")
+        
+        return self._create_spotify_playlist(
+            tracks,
+            name or self.default_playlist_name('loved'),
+            description or f"{username}'s loved tracks on Last.fm",
+            public,
+            checkpoint=checkpoint
+        )
+    
+    def resume_conversion(self, checkpoint: Checkpoint) -> Dict[str, Any]:
+        """Continue a conversion started with the CLI from its checkpoint"""
+        params = checkpoint.params
+        if params['import_type'] == 'top':
+            return self.convert_top_tracks(params['username'], params['period'], params['limit'],
+                                           params.get('name'), params.get('description'),
+                                           params.get('public', True), checkpoint=checkpoint)
+        elif params['import_type'] == 'recent':
+            return self.convert_recent_tracks(params['username'], params['limit'],
+                                              params.get('name'), params.get('description'),
+                                              params.get('public', True), checkpoint=checkpoint)
+        elif params['import_type'] == 'loved':
+            return self.convert_loved_tracks(params['username'], params['limit'],
+                                             params.get('name'), params.get('description'),
+                                             params.get('public', True), checkpoint=checkpoint)
+        raise ValueError(f"Unknown import type in checkpoint: {params['import_type']}")
+    
+    @staticmethod
+    def default_playlist_name(data_type: str, period: str = 'overall') -> str:
+        """Playlist name used when none is given"""
+        if data_type == 'top':
+            return f"Last.fm Top Tracks - {period}"
+        return f"Last.fm {data_type.title()} Tracks"
     
-    def _fetch_all_tracks(self, fetch_func, username: str, limit: int, **kwargs) -> List[Dict]:
-        """Fetch all tracks using pagination"""
-        all_tracks = []
-        page = 1
-        tracks_per_page = min(50, limit)  # Last.fm max is 50 per page
+    def fetch_tracks(self, username: str, data_type: str, period: str = 'overall',
+                     limit: int = 50, checkpoint: Checkpoint = None) -> List[Dict]:
+        """Fetch and normalize up to `limit` tracks of one Last.fm data type"""
+        if data_type not in ('top', 'recent', 'loved'):
+            raise ValueError("data_type must be 'top', 'recent', or 'loved'")
+        return self._fetch_all_tracks(username, data_type, limit, checkpoint=checkpoint, period=period)
+    
+    def _fetch_all_tracks(self, username: str, data_type: str, limit: int,
+                          checkpoint: Checkpoint = None, period: str = 'overall') -> List[Dict]:
+        """Fetch all tracks using pagination (pages already in the checkpoint are reused).
         
-        with tqdm(desc="Fetching tracks", unit="tracks") as pbar:
-            while len(all_tracks) < limit:
-                remaining = limit - len(all_tracks)
-                current_limit = min(tracks_per_page, remaining)
-                
-                tracks = fetch_func(username, limit=current_limit, page=page, **kwargs)
-                
-                if not tracks:
-                    break
-                
-                # Normalize track data
+        The first page tells how many pages there are; the rest are fetched
+        concurrently.
+        """
+        if limit <= 0:
+            return []
+        tracks_per_page = min(LASTFM_PAGE_SIZE, limit)
+        pages = math.ceil(limit / tracks_per_page)
+        saved = checkpoint.pages if checkpoint is not None else {}
+        # A short page is the end of the list, and so is the page count seen before a resume
+        pages = min([pages] + [page for page, tracks in saved.items() if len(tracks) < tracks_per_page])
+        if checkpoint is not None and checkpoint.params.get('total_pages') is not None:
+            pages = min(pages, checkpoint.params['total_pages'])
+        fetched: Dict[int, List[Dict]] = {}
+        start = time.perf_counter()
+        
+        with STAGE_SECONDS.time(stage='fetch'), tracer.span('fetch', limit=limit) as stage_span, \
+                tqdm(desc="Fetching tracks", unit="tracks") as pbar:
+            def keep_page(page: int, tracks: List[Dict]):
                 normalized_tracks = [self.lastfm.normalize_track_data(track) for track in tracks]
-                all_tracks.extend(normalized_tracks)
-                
+                if checkpoint is not None:
+                    checkpoint.record_page(page, normalized_tracks)
+                fetched[page] = normalized_tracks
                 pbar.update(len(normalized_tracks))
-                page += 1
+            
+            if 1 not in saved:
+                tracks, total_pages = self.lastfm.get_track_page(data_type, username, 1,
+                                                                 tracks_per_page, period)
+                keep_page(1, tracks)
+                if total_pages is not None:
+                    pages = min(pages, total_pages)
+                    if checkpoint is not None:
+                        checkpoint.update_params(total_pages=total_pages)
+            
+            missing = [page for page in range(2, pages + 1) if page not in saved]
+            if missing:
+                self.lastfm.get_track_pages(data_type, username, missing, tracks_per_page, period,
+                                            on_page=keep_page)
+            
+            all_tracks = []
+            page = 0  # an empty list has no pages at all
+            for page in range(1, pages + 1):
+                if page in fetched:
+                    normalized_tracks = fetched[page]
+                else:
+                    CACHE_REQUESTS.inc(cache='checkpoint_page', result='hit')
+                    normalized_tracks = saved[page]
+                    pbar.update(len(normalized_tracks))
+                    tracer.record('fetch.page', 0, page=page, source='checkpoint',
+                                  tracks=len(normalized_tracks))
+                all_tracks.extend(normalized_tracks)
                 
                 # Break if we got fewer tracks than requested (end of data)
-                if len(tracks) < current_limit:
+                if len(normalized_tracks) < tracks_per_page:
                     break
+            stage_span.set(pages=page, tracks=len(all_tracks))
         
+        self.stats.update(lastfm_pages=len(fetched), fetch_seconds=time.perf_counter() - start)
         return all_tracks[:limit]
     
     def _create_spotify_playlist(self, lastfm_tracks: List[Dict], name: str, 
-                                description: str, public: bool) -> Dict:
+                                description: str, public: bool,
+                                checkpoint: Checkpoint = None) -> Dict:
         """Create Spotify playlist from Last.fm tracks"""
         
-        print(f"\n🔍 Searching Spotify for {len(lastfm_tracks)} tracks...")
-        
         # Verify Spotify user again
         user_info = self.spotify.get_current_user_info()
         print(f"Creating playlist as Spotify user: {user_info['name']} (ID: {user_info['id']})")
         
-        # Search for tracks on Spotify
-        matched_tracks = []
-        unmatched_tracks = []
-        
-        with tqdm(lastfm_tracks, desc="Searching tracks") as pbar:
-            for track in pbar:
-                pbar.set_postfix_str(f"{track['artist']} - {track['track']}")
-                
-                # Search on Spotify
-                spotify_results = self.spotify.search_track(track['artist'], track['track'])
-                
-                if not spotify_results:
-                    # Try fuzzy search
-                    spotify_results = self.spotify.search_track_fuzzy(track['artist'], track['track'])
-                
-                best_match = self.spotify.find_best_match(track, spotify_results)
-                
-                if best_match:
-                    matched_tracks.append({
-                        'lastfm': track,
-                        'spotify': best_match
-                    })
-                else:
-                    unmatched_tracks.append(track)
+        matched_tracks, unmatched_tracks = self.match_tracks(lastfm_tracks, checkpoint=checkpoint)
         
         match_rate = len(matched_tracks) / len(lastfm_tracks) * 100 if lastfm_tracks else 0
         print(f"\n📊 Match Results:")
@@ -249,33 +229,13 @@ class PlaylistConverter:
         if not matched_tracks:
             raise Exception("No tracks could be found on Spotify")
         
-        # Create playlist
-        print(f"\n📝 Creating playlist: {name}")
-        playlist = self.spotify.create_playlist(name, description, public)
-        
-        # Log playlist details
-        print(f"Created playlist:")
-        print(f"   ID: {playlist['id']}")
-        print(f"   Owner: {playlist.get('owner', 'unknown')}")
-        print(f"   URL: {playlist['url']}")
-        
-        # Add tracks to playlist
-        track_uris = [match['spotify']['uri'] for match in matched_tracks]
-        
-        # Limit tracks per playlist
-        if len(track_uris) > MAX_TRACKS_PER_PLAYLIST:
-            print(f"⚠️ Limiting playlist to {MAX_TRACKS_PER_PLAYLIST} tracks")
-            track_uris = track_uris[:MAX_TRACKS_PER_PLAYLIST]
-        
-        print(f"🎵 Adding {len(track_uris)} tracks to playlist...")
-        success = self.spotify.add_tracks_to_playlist(playlist['id'], track_uris)
-        
-        if not success:
-            raise Exception("Failed to add tracks to playlist")
+        playlists, track_uris = self.publish_playlist(matched_tracks, name, description, public,
+                                                      checkpoint=checkpoint)
         
         # Prepare summary
         result = {
-            'playlist': playlist,
+            'playlist': playlists[0],
+            'playlists': playlists,
             'total_lastfm_tracks': len(lastfm_tracks),
             'matched_tracks': len(matched_tracks),
             'added_tracks': len(track_uris),
@@ -285,11 +245,196 @@ class PlaylistConverter:
         }
         
         print(f"\n✅ Playlist created successfully!")
-        print(f"   🔗 URL: {playlist['url']}")
+        for playlist in playlists:
+            print(f"   🔗 URL: {playlist['url']}")
         print(f"   📊 Added {len(track_uris)} out of {len(lastfm_tracks)} tracks")
         
         return result
     
+    def match_tracks(self, lastfm_tracks: List[Dict],
+                     progress_callback: Callable[[int, int, int], None] = None,
+                     checkpoint: Checkpoint = None) -> Tuple[List[Dict], List[Dict]]:
+        """Search Spotify for each Last.fm track.
+        
+        Returns (matched, unmatched); matched entries are {'lastfm': ..., 'spotify': ...}.
+        Repeated tracks (common in recent scrobbles) are only searched once, and
+        tracks already resolved in the checkpoint or the shared match cache
+        aren't searched again; new results are added to the cache. Up to
+        MATCH_WORKERS searches run at once as coroutines on the shared event
+        loop (as many as the shared Spotify concurrency limit allows); results
+        are still taken in track order.
+        progress_callback, if given, is called as (done, total, matched) after each track.
+        """
+        print(f"\n🔍 Searching Spotify for {len(lastfm_tracks)} tracks...")
+        
+        matched_tracks = []
+        unmatched_tracks = []
+        resolved = {}
+        pending = {}
+        fresh = []  # searched (track, match) pairs not yet in the match cache
+        searched_tracks = 0
+        searches_before = self.budget.used['spotify']
+        start = time.perf_counter()
+        
+        searches = asyncio.Semaphore(MATCH_WORKERS)
+        try:
+            with STAGE_SECONDS.time(stage='match'), tracer.span('match', tracks=len(lastfm_tracks)) as stage_span, \
+                    tqdm(lastfm_tracks, desc="Searching tracks") as pbar:
+                # Start a search for every unique track the checkpoint doesn't already know
+                for index, track in enumerate(lastfm_tracks):
+                    key = (track['artist'].lower(), track['track'].lower())
+                    if key in resolved or key in pending:
+                        CACHE_REQUESTS.inc(cache='repeated_track', result='hit')
+                        continue
+                    CACHE_REQUESTS.inc(cache='repeated_track', result='miss')
+                    
+                    known, match = checkpoint.get_match(track) if checkpoint is not None else (False, None)
+                    if checkpoint is not None:
+                        CACHE_REQUESTS.inc(cache='checkpoint_match', result='hit' if known else 'miss')
+                    strategy = 'checkpoint'
+                    if not known:
+                        known, match = self.match_cache.get(track)
+                        strategy = 'cache'
+                    if known:
+                        resolved[key] = match
+                        tracer.record('match.track', 0, index=index, strategy=strategy,
+                                      matched=match is not None)
+                    else:
+                        # Each search runs in a copy of this context so its spans join the trace
+                        pending[key] = event_loop.submit(self._search_track(index, track, searches))
+                
+                for done, track in enumerate(pbar, 1):
+                    pbar.set_postfix_str(f"{track['artist']} - {track['track']}")
+                    
+                    key = (track['artist'].lower(), track['track'].lower())
+                    if key not in resolved:
+                        match, searched = pending.pop(key).result()
+                        searched_tracks += 1
+                        if checkpoint is not None:
+                            checkpoint.record_match(track, match)
+                        if searched:
+                            fresh.append((track, match))
+                            if len(fresh) >= MATCH_CACHE_BATCH:
+                                self.match_cache.put_many(fresh)
+                                fresh = []
+                        resolved[key] = match
+                    best_match = resolved[key]
+                    
+                    if best_match:
+                        matched_tracks.append({
+                            'lastfm': track,
+                            'spotify': best_match
+                        })
+                    else:
+                        unmatched_tracks.append(track)
+                    
+                    if progress_callback:
+                        progress_callback(done, len(lastfm_tracks), len(matched_tracks))
+                stage_span.set(matched=len(matched_tracks), searched=len(resolved))
+        finally:
+            # On an error (budget, rate limit, interrupt) stop the searches still running
+            for future in pending.values():
+                future.cancel()
+            self.match_cache.put_many(fresh)
+        
+        self.stats.update(
+            tracks=len(lastfm_tracks), unique_tracks=len(resolved), searched_tracks=searched_tracks,
+            matched_tracks=len(matched_tracks), searches=self.budget.used['spotify'] - searches_before,
+            match_seconds=time.perf_counter() - start
+        )
+        return matched_tracks, unmatched_tracks
+    
+    async def _search_track(self, index: int, track: Dict,
+                            searches: asyncio.Semaphore) -> Tuple[Optional[Dict], bool]:
+        """Find one track's match (run on the event loop, at most MATCH_WORKERS at once).
+        
+        Returns (match, searched); searched is False if the search failed, so
+        the missing match isn't worth caching.
+        """
+        async with searches:
+            with tracer.span('match.track', index=index) as span:
+                try:
+                    match = await self.spotify_async.find_match(track)
+                except (BudgetExceeded, RateLimited):
+                    raise
+                except Exception as e:
+                    span.record_error(e)
+                    logger.error(f"Error processing track {track['artist']} - {track['track']}: {str(e)}")
+                    return None, False
+                span.set(matched=match is not None)
+                return match, True
+    
+    def publish_playlist(self, matched_tracks: List[Dict], name: str, description: str,
+                         public: bool, checkpoint: Checkpoint = None) -> Tuple[List[Dict], List[str]]:
+        """Create playlists in the authenticated account and add matched tracks.
+        
+        Up to MAX_TRACKS_PER_PLAYLIST tracks go in one playlist. More are split
+        into numbered playlists ("Name (2/6)"), which are created concurrently
+        and filled in parallel, each in track order. With a checkpoint,
+        playlists created before an interruption are reused and chunks Spotify
+        already acknowledged aren't added twice.
+        Returns (playlists, added track URIs).
+        """
+        track_uris = [match['spotify']['uri'] for match in matched_tracks]
+        shards = [track_uris[i:i + MAX_TRACKS_PER_PLAYLIST]
+                  for i in range(0, len(track_uris), MAX_TRACKS_PER_PLAYLIST)]
+        # Chunk indexes run on across shards, so each shard starts at a fixed offset
+        chunks_per_shard = math.ceil(MAX_TRACKS_PER_PLAYLIST / PLAYLIST_CHUNK_SIZE)
+        skip_chunks = set(checkpoint.added_chunks) if checkpoint is not None else set()
+        created = dict(checkpoint.playlists) if checkpoint is not None else {}
+        if len(shards) > 1:
+            print(f"\n📚 Splitting {len(track_uris)} tracks into {len(shards)} playlists "
+                  f"of up to {MAX_TRACKS_PER_PLAYLIST}")
+        
+        async def publish_shard(index: int, uris: List[str]) -> Dict:
+            playlist = created.get(index)
+            if playlist is not None:
+                print(f"\n📝 Resuming playlist: {playlist['name']}")
+            else:
+                shard_name, shard_description = name, description
+                if len(shards) > 1:
+                    shard_name = f"{name} ({index + 1}/{len(shards)})"
+                    shard_description = f"{description} (part {index + 1} of {len(shards)})"
+                print(f"\n📝 Creating playlist: {shard_name}")
+                with tracer.span('create_playlist', shard=index):
+                    playlist = await self.spotify_async.create_playlist(shard_name, shard_description, public)
+                if checkpoint is not None:
+                    checkpoint.record_playlist(playlist, shard=index)
+                print(f"Created playlist:")
+                print(f"   ID: {playlist['id']}")
+                print(f"   Owner: {playlist.get('owner', 'unknown')}")
+                print(f"   URL: {playlist['url']}")
+            
+            first_chunk = index * chunks_per_shard
+            await self.spotify_async.add_tracks_to_playlist(
+                playlist['id'], uris,
+                skip_chunks={chunk - first_chunk for chunk in skip_chunks
+                             if first_chunk <= chunk < first_chunk + chunks_per_shard},
+                on_chunk_added=(lambda chunk: checkpoint.record_chunk(first_chunk + chunk))
+                if checkpoint is not None else None
+            )
+            return playlist
+        
+        async def publish_all() -> List[Dict]:
+            await self.spotify_async.current_user()  # once, before the shards ask for it
+            # Shards run to the end even if one fails, so no chunk is added after
+            # the checkpoint is released (and every acknowledged one is recorded)
+            results = await asyncio.gather(*(publish_shard(index, uris) for index, uris in enumerate(shards)),
+                                           return_exceptions=True)
+            for result in results:
+                if isinstance(result, BaseException):
+                    raise result
+            return results
+        
+        print(f"🎵 Adding {len(track_uris)} tracks to {len(shards)} playlist(s)...")
+        start = time.perf_counter()
+        with STAGE_SECONDS.time(stage='add'), tracer.span('add', tracks=len(track_uris), playlists=len(shards)):
+            playlists = event_loop.run(publish_all())
+        self.stats.update(chunks=math.ceil(len(track_uris) / PLAYLIST_CHUNK_SIZE) - len(skip_chunks),
+                          playlists=len(shards), add_seconds=time.perf_counter() - start)
+        
+        return playlists, track_uris
+    
     def get_user_info(self, lastfm_username: str) -> Dict:
         """Get Last.fm user information"""
         return self.lastfm.get_user_info(lastfm_username)
@@ -312,104 +457,3 @@ class PlaylistConverter:
             raise ValueError("data_type must be 'top', 'recent', or 'loved'")
         
         return [self.lastfm.normalize_track_data(track) for track in tracks]
-
-    def get_lastfm_tracks(self, username: str, import_type: str, period: str, limit: int) -> List[Dict]:
-        """Get tracks from Last.fm with rate limiting and error handling"""
-        try:
-            params = {
-                'method': f'user.get{import_type.title()}',
-                'user': username,
-                'api_key': self.lastfm_api_key,
-                'format': 'json',
-                'limit': limit
-            }
-            
-            if import_type != 'loved':
-                params['period'] = period
-                
-            response = requests.get(self.lastfm_base_url, params=params)
-            response.raise_for_status()
-            
-            data = response.json()
-            tracks = []
-            
-            if import_type == 'loved':
-                tracks = data['lovedtracks']['track']
-            else:
-                tracks = data['toptracks']['track']
-                
-            # Truncate track names to 200 characters
-            for track in tracks:
-                track['name'] = track['name'][:200]
-                track['artist']['name'] = track['artist']['name'][:200]
-                
-            return tracks
-            
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Error fetching Last.fm tracks: {str(e)}")
-            raise Exception(f"Failed to fetch tracks from Last.fm: {str(e)}")
-            
-    def search_spotify_track(self, track: Dict[str, str]) -> Optional[Dict[str, Any]]:
-        """Search for a track on Spotify with better error handling and retries"""
-        try:
-            # Truncate track name to 200 characters to avoid API limits
-            track_name = track['name'][:200]
-            artist_name = track['artist']
-            
-            # Try exact match first
-            query = f"track:{track_name} artist:{artist_name}"
-            results = self.spotify.search(query, limit=1, type='track')
-            
-            if results['tracks']['items']:
-                return results['tracks']['items'][0]
-            
-            # If no exact match, try with just the track name
-            results = self.spotify.search(track_name, limit=1, type='track')
-            if results['tracks']['items']:
-                return results['tracks']['items'][0]
-            
-            logger.warning(f"No match found for track: {track_name} by {artist_name}")
-            return None
-            
-        except Exception as e:
-            logger.error(f"Error searching for track {track.get('name', 'unknown')}: {str(e)}")
-            return None
-
-    def create_spotify_playlist(self, token: str, name: str, tracks: List[Dict]) -> Dict:
-        """Create a Spotify playlist with error handling"""
-        try:
-            headers = {
-                'Authorization': f"Bearer {token}",
-                'Content-Type': 'application/json'
-            }
-            
-            # Get user profile
-            response = requests.get(f"{self.spotify_base_url}/me", headers=headers)
-            response.raise_for_status()
-            user_id = response.json()['id']
-            
-            # Create playlist
-            response = requests.post(
-                f"{self.spotify_base_url}/users/{user_id}/playlists",
-                headers=headers,
-                json={'name': name, 'public': False}
-            )
-            response.raise_for_status()
-            playlist = response.json()
-            
-            # Add tracks in chunks of 100 (Spotify's limit)
-            track_uris = [track['uri'] for track in tracks]
-            for i in range(0, len(track_uris), 100):
-                chunk = track_uris[i:i + 100]
-                response = requests.post(
-                    f"{self.spotify_base_url}/playlists/{playlist['id']}/tracks",
-                    headers=headers,
-                    json={'uris': chunk}
-                )
-                response.raise_for_status()
-                
-            return playlist
-            
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Error creating Spotify playlist: {str(e)}")
-            raise Exception(f"Failed to create Spotify playlist: {str(e)}") 
\ No newline at end of file
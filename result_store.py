@@ -0,0 +1,90 @@
+import gzip
+import json
+import os
+import shutil
+import tempfile
+from typing import Any, List, Tuple
+
+from config import RESULT_STORE_DIR, RESULT_CHUNK_SIZE
+
+
+class ResultStore:
+    """Stores large job result payloads outside the job record.
+
+    Each list is split into fixed-size chunks written as gzip-compressed JSON:
+
+        <base_dir>/<job_id>/<name>/meta.json
+        <base_dir>/<job_id>/<name>/00000.json.gz
+        ...
+
+    so reading one page only decompresses the chunks that overlap it.
+    """
+
+    def __init__(self, base_dir: str = RESULT_STORE_DIR, chunk_size: int = RESULT_CHUNK_SIZE):
+        self.base_dir = base_dir
+        self.chunk_size = chunk_size
+
+    def _job_dir(self, job_id: str) -> str:
+        if not job_id or '/' in job_id or '\\' in job_id or job_id.startswith('.'):
+            raise ValueError(f"Invalid job id: {job_id!r}")
+        return os.path.join(self.base_dir, job_id)
+
+    def _list_dir(self, job_id: str, name: str) -> str:
+        if not name.replace('_', '').isalnum():
+            raise ValueError(f"Invalid result name: {name!r}")
+        return os.path.join(self._job_dir(job_id), name)
+
+    def put_list(self, job_id: str, name: str, items: List[Any]) -> int:
+        """Store a list, replacing any previous version. Returns the item count."""
+        target = self._list_dir(job_id, name)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+
+        # Write into a temporary directory and swap it in, so readers never
+        # see a half-written list
+        staging = tempfile.mkdtemp(prefix=f".{name}-", dir=os.path.dirname(target))
+        try:
+            for index, start in enumerate(range(0, len(items), self.chunk_size)):
+                chunk = items[start:start + self.chunk_size]
+                with gzip.open(os.path.join(staging, f"{index:05d}.json.gz"), 'wt', encoding='utf-8') as f:
+                    json.dump(chunk, f, separators=(',', ':'))
+
+            with open(os.path.join(staging, 'meta.json'), 'w') as f:
+                json.dump({'total': len(items), 'chunk_size': self.chunk_size}, f)
+
+            if os.path.exists(target):
+                shutil.rmtree(target)
+            os.rename(staging, target)
+        except Exception:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+
+        return len(items)
+
+    def get_page(self, job_id: str, name: str, offset: int = 0, limit: int = 100) -> Tuple[List[Any], int]:
+        """Read items [offset, offset + limit) of a stored list. Returns (items, total)."""
+        directory = self._list_dir(job_id, name)
+        meta_file = os.path.join(directory, 'meta.json')
+        if not os.path.exists(meta_file):
+            return [], 0
+
+        with open(meta_file, 'r') as f:
+            meta = json.load(f)
+
+        total = meta['total']
+        chunk_size = meta['chunk_size']
+        end = min(offset + limit, total)
+        if offset >= end:
+            return [], total
+
+        items = []
+        for index in range(offset // chunk_size, (end - 1) // chunk_size + 1):
+            with gzip.open(os.path.join(directory, f"{index:05d}.json.gz"), 'rt', encoding='utf-8') as f:
+                chunk = json.load(f)
+            chunk_start = index * chunk_size
+            items.extend(chunk[max(offset - chunk_start, 0):end - chunk_start])
+
+        return items, total
+
+    def delete(self, job_id: str) -> None:
+        """Remove everything stored for a job"""
+        shutil.rmtree(self._job_dir(job_id), ignore_errors=True)
@@ -0,0 +1,77 @@
+import threading
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+
+class _Call:
+    """One in-flight piece of work and everyone waiting on it"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.listeners: List[Callable] = []
+        self.last_report: Optional[tuple] = None
+
+
+class SingleFlight:
+    """Collapses concurrent calls for the same key into one execution.
+
+    The first caller for a key runs the work; callers arriving while it is
+    still running wait for it and receive the same result (or exception).
+    Progress reported by the work is broadcast to every attached caller's
+    listener, and late joiners immediately get the latest report.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+
+    def do(self, key: Hashable, fn: Callable[[Callable], Any],
+           listener: Callable = None) -> Tuple[Any, bool]:
+        """Run fn(report) once per key at a time.
+
+        Returns (result, shared) where shared is True if this caller attached
+        to work started by someone else.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            shared = call is not None
+            if not shared:
+                call = self._calls[key] = _Call()
+            if listener is not None:
+                call.listeners.append(listener)
+                catch_up = call.last_report
+            else:
+                catch_up = None
+
+        if shared:
+            if catch_up is not None:
+                listener(*catch_up)
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        def report(*args):
+            with self._lock:
+                call.last_report = args
+                listeners = list(call.listeners)
+            for notify in listeners:
+                notify(*args)
+
+        try:
+            call.result = fn(report)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+        return call.result, False
+
+    def in_flight(self) -> int:
+        """Number of keys currently being worked on"""
+        with self._lock:
+            return len(self._calls)
@@ -1,47 +1,126 @@
 import spotipy
 from spotipy.oauth2 import SpotifyOAuth
-from typing import List, Dict, Optional, Tuple
+from spotipy.exceptions import SpotifyException
+import asyncio
+import functools
+import httpx
+import requests
+from urllib3.util.retry import Retry
+from typing import Any, List, Dict, Optional, Tuple, Iterable, Callable
+from urllib.parse import urlparse
 import time
 import re
 from config import (
     SPOTIFY_CLIENT_ID, SPOTIFY_CLIENT_SECRET, SPOTIFY_REDIRECT_URI,
-    MAX_TRACKS_PER_PLAYLIST, RATE_LIMIT_DELAY
+    MAX_TRACKS_PER_PLAYLIST, SPOTIFY_API_PREFIX, SPOTIFY_MAX_RETRIES, SPOTIFY_MAX_CONCURRENCY,
+    REQUEST_TIMEOUT_SECONDS
 )
+from metrics import SPOTIFY_REQUESTS, SPOTIFY_REQUEST_SECONDS, RATE_LIMITED, RETRY_WAIT_SECONDS
+from tracing import tracer
+from cost_estimator import RequestBudget, BudgetExceeded
+from audio_features import audio_features_store
+from concurrency import spotify_limiter, retry_after_seconds, RateLimited, Retryable, overload_errors
+from event_loop import loop_local
+from json_codec import loads
 
+# Most track ids one several-tracks request takes
+TRACKS_PER_REQUEST = 50
+# ...and one audio features request
+AUDIO_FEATURES_PER_REQUEST = 100
 
-class SpotifyClient:
-    """Client for interacting with Spotify API"""
+# Path segments that are followed by an id; ids are folded out of metric labels
+_ID_COLLECTIONS = {'albums', 'artists', 'audio-features', 'playlists', 'tracks', 'users'}
+
+
+# Permissions the CLI's OAuth flow asks for
+OAUTH_SCOPE = "user-read-private playlist-modify-public playlist-modify-private"
+
+
+class _MeteredRetry(Retry):
+    """spotipy's retry policy, counting 429s and the time spent backing off.
     
-    def __init__(self, client_id: str = None, client_secret: str = None, 
-                 redirect_uri: str = None, access_token: str = None):
-        self.client_id = client_id or SPOTIFY_CLIENT_ID
-        self.client_secret = client_secret or SPOTIFY_CLIENT_SECRET
-        self.redirect_uri = redirect_uri or SPOTIFY_REDIRECT_URI
-        
-        if access_token:
-            # Use provided access token directly (don't use auth_manager)
-            print(f"Initializing Spotify client with provided token: {access_token[:15]}...")
-            self.sp = spotipy.Spotify(auth=access_token)
-            self.auth_method = "token"
-        else:
-            # Set up auth manager for OAuth flow
-            self.auth_manager = SpotifyOAuth(
-                client_id=self.client_id,
-                client_secret=self.client_secret,
-                redirect_uri=self.redirect_uri,
-                scope="user-read-private playlist-modify-public playlist-modify-private"
-            )
-            
-            # Create authenticated Spotify client
-            self.sp = spotipy.Spotify(auth_manager=self.auth_manager)
-            self.auth_method = "oauth"
-        
-        # Test the connection to make sure it's working
-        try:
-            self.current_user_info = self.sp.current_user()
-            print(f"✅ Successfully connected to Spotify API as: {self.current_user_info['display_name']} ({self.current_user_info['id']})")
-        except Exception as e:
-            raise Exception(f"Failed to connect to Spotify API: {e}")
+    Every 429 also cuts the shared Spotify concurrency limit right away,
+    before the retry waits.
+    """
+    
+    def increment(self, method=None, url=None, response=None, error=None, _pool=None, _stacktrace=None):
+        if response is not None and response.status == 429:
+            RATE_LIMITED.inc(api='spotify')
+            spotify_limiter.on_overload(retry_after_seconds(response.headers))
+        return super().increment(method, url, response, error, _pool, _stacktrace)
+    
+    def sleep(self, response=None):
+        start = time.monotonic()
+        super().sleep(response)
+        RETRY_WAIT_SECONDS.inc(time.monotonic() - start, api='spotify')
+
+
+def _endpoint_label(url: str) -> str:
+    """e.g. .../v1/playlists/37i9dQ/tracks -> playlists/{id}/tracks"""
+    path = urlparse(url).path
+    prefix = urlparse(SPOTIFY_API_PREFIX).path
+    if path.startswith(prefix):
+        path = path[len(prefix):]
+    parts = path.strip('/').split('/')
+    for i in range(1, len(parts), 2):
+        if parts[i - 1] in _ID_COLLECTIONS:
+            parts[i] = '{id}'
+    return '/'.join(parts)
+
+
+def _record_response(response, *args, **kwargs):
+    endpoint = _endpoint_label(response.url)
+    elapsed = response.elapsed.total_seconds()
+    SPOTIFY_REQUESTS.inc(endpoint=endpoint, status=str(response.status_code))
+    SPOTIFY_REQUEST_SECONDS.observe(elapsed, endpoint=endpoint)
+    tracer.record('spotify.request', elapsed, method=response.request.method,
+                  endpoint=endpoint, status=response.status_code)
+
+
+def metered_session() -> requests.Session:
+    """A requests session with spotipy's retry policy that records API metrics"""
+    session = requests.Session()
+    retry = _MeteredRetry(
+        total=SPOTIFY_MAX_RETRIES,
+        connect=None,
+        read=False,
+        allowed_methods=frozenset(['GET', 'POST', 'PUT', 'DELETE']),
+        status=SPOTIFY_MAX_RETRIES,
+        backoff_factor=0.3,
+        status_forcelist=spotipy.Spotify.default_retry_codes
+    )
+    # One pooled connection per concurrent request
+    adapter = requests.adapters.HTTPAdapter(max_retries=retry, pool_maxsize=SPOTIFY_MAX_CONCURRENCY)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.hooks['response'].append(_record_response)
+    return session
+
+
+def _connection_pool() -> httpx.AsyncClient:
+    """Pooled keep-alive Spotify connections for AsyncSpotifyClient"""
+    return httpx.AsyncClient(
+        timeout=REQUEST_TIMEOUT_SECONDS,
+        # The concurrency limit already caps requests in flight
+        limits=httpx.Limits(max_connections=SPOTIFY_MAX_CONCURRENCY,
+                            max_keepalive_connections=SPOTIFY_MAX_CONCURRENCY,
+                            keepalive_expiry=30)
+    )
+
+
+# Retried like spotipy does: transient server errors, plus 429s (handled separately).
+# A 5xx may come back after Spotify already applied the request, so it's only
+# retried for idempotent methods: retrying a POST could add a chunk of tracks twice
+_RETRY_STATUSES = frozenset(spotipy.Spotify.default_retry_codes) - {429}
+_IDEMPOTENT_METHODS = frozenset(['GET', 'PUT', 'DELETE'])
+# Transport errors that mean the API is overloaded; only safe to retry for
+# idempotent methods, except connection failures (the request never reached Spotify)
+_OVERLOAD_ERRORS = overload_errors() + (httpx.TimeoutException, httpx.NetworkError, httpx.RemoteProtocolError)
+_UNSENT_ERRORS = (requests.exceptions.ConnectionError, httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+
+class _SpotifyMatching:
+    """Search queries, match selection and result shapes shared by the sync and async clients"""
     
     def _truncate_search_query(self, artist: str, track: str) -> Tuple[str, str]:
         """Truncate search query to fit within Spotify's 250 character limit"""
@@ -56,29 +135,13 @@ class SpotifyClient:
             return artist, truncated_track
         
         return artist, track
-
-    def search_track(self, artist: str, track: str, limit: int = 10) -> List[Dict]:
-        """Search for a track on Spotify"""
-        try:
-            # Truncate the search query if needed
-            artist, track = self._truncate_search_query(artist, track)
-            
-            # Construct the search query
-            query = f"artist:{artist} track:{track}"
-            
-            # Search for the track
-            results = self.sp.search(query, limit=limit, type='track')
-            
-            if not results['tracks']['items']:
-                return []
-            
-            return results['tracks']['items']
-        except Exception as e:
-            print(f"Error searching for track: {e}")
-            return []
     
-    def search_track_fuzzy(self, artist: str, track: str) -> List[Dict]:
-        """Perform a less strict search for tracks on Spotify"""
+    def _strict_query(self, artist: str, track: str) -> str:
+        # Truncate the search query if needed
+        artist, track = self._truncate_search_query(artist, track)
+        return f"artist:{artist} track:{track}"
+    
+    def _fuzzy_query(self, artist: str, track: str) -> str:
         # Remove special characters and some common modifiers
         artist = re.sub(r'[^\w\s]', '', artist)
         track = re.sub(r'[^\w\s]', '', track)
@@ -86,10 +149,7 @@ class SpotifyClient:
         # Remove common additions like "(feat. XYZ)" or "[remix]"
         track = re.sub(r'\([^\)]*\)|\[[^\]]*\]', '', track)
         
-        query = f"{artist} {track}"
-        results = self.sp.search(q=query, type='track', limit=10)
-        
-        return results.get('tracks', {}).get('items', [])
+        return f"{artist} {track}"
     
     def find_best_match(self, lastfm_track: Dict, spotify_results: List[Dict]) -> Optional[Dict]:
         """Find the best matching track from Spotify search results"""
@@ -106,15 +166,7 @@ class SpotifyClient:
             
             # Exact match
             if spotify_artist == lastfm_artist and spotify_track == lastfm_track_name:
-                return {
-                    'id': result['id'],
-                    'uri': result['uri'],
-                    'name': result['name'],
-                    'artist': result['artists'][0]['name'],
-                    'album': result['album']['name'],
-                    'popularity': result['popularity'],
-                    'url': result['external_urls']['spotify']
-                }
+                return self.track_summary(result)
         
         # If no exact match, try fuzzy matching
         for result in spotify_results:
@@ -124,18 +176,23 @@ class SpotifyClient:
             # Check if artist name is similar and track name is similar
             if self._similar_strings(spotify_artist, lastfm_artist) and \
                self._similar_strings(spotify_track, lastfm_track_name):
-                return {
-                    'id': result['id'],
-                    'uri': result['uri'],
-                    'name': result['name'],
-                    'artist': result['artists'][0]['name'],
-                    'album': result['album']['name'],
-                    'popularity': result['popularity'],
-                    'url': result['external_urls']['spotify']
-                }
+                return self.track_summary(result)
         
         # If still no match, just take the first result
-        result = spotify_results[0]
+        return self.track_summary(spotify_results[0])
+    
+    def _similar_strings(self, str1: str, str2: str) -> bool:
+        """Simple check for string similarity"""
+        # Clean strings for comparison
+        s1 = re.sub(r'[^\w\s]', '', str1.lower()).strip()
+        s2 = re.sub(r'[^\w\s]', '', str2.lower()).strip()
+        
+        # Check if one is contained in the other
+        return s1 in s2 or s2 in s1
+    
+    @staticmethod
+    def track_summary(result: Dict) -> Dict:
+        """The match kept for a Spotify track object"""
         return {
             'id': result['id'],
             'uri': result['uri'],
@@ -146,14 +203,127 @@ class SpotifyClient:
             'url': result['external_urls']['spotify']
         }
     
-    def _similar_strings(self, str1: str, str2: str) -> bool:
-        """Simple check for string similarity"""
-        # Clean strings for comparison
-        s1 = re.sub(r'[^\w\s]', '', str1.lower()).strip()
-        s2 = re.sub(r'[^\w\s]', '', str2.lower()).strip()
+    @staticmethod
+    def _playlist_summary(playlist: Dict) -> Dict:
+        return {
+            'id': playlist['id'],
+            'url': playlist['external_urls']['spotify'],
+            'name': playlist['name'],
+            'public': playlist['public'],
+            'tracks_url': playlist['tracks']['href'],
+            'owner': playlist['owner']['id'],
+            'owner_name': playlist['owner']['display_name']
+        }
+    
+    @staticmethod
+    def _user_summary(user: Dict) -> Dict:
+        return {
+            'id': user['id'],
+            'name': user['display_name'],
+            'email': user.get('email', 'N/A'),
+            'image': user['images'][0]['url'] if user.get('images') and len(user['images']) > 0 else None,
+            'url': user['external_urls']['spotify']
+        }
+
+
+class SpotifyClient(_SpotifyMatching):
+    """Client for interacting with Spotify API"""
+    
+    def __init__(self, client_id: str = None, client_secret: str = None, 
+                 redirect_uri: str = None, access_token: str = None,
+                 requests_session=True, budget: RequestBudget = None):
+        """requests_session is handed to spotipy (a requests.Session, or True for a metered one).
+        Every API call is charged to budget, if given."""
+        self.budget = budget
+        self.access_token = access_token
+        # An injected session also carries the async client's calls (see async_client())
+        self._session = requests_session if isinstance(requests_session, requests.Session) else None
+        self.auth_manager = None
+        self.client_id = client_id or SPOTIFY_CLIENT_ID
+        self.client_secret = client_secret or SPOTIFY_CLIENT_SECRET
+        self.redirect_uri = redirect_uri or SPOTIFY_REDIRECT_URI
         
-        # Check if one is contained in the other
-        return s1 in s2 or s2 in s1
+        if requests_session is True:
+            requests_session = metered_session()
+        elif isinstance(requests_session, requests.Session) and \
+                _record_response not in requests_session.hooks['response']:
+            requests_session.hooks['response'].append(_record_response)
+        
+        if access_token:
+            # Use provided access token directly (don't use auth_manager)
+            print(f"Initializing Spotify client with provided token: {access_token[:15]}...")
+            self.sp = spotipy.Spotify(auth=access_token, requests_session=requests_session,
+                                      requests_timeout=REQUEST_TIMEOUT_SECONDS)
+            self.auth_method = "token"
+        else:
+            # Set up auth manager for OAuth flow
+            self.auth_manager = SpotifyOAuth(
+                client_id=self.client_id,
+                client_secret=self.client_secret,
+                redirect_uri=self.redirect_uri,
+                scope=OAUTH_SCOPE
+            )
+            
+            # Create authenticated Spotify client
+            self.sp = spotipy.Spotify(auth_manager=self.auth_manager, requests_session=requests_session,
+                                      requests_timeout=REQUEST_TIMEOUT_SECONDS)
+            self.auth_method = "oauth"
+        
+        self.sp.prefix = SPOTIFY_API_PREFIX
+        
+        # Test the connection to make sure it's working
+        try:
+            self.current_user_info = self._call(self.sp.current_user)
+            print(f"✅ Successfully connected to Spotify API as: {self.current_user_info['display_name']} ({self.current_user_info['id']})")
+        except Exception as e:
+            raise Exception(f"Failed to connect to Spotify API: {e}")
+    
+    def async_client(self) -> 'AsyncSpotifyClient':
+        """An AsyncSpotifyClient for the same account, charged to the same budget"""
+        return AsyncSpotifyClient(access_token=self.access_token, auth_manager=self.auth_manager,
+                                  session=self._session, budget=self.budget)
+    
+    def _call(self, function: Callable, *args, **kwargs):
+        """Make one API call, charged to the job's budget and in a slot of the
+        shared Spotify concurrency limit. 429s that outlast the retries raise
+        RateLimited."""
+        if self.budget is not None:
+            self.budget.spend('spotify')
+        try:
+            with spotify_limiter.slot() as feedback:
+                try:
+                    return function(*args, **kwargs)
+                except SpotifyException as e:
+                    if e.http_status == 429 or (e.http_status or 0) >= 500:
+                        feedback.throttled(retry_after_seconds(e.headers))
+                    raise
+        except SpotifyException as e:
+            if e.http_status == 429:
+                raise RateLimited(f"Spotify rate limit exceeded: {e.msg}") from e
+            raise
+    
+    def search_track(self, artist: str, track: str, limit: int = 10) -> List[Dict]:
+        """Search for a track on Spotify"""
+        try:
+            # Search for the track
+            results = self._call(self.sp.search, self._strict_query(artist, track), limit=limit, type='track')
+            
+            if not results['tracks']['items']:
+                return []
+            
+            return results['tracks']['items']
+        except (BudgetExceeded, RateLimited):
+            # Not a miss: the job stops (and can resume) instead of recording one
+            raise
+        except Exception as e:
+            print(f"Error searching for track: {e}")
+            return []
+    
+    def search_track_fuzzy(self, artist: str, track: str) -> List[Dict]:
+        """Perform a less strict search for tracks on Spotify"""
+        results = self._call(self.sp.search, q=self._fuzzy_query(artist, track), type='track', limit=10)
+        
+        return results.get('tracks', {}).get('items', [])
     
     def create_playlist(self, name: str, description: str = "", public: bool = True) -> Dict:
         """Create a new Spotify playlist"""
@@ -165,18 +335,20 @@ class SpotifyClient:
             # Force using the token approach to create playlist in the user's account
             if self.auth_method == "token":
                 # Re-check who we're authenticated as
-                current_user = self.sp.current_user()
+                current_user = self._call(self.sp.current_user)
                 print(f"Verified current user: {current_user['id']} ({current_user['display_name']})")
                 
                 # Use specific endpoint for this user
-                playlist = self.sp.user_playlist_create(
+                playlist = self._call(
+                    self.sp.user_playlist_create,
                     user=current_user['id'],
                     name=name,
                     public=public,
                     description=description
                 )
             else:
-                playlist = self.sp.user_playlist_create(
+                playlist = self._call(
+                    self.sp.user_playlist_create,
                     user=user_id,
                     name=name,
                     public=public,
@@ -186,38 +358,46 @@ class SpotifyClient:
             print(f"Playlist created successfully with ID: {playlist['id']}")
             print(f"Playlist owner: {playlist['owner']['id']} ({playlist['owner']['display_name']})")
             
-            return {
-                'id': playlist['id'],
-                'url': playlist['external_urls']['spotify'],
-                'name': playlist['name'],
-                'public': playlist['public'],
-                'tracks_url': playlist['tracks']['href'],
-                'owner': playlist['owner']['id'],
-                'owner_name': playlist['owner']['display_name']
-            }
+            return self._playlist_summary(playlist)
+        except (BudgetExceeded, RateLimited):
+            # The job stops (and can resume) on these, so keep their type
+            raise
         except Exception as e:
             print(f"Error creating playlist: {str(e)}")
             raise Exception(f"Failed to create playlist: {e}")
     
-    def add_tracks_to_playlist(self, playlist_id: str, track_uris: List[str]) -> bool:
-        """Add tracks to a Spotify playlist"""
+    def add_tracks_to_playlist(self, playlist_id: str, track_uris: List[str],
+                               skip_chunks: Iterable[int] = (),
+                               on_chunk_added: Callable[[int], None] = None) -> bool:
+        """Add tracks to a Spotify playlist.
+        
+        Chunk indexes in skip_chunks (already added before an interruption) are
+        not sent again; on_chunk_added is called with each chunk's index once
+        Spotify has accepted it.
+        """
         try:
             # Get playlist info to double-check ownership
-            playlist_info = self.sp.playlist(playlist_id)
+            playlist_info = self._call(self.sp.playlist, playlist_id)
             print(f"Adding tracks to playlist owned by: {playlist_info['owner']['id']} ({playlist_info['owner']['display_name']})")
             
+            skip_chunks = set(skip_chunks)
+            
             # Spotify API can only handle 100 tracks at a time
             chunk_size = 100
             for i in range(0, len(track_uris), chunk_size):
+                if i // chunk_size in skip_chunks:
+                    continue
+                
                 chunk = track_uris[i:i + chunk_size]
-                self.sp.playlist_add_items(playlist_id, chunk)
+                self._call(self.sp.playlist_add_items, playlist_id, chunk)
                 print(f"Added {len(chunk)} tracks (chunk {i//chunk_size + 1})")
-                
-                # Be nice to the API
-                if i + chunk_size < len(track_uris):
-                    time.sleep(1)
+                if on_chunk_added:
+                    on_chunk_added(i // chunk_size)
             
             return True
+        except (BudgetExceeded, RateLimited):
+            # The job stops (and can resume) on these, so keep their type
+            raise
         except Exception as e:
             print(f"Error adding tracks: {str(e)}")
             raise Exception(f"Failed to add tracks to playlist: {e}")
@@ -225,21 +405,250 @@ class SpotifyClient:
     def get_audio_features(self, track_id: str) -> Dict:
         """Get audio features for a track"""
         try:
-            return self.sp.audio_features(track_id)[0]
+            return self.get_audio_features_many([track_id])[track_id] or {}
+        except (BudgetExceeded, RateLimited):
+            raise
         except Exception as e:
             print(f"Failed to get audio features: {e}")
             return {}
     
+    def get_audio_features_many(self, track_ids: Iterable[str]) -> Dict[str, Optional[Dict]]:
+        """Audio features by track id (None where Spotify has none): from the
+        local table when known, the rest fetched 100 ids per request"""
+        return audio_features_store.get_many(track_ids, self.async_client())
+    
     def get_current_user_info(self) -> Dict:
         """Get information about the current authenticated user"""
         try:
-            user = self.sp.current_user()
-            return {
-                'id': user['id'],
-                'name': user['display_name'],
-                'email': user.get('email', 'N/A'),
-                'image': user['images'][0]['url'] if user.get('images') and len(user['images']) > 0 else None,
-                'url': user['external_urls']['spotify']
-            }
+            return self._user_summary(self._call(self.sp.current_user))
         except Exception as e:
-            raise Exception(f"Failed to get current user info: {e}") 
\ No newline at end of file
+            raise Exception(f"Failed to get current user info: {e}") 
+
+
+class AsyncSpotifyClient(_SpotifyMatching):
+    """asyncio client for the Spotify Web API, with SpotifyClient's return shapes.
+    
+    Requests go through one pooled keep-alive connection pool per event loop
+    and wait for the shared Spotify concurrency limit without holding a
+    thread, so one loop can keep many searches in flight. 429s are retried
+    after their Retry-After (and cut the concurrency limit); 5xx responses
+    and connection failures are retried with backoff. A requests.Session
+    passed as session is used instead, from a worker thread (e.g. the
+    benchmark's replayed responses). Every call is charged to budget, if
+    given.
+    """
+    
+    def __init__(self, access_token: str = None, auth_manager: SpotifyOAuth = None,
+                 session: requests.Session = None, budget: RequestBudget = None):
+        """Give either an access token or a spotipy auth manager to get (and refresh) one from"""
+        if access_token is None and auth_manager is None:
+            raise ValueError("AsyncSpotifyClient needs an access_token or an auth_manager")
+        self.access_token = access_token
+        self.auth_manager = auth_manager
+        self.session = session
+        self.budget = budget
+        self._user: Optional[Dict] = None
+    
+    async def _token(self, refresh: bool = False) -> str:
+        if self.auth_manager is not None and (self.access_token is None or refresh):
+            # spotipy reads its token cache (and refreshes) with blocking calls
+            self.access_token = await asyncio.get_running_loop().run_in_executor(
+                None, functools.partial(self.auth_manager.get_access_token, as_dict=False))
+        return self.access_token
+    
+    async def _request(self, method: str, path: str, params: Dict = None, payload: Any = None) -> Any:
+        """One API call (path relative to the API prefix, or a full 'next' URL), with retries"""
+        if self.budget is not None:
+            self.budget.spend('spotify')
+        url = path if path.startswith('http') else SPOTIFY_API_PREFIX + path
+        refreshed = False
+        
+        for attempt in range(SPOTIFY_MAX_RETRIES + 1):
+            try:
+                return await self._attempt(method, url, params, payload)
+            except Retryable as e:
+                if attempt == SPOTIFY_MAX_RETRIES:
+                    raise e.error
+                wait = e.retry_after if e.retry_after is not None else 0.3 * 2 ** attempt
+                RETRY_WAIT_SECONDS.inc(wait, api='spotify')
+                await asyncio.sleep(wait)
+            except SpotifyException as e:
+                # An expired token is refreshed once
+                if e.http_status != 401 or self.auth_manager is None or refreshed:
+                    raise
+                refreshed = True
+                await self._token(refresh=True)
+    
+    async def _send(self, method: str, url: str, params: Dict, payload: Any):
+        headers = {'Authorization': f"Bearer {await self._token()}"}
+        if self.session is not None:
+            return await asyncio.get_running_loop().run_in_executor(None, functools.partial(
+                self.session.request, method, url, params=params, json=payload, headers=headers,
+                timeout=REQUEST_TIMEOUT_SECONDS))
+        return await loop_local('spotify_pool', _connection_pool).request(
+            method, url, params=params, json=payload, headers=headers)
+    
+    async def _attempt(self, method: str, url: str, params: Dict, payload: Any) -> Any:
+        """One request, in a slot of the shared Spotify concurrency limit"""
+        endpoint = _endpoint_label(url)
+        status = 'error'
+        start = time.perf_counter()
+        try:
+            async with spotify_limiter.async_slot() as feedback:
+                try:
+                    response = await self._send(method, url, params, payload)
+                except _OVERLOAD_ERRORS as e:
+                    feedback.throttled()
+                    error = Exception(f"Request failed: {str(e)}")
+                    if method in _IDEMPOTENT_METHODS or isinstance(e, _UNSENT_ERRORS):
+                        raise Retryable(error)
+                    raise error
+                status = response.status_code
+                if status == 429 or status in _RETRY_STATUSES:
+                    feedback.throttled(retry_after_seconds(response.headers))
+        finally:
+            elapsed = time.perf_counter() - start
+            SPOTIFY_REQUESTS.inc(endpoint=endpoint, status=str(status))
+            SPOTIFY_REQUEST_SECONDS.observe(elapsed, endpoint=endpoint)
+            tracer.record('spotify.request', elapsed, method=method, endpoint=endpoint, status=status)
+        
+        if status == 429:
+            RATE_LIMITED.inc(api='spotify')
+            raise Retryable(RateLimited("Spotify rate limit exceeded"), retry_after_seconds(response.headers))
+        if status >= 400:
+            try:
+                message = loads(response.content)['error']['message']
+            except (ValueError, KeyError, TypeError):
+                message = response.text
+            error = SpotifyException(status, -1, f"{url}:\n {message}", headers=response.headers)
+            if status in _RETRY_STATUSES and method in _IDEMPOTENT_METHODS:
+                raise Retryable(error)
+            raise error
+        return loads(response.content) if response.content else None
+    
+    async def current_user(self) -> Dict:
+        """The raw /me response (fetched once per client)"""
+        if self._user is None:
+            self._user = await self._request('GET', 'me')
+        return self._user
+    
+    async def get_current_user_info(self) -> Dict:
+        """Get information about the current authenticated user"""
+        try:
+            return self._user_summary(await self.current_user())
+        except Exception as e:
+            raise Exception(f"Failed to get current user info: {e}")
+    
+    async def _search(self, query: str, limit: int) -> List[Dict]:
+        results = await self._request('GET', 'search', params={'q': query, 'limit': limit, 'type': 'track'})
+        return results.get('tracks', {}).get('items', [])
+    
+    async def search_track(self, artist: str, track: str, limit: int = 10) -> List[Dict]:
+        """Search for a track on Spotify"""
+        try:
+            return await self._search(self._strict_query(artist, track), limit)
+        except (BudgetExceeded, RateLimited):
+            # Not a miss: the job stops (and can resume) instead of recording one
+            raise
+        except Exception as e:
+            print(f"Error searching for track: {e}")
+            return []
+    
+    async def search_track_fuzzy(self, artist: str, track: str) -> List[Dict]:
+        """Perform a less strict search for tracks on Spotify"""
+        return await self._search(self._fuzzy_query(artist, track), 10)
+    
+    async def find_match(self, track: Dict) -> Optional[Dict]:
+        """A normalized Last.fm track's best match: strict search, then fuzzy search"""
+        span = tracer.current()
+        span.set(strategy='strict')
+        results = await self.search_track(track['artist'], track['track'])
+        
+        if not results:
+            span.set(strategy='fuzzy')
+            results = await self.search_track_fuzzy(track['artist'], track['track'])
+        
+        return self.find_best_match(track, results)
+    
+    async def get_tracks(self, track_ids: List[str], market: str = None) -> List[Optional[Dict]]:
+        """Track objects for up to TRACKS_PER_REQUEST ids, in order (None where Spotify has no such track).
+        
+        With a market, a relinked track comes back as its replacement there
+        (with linked_from), and is_playable says whether it can be played.
+        """
+        params = {'ids': ','.join(track_ids)}
+        if market:
+            params['market'] = market
+        return (await self._request('GET', 'tracks', params=params)).get('tracks', [])
+    
+    async def get_audio_features(self, track_ids: List[str]) -> Dict[str, Optional[Dict]]:
+        """Audio features by track id (None where Spotify has none), fetched
+        AUDIO_FEATURES_PER_REQUEST ids per request with the requests in flight together"""
+        batches = [track_ids[start:start + AUDIO_FEATURES_PER_REQUEST]
+                   for start in range(0, len(track_ids), AUDIO_FEATURES_PER_REQUEST)]
+        responses = await asyncio.gather(*(
+            self._request('GET', 'audio-features', params={'ids': ','.join(batch)}) for batch in batches))
+        features = {}
+        for batch, response in zip(batches, responses):
+            features.update(zip(batch, response.get('audio_features') or [None] * len(batch)))
+        return features
+    
+    async def create_playlist(self, name: str, description: str = "", public: bool = True) -> Dict:
+        """Create a new playlist in the authenticated user's account"""
+        try:
+            user = await self.current_user()
+            playlist = await self._request('POST', f"users/{user['id']}/playlists",
+                                           payload={'name': name, 'public': public,
+                                                    'description': description})
+            return self._playlist_summary(playlist)
+        except (BudgetExceeded, RateLimited):
+            # The job stops (and can resume) on these, so keep their type
+            raise
+        except Exception as e:
+            raise Exception(f"Failed to create playlist: {e}")
+    
+    async def get_playlist(self, playlist_id: str) -> Dict:
+        """The raw playlist object"""
+        return await self._request('GET', f"playlists/{playlist_id}")
+    
+    async def get_playlist_tracks(self, playlist_id: str) -> List[Dict]:
+        """Every item of a playlist (following the pages)"""
+        items = []
+        page = await self._request('GET', f"playlists/{playlist_id}/tracks", params={'limit': 100})
+        while page:
+            items.extend(page['items'])
+            page = await self._request('GET', page['next']) if page.get('next') else None
+        return items
+    
+    async def add_tracks_to_playlist(self, playlist_id: str, track_uris: List[str],
+                                     skip_chunks: Iterable[int] = (),
+                                     on_chunk_added: Callable[[int], None] = None) -> bool:
+        """Add tracks to a playlist, 100 per request and in order (see SpotifyClient)"""
+        try:
+            skip_chunks = set(skip_chunks)
+            for i in range(0, len(track_uris), 100):
+                if i // 100 in skip_chunks:
+                    continue
+                await self._request('POST', f"playlists/{playlist_id}/tracks",
+                                    payload={'uris': track_uris[i:i + 100]})
+                if on_chunk_added:
+                    on_chunk_added(i // 100)
+            return True
+        except (BudgetExceeded, RateLimited):
+            # The job stops (and can resume) on these, so keep their type
+            raise
+        except Exception as e:
+            raise Exception(f"Failed to add tracks to playlist: {e}")
+    
+    async def replace_playlist_tracks(self, playlist_id: str, track_uris: List[str]) -> bool:
+        """Replace a playlist's items (the first 100 replace, the rest are added)"""
+        try:
+            await self._request('PUT', f"playlists/{playlist_id}/tracks",
+                                payload={'uris': track_uris[:100]})
+        except (BudgetExceeded, RateLimited):
+            # The job stops (and can resume) on these, so keep their type
+            raise
+        except Exception as e:
+            raise Exception(f"Failed to replace playlist tracks: {e}")
+        return await self.add_tracks_to_playlist(playlist_id, track_uris[100:])
+
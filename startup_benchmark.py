@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Startup benchmark for the web app
+
+Measures how long a fresh interpreter takes to import app.py and answer its
+first request, in both lazy and eager startup modes (LAZY_STARTUP), and breaks
+the import cost down per module with `python -X importtime`.
+
+Results are saved as JSON so cold start time can be tracked between versions:
+
+    python startup_benchmark.py --runs 5 --output startup_benchmark.json
+    python startup_benchmark.py --compare startup_benchmark.json
+"""
+
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+from typing import Dict, List
+
+import click
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Imports app.py, then serves one request through the WSGI app, reporting
+# timings relative to the start of the child's main module
+CHILD_SCRIPT = """
+import json, time
+t0 = time.perf_counter()
+import app
+t1 = time.perf_counter()
+response = app.app.test_client().get('/health')
+t2 = time.perf_counter()
+print(json.dumps({'import_s': t1 - t0, 'first_byte_s': t2 - t0,
+                  'status': response.status_code}))
+"""
+
+# Modules whose presence after `import app` means something was not deferred
+HEAVY_MODULES = ['spotipy', 'tqdm', 'playlist_converter', 'spotify_client', 'lastfm_client']
+
+
+def _child_env(lazy: bool) -> Dict[str, str]:
+    env = dict(os.environ)
+    env['LAZY_STARTUP'] = 'true' if lazy else 'false'
+    env['PYTHONDONTWRITEBYTECODE'] = '1'
+    return env
+
+
+def measure_startup(lazy: bool) -> Dict:
+    """Run one cold interpreter and time import + first response"""
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, '-c', CHILD_SCRIPT],
+        cwd=PROJECT_DIR, env=_child_env(lazy),
+        capture_output=True, text=True
+    )
+    wall = time.perf_counter() - start
+
+    if proc.returncode != 0:
+        raise Exception(f"Startup run failed:\n{proc.stderr}")
+
+    # The child prints its JSON summary last
+    timings = json.loads(proc.stdout.strip().splitlines()[-1])
+    timings['process_wall_s'] = wall
+    return timings
+
+
+def measure_import_profile(lazy: bool, top: int = 15) -> Dict:
+    """Parse `python -X importtime -c 'import app'` into a per-module breakdown"""
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import app'],
+        cwd=PROJECT_DIR, env=_child_env(lazy),
+        capture_output=True, text=True
+    )
+
+    modules = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        fields = line.split(':', 1)[1].split('|')
+        if len(fields) != 3:
+            continue
+        self_us, cumulative_us, name = fields
+        # importtime indents nested imports by two spaces after one leading space
+        name = name[1:]
+        modules.append({
+            'module': name.strip(),
+            'depth': (len(name) - len(name.lstrip())) // 2,
+            'self_us': int(self_us),
+            'cumulative_us': int(cumulative_us)
+        })
+
+    top_level = [m for m in modules if m['depth'] == 0]
+    imported = {m['module'] for m in modules}
+    return {
+        'total_import_us': sum(m['cumulative_us'] for m in top_level),
+        'module_count': len(modules),
+        'heavy_modules_loaded': [name for name in HEAVY_MODULES if name in imported],
+        'slowest_top_level': sorted(top_level, key=lambda m: m['cumulative_us'], reverse=True)[:top]
+    }
+
+
+def _summarize(samples: List[float]) -> Dict[str, float]:
+    return {
+        'min': min(samples),
+        'median': statistics.median(samples),
+        'max': max(samples)
+    }
+
+
+def run_benchmark(runs: int) -> Dict:
+    """Benchmark both startup modes"""
+    results = {
+        'created_at': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'runs': runs,
+        'modes': {}
+    }
+
+    for mode, lazy in (('lazy', True), ('eager', False)):
+        samples = [measure_startup(lazy) for _ in range(runs)]
+        results['modes'][mode] = {
+            'import_s': _summarize([s['import_s'] for s in samples]),
+            'first_byte_s': _summarize([s['first_byte_s'] for s in samples]),
+            'process_wall_s': _summarize([s['process_wall_s'] for s in samples]),
+            'import_profile': measure_import_profile(lazy)
+        }
+
+    return results
+
+
+def compare(baseline: Dict, current: Dict, threshold: float) -> bool:
+    """Print median first-byte deltas; returns False on a regression past threshold"""
+    ok = True
+    for mode, stats in current['modes'].items():
+        if mode not in baseline.get('modes', {}):
+            continue
+        before = baseline['modes'][mode]['first_byte_s']['median']
+        after = stats['first_byte_s']['median']
+        change = (after - before) / before * 100 if before else 0.0
+        marker = '✅'
+        if change > threshold:
+            marker = '❌'
+            ok = False
+        click.echo(f"{marker} {mode:<6} first byte: {before * 1000:.1f}ms -> {after * 1000:.1f}ms ({change:+.1f}%)")
+    return ok
+
+
+@click.command()
+@click.option('--runs', '-r', default=5, help='Cold starts to time per mode')
+@click.option('--output', '-o', type=click.Path(), help='Write results JSON to this file')
+@click.option('--compare', 'baseline_file', type=click.Path(exists=True),
+              help='Compare against a previous results file')
+@click.option('--threshold', default=10.0, help='Allowed first-byte regression in percent')
+def main(runs: int, output: str, baseline_file: str, threshold: float):
+    """Benchmark app.py cold start (import + first response)"""
+    results = run_benchmark(runs)
+
+    for mode, stats in results['modes'].items():
+        profile = stats['import_profile']
+        click.echo(f"\n🚀 {mode} startup ({runs} runs)")
+        click.echo(f"   import app:  {stats['import_s']['median'] * 1000:.1f}ms (median)")
+        click.echo(f"   first byte:  {stats['first_byte_s']['median'] * 1000:.1f}ms (median)")
+        click.echo(f"   process:     {stats['process_wall_s']['median'] * 1000:.1f}ms (median)")
+        click.echo(f"   importtime:  {profile['total_import_us'] / 1000:.1f}ms across {profile['module_count']} modules")
+        heavy = ', '.join(profile['heavy_modules_loaded']) or 'none'
+        click.echo(f"   heavy modules loaded at import: {heavy}")
+
+    if output:
+        with open(output, 'w') as f:
+            json.dump(results, f, indent=2)
+        click.echo(f"\n✅ Results saved to {output}")
+
+    if baseline_file:
+        with open(baseline_file, 'r') as f:
+            baseline = json.load(f)
+        click.echo(f"\n📊 Compared with {baseline_file}:")
+        if not compare(baseline, results, threshold):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
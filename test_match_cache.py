@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Test script for match cache revalidation over a snapshot
+
+Runs offline against a temporary database and snapshot: no API keys needed.
+Run it with python3 test_match_cache.py (or pytest).
+"""
+
+import json
+import os
+import tempfile
+
+from match_cache import MatchCache
+from match_snapshot import SnapshotReader, write_snapshot
+
+TRACK = {'artist': 'Rick Astley', 'track': 'Never Gonna Give You Up'}
+KEY = 'rick astley\x1fnever gonna give you up'
+
+
+def summary(track_id, name='Never Gonna Give You Up'):
+    return {'id': track_id, 'uri': f"spotify:track:{track_id}", 'name': name,
+            'artist': 'Rick Astley', 'album': 'Whenever You Need Somebody', 'popularity': 80,
+            'url': f"https://open.spotify.com/track/{track_id}"}
+
+
+def snapshot_only_cache(directory):
+    """A cache whose database is empty and whose snapshot has KEY"""
+    snapshot_path = os.path.join(directory, 'snapshot.bin')
+    write_snapshot(snapshot_path, [(KEY, json.dumps(summary('4uLU6hMCjMI75M1A2tKUQC')))])
+    return MatchCache(db_path=os.path.join(directory, 'cache.db'), snapshot=SnapshotReader(snapshot_path))
+
+
+def test_snapshot_match_revalidated_as_stale():
+    """A withdrawn snapshot match has to be searched again"""
+    with tempfile.TemporaryDirectory() as directory:
+        cache = snapshot_only_cache(directory)
+        assert cache.get(TRACK) == (True, summary('4uLU6hMCjMI75M1A2tKUQC'))
+
+        cache.revalidated([], {}, [KEY])
+        assert cache.get(TRACK) == (False, None)
+        assert not cache.contains(TRACK)
+
+        # Searching it again stores the new match over the withdrawal
+        cache.put_many([(TRACK, summary('7GhIk7Il098yCjg4BQjzvb'))])
+        assert cache.get(TRACK) == (True, summary('7GhIk7Il098yCjg4BQjzvb'))
+
+
+def test_snapshot_match_revalidated_as_replaced():
+    """A relinked snapshot match is replaced by the track it now points to"""
+    with tempfile.TemporaryDirectory() as directory:
+        cache = snapshot_only_cache(directory)
+        relinked = summary('7GhIk7Il098yCjg4BQjzvb', name='Never Gonna Give You Up (Remastered)')
+
+        cache.revalidated([], {KEY: relinked}, [])
+        assert cache.get(TRACK) == (True, relinked)
+        # Also in another process, which only shares the database and snapshot
+        assert snapshot_only_cache(directory).get(TRACK) == (True, relinked)
+
+
+if __name__ == "__main__":
+    print("🗂️  Match Cache Revalidation Test")
+    print("=" * 50)
+    for test in (test_snapshot_match_revalidated_as_stale, test_snapshot_match_revalidated_as_replaced):
+        test()
+        print(f"✅ {test.__doc__}")
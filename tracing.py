@@ -0,0 +1,250 @@
+import atexit
+import json
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+from config import (
+    TRACE_SAMPLE_RATE, TRACE_EXPORTER, TRACE_FILE, TRACE_OTLP_ENDPOINT, TRACE_FLUSH_SECONDS
+)
+
+logger = logging.getLogger(__name__)
+
+# Finished spans held in memory before they are dropped (exporter down or too slow)
+MAX_PENDING_SPANS = 10000
+EXPORT_BATCH_SIZE = 512
+
+
+class Span:
+    """One timed operation in a trace"""
+
+    sampled = True
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str] = None,
+                 attributes: Dict[str, Any] = None, start_ns: int = None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.attributes = dict(attributes or {})
+        self.start_ns = start_ns if start_ns is not None else time.time_ns()
+        self.end_ns = None
+        self.error = None
+
+    def set(self, **attributes) -> None:
+        self.attributes.update(attributes)
+
+    def record_error(self, error: BaseException) -> None:
+        self.error = f"{type(error).__name__}: {error}"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'name': self.name,
+            'start_ns': self.start_ns,
+            'duration_ms': (self.end_ns - self.start_ns) / 1e6,
+            'attributes': self.attributes,
+            'error': self.error
+        }
+
+
+class _NoopSpan:
+    """Stands in for spans of unsampled traces; every call does nothing"""
+
+    sampled = False
+
+    def set(self, **attributes) -> None:
+        pass
+
+    def record_error(self, error: BaseException) -> None:
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+# The innermost open span of the running thread/task
+_current_span: ContextVar[Any] = ContextVar('current_span', default=None)
+
+
+class JsonlExporter:
+    """Appends one JSON object per span to a file"""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def export(self, spans: List[Span]) -> None:
+        with open(self.path, 'a') as f:
+            for span in spans:
+                f.write(json.dumps(span.to_dict()) + '\n')
+
+
+class OtlpExporter:
+    """Posts spans to an OTLP/HTTP collector (JSON encoding)"""
+
+    def __init__(self, endpoint: str, service_name: str = 'lastfm-spotify-converter'):
+        self.endpoint = endpoint
+        self.service_name = service_name
+
+    @staticmethod
+    def _value(value: Any) -> Dict[str, Any]:
+        if isinstance(value, bool):
+            return {'boolValue': value}
+        if isinstance(value, int):
+            return {'intValue': str(value)}
+        if isinstance(value, float):
+            return {'doubleValue': value}
+        return {'stringValue': str(value)}
+
+    def _span(self, span: Span) -> Dict[str, Any]:
+        otlp_span = {
+            'traceId': span.trace_id,
+            'spanId': span.span_id,
+            'name': span.name,
+            'kind': 1,
+            'startTimeUnixNano': str(span.start_ns),
+            'endTimeUnixNano': str(span.end_ns),
+            'attributes': [{'key': key, 'value': self._value(value)}
+                           for key, value in span.attributes.items()],
+            'status': {'code': 2, 'message': span.error} if span.error else {'code': 1}
+        }
+        if span.parent_id:
+            otlp_span['parentSpanId'] = span.parent_id
+        return otlp_span
+
+    def export(self, spans: List[Span]) -> None:
+        import requests
+        payload = {'resourceSpans': [{
+            'resource': {'attributes': [
+                {'key': 'service.name', 'value': {'stringValue': self.service_name}}
+            ]},
+            'scopeSpans': [{'scope': {'name': 'tracing'},
+                            'spans': [self._span(span) for span in spans]}]
+        }]}
+        requests.post(self.endpoint, json=payload, timeout=5).raise_for_status()
+
+
+class Tracer:
+    """Span-based tracing with head sampling.
+
+    trace() opens a root span and decides once whether the whole trace is
+    recorded; span() opens a child of the current span and is a no-op when
+    there is no sampled trace open. Finished spans are exported in batches
+    from a background thread.
+    """
+
+    def __init__(self, exporter=None, sample_rate: float = 0.0,
+                 flush_seconds: float = TRACE_FLUSH_SECONDS):
+        self.exporter = exporter
+        self.sample_rate = sample_rate
+        self.flush_seconds = flush_seconds
+        self._pending: List[Span] = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._worker: Optional[threading.Thread] = None
+
+    @contextmanager
+    def trace(self, name: str, sampled: bool = None, **attributes):
+        """Open a root span; sampled overrides the sample rate for this trace"""
+        if sampled is None:
+            sampled = self.exporter is not None and random.random() < self.sample_rate
+        if not sampled or self.exporter is None:
+            token = _current_span.set(NOOP_SPAN)
+            try:
+                yield NOOP_SPAN
+            finally:
+                _current_span.reset(token)
+            return
+
+        with self._open(Span(name, f"{random.getrandbits(128):032x}", attributes=attributes)) as span:
+            yield span
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        """Open a child of the current span (a no-op outside a sampled trace)"""
+        parent = _current_span.get()
+        if parent is None or not parent.sampled:
+            yield NOOP_SPAN
+            return
+
+        with self._open(Span(name, parent.trace_id, parent.span_id, attributes)) as span:
+            yield span
+
+    @contextmanager
+    def _open(self, span: Span):
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.record_error(e)
+            raise
+        finally:
+            _current_span.reset(token)
+            span.end_ns = time.time_ns()
+            self._finish(span)
+
+    def record(self, name: str, duration_seconds: float, **attributes) -> None:
+        """Add a child span that just ended (e.g. from an HTTP response hook)"""
+        parent = _current_span.get()
+        if parent is None or not parent.sampled:
+            return
+
+        end_ns = time.time_ns()
+        span = Span(name, parent.trace_id, parent.span_id, attributes,
+                    start_ns=end_ns - int(duration_seconds * 1e9))
+        span.end_ns = end_ns
+        self._finish(span)
+
+    def current(self):
+        """The innermost open span (NOOP_SPAN outside a sampled trace)"""
+        span = _current_span.get()
+        return span if span is not None else NOOP_SPAN
+
+    def _finish(self, span: Span) -> None:
+        with self._lock:
+            if len(self._pending) >= MAX_PENDING_SPANS:
+                return
+            self._pending.append(span)
+            full = len(self._pending) >= EXPORT_BATCH_SIZE
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name='trace-exporter', daemon=True)
+                self._worker.start()
+        if full:
+            self._wake.set()
+
+    def _run(self) -> None:
+        while True:
+            self._wake.wait(self.flush_seconds)
+            self._wake.clear()
+            self.flush()
+
+    def flush(self) -> None:
+        """Export every finished span now"""
+        with self._lock:
+            spans, self._pending = self._pending, []
+        for i in range(0, len(spans), EXPORT_BATCH_SIZE):
+            try:
+                self.exporter.export(spans[i:i + EXPORT_BATCH_SIZE])
+            except Exception as e:
+                logger.warning(f"Dropped {len(spans) - i} trace spans: {str(e)}")
+                return
+
+
+def create_exporter(kind: str = TRACE_EXPORTER):
+    """Exporter named by TRACE_EXPORTER: 'jsonl' or 'otlp'"""
+    if kind == 'jsonl':
+        return JsonlExporter(TRACE_FILE)
+    if kind == 'otlp':
+        return OtlpExporter(TRACE_OTLP_ENDPOINT)
+    raise ValueError(f"Unknown trace exporter: {kind}")
+
+
+# Global tracer; nothing is recorded unless TRACE_SAMPLE_RATE > 0 or a trace
+# is opened with sampled=True
+tracer = Tracer(create_exporter(), TRACE_SAMPLE_RATE)
+atexit.register(tracer.flush)